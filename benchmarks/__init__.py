@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""spyder-vim benchmarks."""
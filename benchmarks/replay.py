@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim keystroke replay benchmarks.
+
+Replay the keystroke scripts of benchmarks/scripts against generated
+documents and report keys per second, per-key latency and peak memory.
+
+Scripts use vim key notation (<Esc>, <CR>, <BS>, <C-r>, <lt>), line breaks
+are ignored and lines starting with '" ' are comments. A '" backends:'
+comment lists the backends able to replay the script:
+
+- engine: the headless VimEngine on a MemoryAdapter.
+- widget: the plugin VimWidget on a Spyder editor, keys are sent as Qt key
+  events, like in the tests.
+
+Each run is done in a new process, so that the peak memory is its own.
+Results are stored as JSON and can be compared with a previous run:
+
+    python -m benchmarks.replay --lines 1000 100000 --compare old.json
+"""
+# Standard library imports
+import argparse
+import json
+import os
+import os.path as osp
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+LOCATION = osp.dirname(osp.abspath(__file__))
+SCRIPTS_DIR = osp.join(LOCATION, "scripts")
+RESULTS_DIR = osp.join(LOCATION, "results")
+BACKENDS = ("engine", "widget")
+DEFAULT_LINES = (1000, 100000, 1000000)
+DEFAULT_KEYS = 5000
+# Slowdown reported as a regression by --compare
+DEFAULT_THRESHOLD = 0.1
+SPECIAL_KEYS = {"esc": "\x1b", "cr": "\r", "bs": "\b", "c-r": "\x12",
+                "lt": "<"}
+RE_SPECIAL_KEY = re.compile(r"<([a-zA-Z-]+)>")
+
+
+# %% Scripts and documents
+def parse_keys(text):
+    """Return (keys, backends) of a keystroke script."""
+    backends = BACKENDS
+    lines = []
+    for line in text.splitlines():
+        if line.startswith('" '):
+            comment = line[2:].strip()
+            if comment.startswith("backends:"):
+                backends = tuple(comment[len("backends:"):].split())
+            continue
+        lines.append(line)
+
+    def special(match):
+        name = match.group(1).lower()
+        if name not in SPECIAL_KEYS:
+            raise ValueError("unknown key {}".format(match.group(0)))
+        return SPECIAL_KEYS[name]
+
+    return RE_SPECIAL_KEY.sub(special, "".join(lines)), backends
+
+
+def load_scripts(names=None):
+    """Return {name: (keys, backends)} of the scripts in SCRIPTS_DIR."""
+    scripts = {}
+    for filename in sorted(os.listdir(SCRIPTS_DIR)):
+        name, ext = osp.splitext(filename)
+        if ext != ".keys" or (names and name not in names):
+            continue
+        with open(osp.join(SCRIPTS_DIR, filename), encoding="utf-8") as f:
+            scripts[name] = parse_keys(f.read())
+    return scripts
+
+
+def generate_document(lines):
+    """Return a Python-like document of lines lines.
+
+    The document is always the same for a number of lines, with blank
+    lines between functions, indentation, brackets and repeated words.
+    """
+    template = [
+        "class Item{n}(object):",
+        "    def compute_{n}(self, value, result=None):",
+        "        total = [value * {n} for value in range(10)]",
+        "        if result is None:",
+        "            result = {{'value': value, 'total': total}}",
+        "        # value and result are returned unchanged",
+        "        return value + len(total), result",
+        "",
+    ]
+    document = []
+    number = 0
+    while len(document) < lines:
+        document.extend(line.format(n=number) for line in template)
+        number += 1
+    return "\n".join(document[:lines])
+
+
+def percentile(sorted_values, fraction):
+    """Return the value under which fraction of the values are."""
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def peak_memory():
+    """Return the peak resident memory of the process in MB, or None."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+# %% Backends
+class EngineBackend(object):
+    """Replay keys with the headless engine."""
+
+    def __init__(self, text):
+        """Create a headless engine editing text."""
+        # Local imports
+        from spyder_vim.spyder.adapter import MemoryAdapter
+        from spyder_vim.spyder.engine import VimEngine
+
+        self.adapter = MemoryAdapter(text)
+        self.engine = VimEngine(self.adapter)
+
+    def goto_line(self, line):
+        """Move the cursor to the start of a line, numbered from 0."""
+        self.adapter.set_cursor(self.adapter.block_position(line))
+
+    def press(self, key):
+        """Process one key."""
+        self.engine.press(key)
+
+    def finish(self):
+        """Wait for deferred work, there is none without Qt."""
+        pass
+
+    def close(self):
+        """Release the resources of the backend."""
+        pass
+
+
+class WidgetBackend(object):
+    """Replay keys with the plugin widget on a Spyder editor."""
+
+    def __init__(self, text):
+        """Open text in a Spyder editor stack driven by the plugin widget."""
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        # Third party imports
+        from qtpy.QtCore import Qt
+        from qtpy.QtTest import QTest
+        from qtpy.QtWidgets import QApplication, QVBoxLayout, QWidget
+        from spyder.plugins.editor.widgets.editorstack import EditorStack
+        from unittest.mock import Mock
+
+        # Local imports
+        from spyder_vim.spyder.widgets import VimWidget
+
+        class EditorHost(QWidget):
+            """Editor plugin widget with a single editor stack."""
+
+            def __init__(self, editor_stack):
+                QWidget.__init__(self)
+                self.editor_stack = editor_stack
+                QVBoxLayout(self).addWidget(editor_stack)
+
+            def get_current_editorstack(self):
+                return self.editor_stack
+
+        self.app = QApplication.instance() or QApplication([])
+        self.qtest = QTest
+        self._tempdir = tempfile.TemporaryDirectory()
+        editor_stack = EditorStack(None, [])
+        editor_stack.set_find_widget(Mock())
+        editor_stack.set_io_actions(Mock(), Mock(), Mock(), Mock())
+        finfo = editor_stack.new(osp.join(self._tempdir.name, "bench.py"),
+                                 "utf-8", text)
+        self.editor = finfo.editor
+        self.host = EditorHost(editor_stack)
+        self.vim = VimWidget(self.host, None)
+        # Keep the state of the user sessions out of the benchmark
+        self.vim.viminfo.dirname = self._tempdir.name
+        self.host.layout().addWidget(self.vim)
+        self.host.show()
+        QApplication.setActiveWindow(self.host)
+        self.vim.commandline.setFocus()
+        self.app.processEvents()
+        self.keys = {"\x1b": (Qt.Key_Escape, Qt.NoModifier),
+                     "\r": (Qt.Key_Return, Qt.NoModifier),
+                     "\b": (Qt.Key_Backspace, Qt.NoModifier),
+                     "\x12": (Qt.Key_R, Qt.ControlModifier)}
+
+    def goto_line(self, line):
+        """Move the cursor to the start of a line, numbered from 0."""
+        self.editor.go_to_line(line + 1)
+        self.vim.update_vim_cursor()
+
+    def press(self, key):
+        """Send one key to the widget with the focus."""
+        widget = self.app.focusWidget()
+        if key == "\x1b" and widget is not self.vim.commandline:
+            # What the Esc shortcut of the plugin does in insert mode
+            self.vim.commandline.setFocus()
+        elif key in self.keys:
+            self.qtest.keyClick(widget, *self.keys[key])
+        else:
+            self.qtest.keyClicks(widget, key)
+
+    def finish(self):
+        """Wait for deferred work."""
+        # Deferred work, like clipboard writes
+        self.app.processEvents()
+
+    def close(self):
+        """Close the editor and remove its temporary directory."""
+        # Focus out events would reach half deleted widgets at exit
+        self.host.close()
+        self.app.processEvents()
+        self._tempdir.cleanup()
+
+
+def run(script, backend, lines, keys):
+    """Replay keys of script on a document of lines lines.
+
+    Return the result of the run as a dict.
+    """
+    script_keys = load_scripts([script])[script][0]
+    text = generate_document(lines)
+    start_time = time.perf_counter()
+    player = (EngineBackend if backend == "engine" else WidgetBackend)(text)
+    load_time = time.perf_counter() - start_time
+    del text
+    player.goto_line(lines // 2)
+    replayed = (script_keys * (keys // len(script_keys) + 1))[:keys]
+    latencies = []
+    perf_counter = time.perf_counter
+    start_time = perf_counter()
+    for key in replayed:
+        key_time = perf_counter()
+        player.press(key)
+        latencies.append(perf_counter() - key_time)
+    player.finish()
+    elapsed = time.perf_counter() - start_time
+    player.close()
+    latencies.sort()
+    return {
+        "script": script,
+        "backend": backend,
+        "lines": lines,
+        "keys": len(replayed),
+        "load_seconds": round(load_time, 4),
+        "seconds": round(elapsed, 4),
+        "keys_per_second": round(len(replayed) / elapsed, 1),
+        "p50_ms": round(1000 * percentile(latencies, 0.5), 4),
+        "p99_ms": round(1000 * percentile(latencies, 0.99), 4),
+        "max_ms": round(1000 * latencies[-1], 4),
+        "peak_memory_mb": peak_memory(),
+    }
+
+
+def run_in_process(script, backend, lines, keys):
+    """Run a benchmark in a new process and return its result."""
+    root = osp.dirname(LOCATION)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [root] + [path for path in [env.get("PYTHONPATH")] if path])
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.replay", "--single", script,
+         backend, str(lines), str(keys)],
+        cwd=root, env=env, stdout=subprocess.PIPE, check=True,
+        universal_newlines=True).stdout
+    # The result is the last line, Qt may print warnings before
+    return json.loads(output.strip().splitlines()[-1])
+
+
+# %% Results
+def git_revision():
+    """Return the current commit of the repository, or None."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=LOCATION,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True,
+            universal_newlines=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def result_key(result):
+    """Return what identifies a run in the results of other runs."""
+    return result["script"], result["backend"], result["lines"]
+
+
+def format_table(results, previous=None, threshold=DEFAULT_THRESHOLD):
+    """Return the results as a text table and the list of regressions.
+
+    With previous results, keys/s are compared with the same run in them
+    and the runs slower by more than threshold are regressions.
+    """
+    old = {result_key(result): result for result in previous or []}
+    header = "{:<10} {:<7} {:>8} {:>10} {:>9} {:>9} {:>8}".format(
+        "script", "backend", "lines", "keys/s", "p50 ms", "p99 ms", "MB")
+    if previous is not None:
+        header += " {:>8}".format("change")
+    rows = [header]
+    regressions = []
+    for result in results:
+        memory = result["peak_memory_mb"]
+        row = "{:<10} {:<7} {:>8} {:>10.0f} {:>9.3f} {:>9.3f} {:>8}".format(
+            result["script"], result["backend"], result["lines"],
+            result["keys_per_second"], result["p50_ms"], result["p99_ms"],
+            "-" if memory is None else "{:.0f}".format(memory))
+        before = old.get(result_key(result))
+        if before is not None:
+            change = result["keys_per_second"] / before["keys_per_second"] - 1
+            row += " {:>+7.1f}%".format(100 * change)
+            if change < -threshold:
+                regressions.append(result_key(result))
+        rows.append(row)
+    return "\n".join(rows), regressions
+
+
+def main(args=None):
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Replay keystroke scripts and measure their speed.")
+    parser.add_argument("--scripts", nargs="+", metavar="NAME",
+                        help="scripts to replay (default: all)")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS,
+                        default=list(BACKENDS))
+    parser.add_argument("--lines", nargs="+", type=int,
+                        default=list(DEFAULT_LINES),
+                        help="document sizes in lines")
+    parser.add_argument("--keys", type=int, default=DEFAULT_KEYS,
+                        help="keys replayed per run, the script is repeated")
+    parser.add_argument("--output", help="JSON file of the results "
+                        "(default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", metavar="JSON",
+                        help="results of a previous run to compare with")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="slowdown reported as a regression")
+    parser.add_argument("--single", nargs=4, help=argparse.SUPPRESS)
+    options = parser.parse_args(args)
+
+    if options.single:
+        script, backend, lines, keys = options.single
+        print(json.dumps(run(script, backend, int(lines), int(keys))))
+        return 0
+
+    results = []
+    for name, (__, backends) in load_scripts(options.scripts).items():
+        for backend in options.backends:
+            if backend not in backends:
+                continue
+            for lines in options.lines:
+                result = run_in_process(name, backend, lines, options.keys)
+                print(format_table([result])[0].splitlines()[1])
+                results.append(result)
+
+    revision = git_revision()
+    output = options.output or osp.join(
+        RESULTS_DIR, "{}.json".format(revision or "results"))
+    if osp.dirname(output):
+        os.makedirs(osp.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"revision": revision,
+                   "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   "python": platform.python_version(),
+                   "platform": platform.platform(),
+                   "results": results}, f, indent=2)
+
+    previous = None
+    if options.compare:
+        with open(options.compare, encoding="utf-8") as f:
+            previous = json.load(f)["results"]
+    table, regressions = format_table(results, previous, options.threshold)
+    print()
+    print(table)
+    print()
+    print("Results written to {}".format(output))
+    for script, backend, lines in regressions:
+        print("Regression: {} on {} with {} lines".format(script, backend,
+                                                          lines))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim editor adapters.
+
+The vim engine talks to editors through the narrow EditorAdapter interface:
+text access by offset and by block (line), the cursor, named overlays
+(extra selections), edit transactions and change notifications.
+CodeEditorAdapter (in widgets.py) wraps a Spyder CodeEditor and
+MemoryAdapter is a pure Python editor, used to run the engine without Qt.
+
+line_window and text_window give the text of the lines around a position,
+so commands can work on large documents without copying them.
+"""
+# Local imports
+from spyder_vim.spyder.textbuffer import TextBuffer
+
+# Lines on each side of the cursor in the first window of text_window
+WINDOW_LINES = 100
+
+
+class EditorAdapter(object):
+    """Interface between the vim engine and an editor.
+
+    Positions are offsets in the text, blocks are lines numbered from 0.
+    Edits are (position, length, text) replacements applied in order.
+    """
+
+    filename = None
+
+    @property
+    def key(self):
+        """Return an object identifying the document (e.g. for undo)."""
+        return self
+
+    # --- Text
+    def text(self):
+        """Return the whole text."""
+        raise NotImplementedError
+
+    def length(self):
+        """Return the number of characters."""
+        raise NotImplementedError
+
+    def get_text(self, start, end):
+        """Return the text between two positions."""
+        raise NotImplementedError
+
+    def block_count(self):
+        """Return the number of lines."""
+        raise NotImplementedError
+
+    def block_text(self, number):
+        """Return the text of a line, without its newline."""
+        raise NotImplementedError
+
+    def block_position(self, number):
+        """Return the position of the start of a line."""
+        raise NotImplementedError
+
+    def block_number(self, position):
+        """Return the line of a position."""
+        raise NotImplementedError
+
+    # --- Cursor
+    def cursor(self):
+        """Return the cursor position."""
+        raise NotImplementedError
+
+    def set_cursor(self, position):
+        """Move the cursor."""
+        raise NotImplementedError
+
+    # --- Overlays
+    def overlay(self, name):
+        """Return the (start, end) ranges of an overlay."""
+        raise NotImplementedError
+
+    def set_overlay(self, name, ranges):
+        """Show (start, end) ranges, e.g. the visual selection."""
+        raise NotImplementedError
+
+    def clear_overlay(self, name):
+        """Remove an overlay."""
+        self.set_overlay(name, [])
+
+    # --- Edits
+    def edit(self, edits):
+        """Apply (position, length, text) replacements in one transaction."""
+        raise NotImplementedError
+
+    def on_change(self, callback):
+        """Call callback(position, removed, added, length) on changes."""
+        raise NotImplementedError
+
+    def on_close(self, callback):
+        """Call callback when the document is closed."""
+
+
+def line_window(adapter, position, lines):
+    """Return (offset, text) of the lines around position.
+
+    The text holds the line of position and lines lines on each side.
+    """
+    line = adapter.block_number(position)
+    last = min(adapter.block_count() - 1, line + lines)
+    start = adapter.block_position(max(0, line - lines))
+    end = adapter.block_position(last) + len(adapter.block_text(last))
+    return start, adapter.get_text(start, end)
+
+
+def text_window(adapter, position, compute, lines=WINDOW_LINES):
+    """Run compute(text, position) on the lines around position.
+
+    compute returns a (start, end, ...) range in text or None. Return
+    (offset, text, result), with the window grown until the range does not
+    reach one of its edges, or the window is the whole document.
+    """
+    line = adapter.block_number(position)
+    last_line = adapter.block_count() - 1
+    while True:
+        offset, text = line_window(adapter, position, lines)
+        result = compute(text, position - offset)
+        first = line - lines <= 0
+        last = line + lines >= last_line
+        if first and last:
+            return offset, text, result
+        if result is not None and (result[0] > 0 or first) and (
+                result[1] < len(text) or last):
+            return offset, text, result
+        lines *= 4
+
+
+class MemoryAdapter(EditorAdapter):
+    """Editor holding its text in a TextBuffer, without Qt."""
+
+    def __init__(self, text="", filename=None):
+        """Create an editor holding text."""
+        self.buffer = TextBuffer(text)
+        self.filename = filename
+        self._cursor = 0
+        self._overlays = {}
+        self._listeners = []
+        self._text = None
+
+    def text(self):
+        """Return the whole text, cached until the next edit."""
+        if self._text is None:
+            self._text = str(self.buffer)
+        return self._text
+
+    def length(self):
+        """Return the number of characters."""
+        return len(self.buffer)
+
+    def get_text(self, start, end):
+        """Return the text between two positions."""
+        return self.buffer.get_text(start, end)
+
+    def block_count(self):
+        """Return the number of lines."""
+        return self.buffer.line_count()
+
+    def block_text(self, number):
+        """Return the text of a line, without its newline."""
+        buffer = self.buffer
+        return buffer.get_text(buffer.line_start(number),
+                               buffer.line_end(number))
+
+    def block_position(self, number):
+        """Return the position of the start of a line."""
+        return self.buffer.line_start(number)
+
+    def block_number(self, position):
+        """Return the line of a position."""
+        return self.buffer.line_of(position)
+
+    def cursor(self):
+        """Return the cursor position."""
+        return self._cursor
+
+    def set_cursor(self, position):
+        """Move the cursor, kept in the text."""
+        self._cursor = max(0, min(position, len(self.buffer)))
+
+    def overlay(self, name):
+        """Return the (start, end) ranges of an overlay."""
+        return list(self._overlays.get(name, []))
+
+    def set_overlay(self, name, ranges):
+        """Store (start, end) ranges, dropping empty overlays."""
+        if ranges:
+            self._overlays[name] = list(ranges)
+        else:
+            self._overlays.pop(name, None)
+
+    def edit(self, edits):
+        """Apply replacements and notify the listeners of each one."""
+        self._text = None
+        for position, length, text in edits:
+            self.buffer.replace(position, length, text)
+            if self._cursor >= position + length:
+                self._cursor += len(text) - length
+            elif self._cursor > position:
+                self._cursor = position
+            for callback in self._listeners:
+                callback(position, length, len(text), len(self.buffer))
+
+    def on_change(self, callback):
+        """Call callback(position, removed, added, length) on changes."""
+        self._listeners.append(callback)
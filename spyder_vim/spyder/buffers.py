@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim list of the open files (:ls, :b).
+
+Files keep the number they got when first opened. Names are matched as
+fuzzy subsequences: the lowercase path and file name of a file are computed
+once, when it is opened, so matching a name against hundreds of files only
+takes a few str.find calls per file.
+"""
+# Standard library imports
+import os.path as osp
+
+# Characters after which a matched character starts a word
+WORD_SEPARATORS = frozenset("/\\_-. ")
+START_SCORE = 3  # A matched character starting a word
+CONSECUTIVE_SCORE = 2  # A matched character following the previous one
+NAME_SCORE = 10  # The query matches the file name, not only the path
+
+
+def fuzzy_score(query, text):
+    """Return the score of query as a subsequence of text, or None.
+
+    Characters are matched from left to right at their first occurrence.
+    Matches starting a word or following the previous match score more,
+    skipped characters score less.
+    """
+    score = 0
+    position = 0
+    previous = -2
+    for char in query:
+        index = text.find(char, position)
+        if index == -1:
+            return None
+        if index == previous + 1:
+            score += CONSECUTIVE_SCORE
+        if index == 0 or text[index - 1] in WORD_SEPARATORS:
+            score += START_SCORE
+        score -= min(index - position, START_SCORE)
+        previous = index
+        position = index + 1
+    return score
+
+
+def display_name(path, cwd):
+    """Return path relative to cwd if it is inside, else path."""
+    if path.startswith(osp.join(cwd, "")):
+        return osp.relpath(path, cwd)
+    return path
+
+
+class BufferList(object):
+    """Numbers and fuzzy index of the open files.
+
+    numbers maps every path seen to its number, paths maps the numbers of
+    the open files to their path.
+    """
+
+    def __init__(self):
+        """Create an empty list."""
+        self.numbers = {}
+        self.paths = {}
+        # Lowercase path and file name of the open files
+        self._keys = {}
+
+    def update(self, paths):
+        """Set the open files, only the new ones are indexed.
+
+        New files are numbered in the order of paths.
+        """
+        for path in self._keys.keys() - set(paths):
+            del self._keys[path]
+            del self.paths[self.numbers[path]]
+        for path in paths:
+            if path in self._keys:
+                continue
+            number = self.numbers.get(path)
+            if number is None:
+                number = self.numbers[path] = len(self.numbers) + 1
+            self.paths[number] = path
+            lower = path.lower()
+            self._keys[path] = (lower, osp.basename(lower))
+
+    def sorted_numbers(self):
+        """Return the numbers of the open files, in order."""
+        return sorted(self.paths)
+
+    def match(self, query):
+        """Return the open files matching query, best first.
+
+        Matches in the file name come before matches in the whole path,
+        then shorter paths first.
+        """
+        return [path for __, __, path in self._scores(query.lower())]
+
+    def find(self, query):
+        """Return the open file matching query best.
+
+        Raise ValueError if no file matches, or several match as well.
+        """
+        lower = query.lower()
+        scores = self._scores(lower)
+        if not scores:
+            raise ValueError("no matching buffer for {}".format(query))
+        exact = [path for __, __, path in scores
+                 if self._keys[path][1] == lower]
+        if len(exact) == 1:
+            return exact[0]
+        if len(exact) > 1 or (not exact and len(scores) > 1
+                              and scores[0][0] == scores[1][0]):
+            raise ValueError("more than one match for {}".format(query))
+        return scores[0][2]
+
+    def _scores(self, query):
+        """Return the sorted (-score, length, path) of the matching files."""
+        in_name = not any(char in query for char in "/\\")
+        scores = []
+        for path, (lower, name) in self._keys.items():
+            score = fuzzy_score(query, name) if in_name else None
+            if score is not None:
+                score += NAME_SCORE
+            else:
+                score = fuzzy_score(query, lower)
+                if score is None:
+                    continue
+            scores.append((-score, len(path), path))
+        scores.sort()
+        return scores
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim command line completion (Tab, Shift-Tab).
+
+The word at the end of the command line is completed from a source chosen
+by the command: command names, options, file paths, open files or the
+search history. Candidates are kept in a bounded cache by source and
+prefix, so that completing a prefix again costs a dictionary lookup.
+"""
+# Standard library imports
+import os
+from collections import OrderedDict
+
+# Local imports
+from spyder_vim.spyder.ex import expand_name, parse_command
+
+# Commands completing file paths and open files
+PATH_COMMANDS = ("edit", "read", "split", "tabedit", "view", "vsplit", "w")
+BUFFER_COMMANDS = ("bdelete", "buffer")
+CACHE_SIZE = 256  # Prefixes whose candidates are cached
+
+
+def completion_context(text):
+    """Return (source, head, word) for the word at the end of a command line.
+
+    source is "command", "option", "path", "buffer" or "search", or None if
+    nothing can be completed. head is the text before word.
+    """
+    if text[:1] in ("/", "?"):
+        return "search", text[0], text[1:]
+    if text[:1] != ":":
+        return None, text, ""
+    try:
+        command = parse_command(text[1:])
+    except ValueError:
+        return None, text, ""
+    args = command.args
+    if not (args or command.bang or text[-1].isspace()):
+        source, word = "command", command.name
+    else:
+        name = expand_name(command.name)
+        if name in PATH_COMMANDS and not args.startswith("!"):
+            source, word = "path", args
+        elif name in BUFFER_COMMANDS:
+            source, word = "buffer", args
+        elif name == "set":
+            source, word = "option", args.split(" ")[-1]
+        else:
+            return None, text, ""
+    return source, text[:len(text) - len(word)], word
+
+
+def prefix_matches(words, prefix):
+    """Return the sorted words starting with prefix."""
+    return sorted(word for word in words if word.startswith(prefix))
+
+
+def split_path(word):
+    """Return the (directory, name) parts of a path being typed."""
+    cut = max(word.rfind("/"), word.rfind(os.sep)) + 1
+    return word[:cut], word[cut:]
+
+
+def path_candidates(listing, directory, prefix):
+    """Return the paths of a directory listing starting with prefix.
+
+    listing is the (files, subdirectories) names of directory, the
+    subdirectories come first and end with a separator.
+    """
+    files, subdirectories = listing
+    candidates = [directory + name + os.sep
+                  for name in prefix_matches(subdirectories, prefix)]
+    candidates.extend(directory + name
+                      for name in prefix_matches(files, prefix))
+    return candidates
+
+
+class CompletionCache(object):
+    """Candidates by key, the least recently used dropped past size."""
+
+    def __init__(self, size=CACHE_SIZE):
+        """Create an empty cache of size keys."""
+        self.size = size
+        self._candidates = OrderedDict()
+
+    def get(self, key):
+        """Return the candidates of key, or None."""
+        candidates = self._candidates.get(key)
+        if candidates is not None:
+            self._candidates.move_to_end(key)
+        return candidates
+
+    def put(self, key, candidates):
+        """Store the candidates of key."""
+        self._candidates[key] = candidates
+        self._candidates.move_to_end(key)
+        if len(self._candidates) > self.size:
+            self._candidates.popitem(last=False)
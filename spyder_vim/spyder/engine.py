@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim headless engine.
+
+VimEngine processes keystrokes against any EditorAdapter, without Qt. It
+runs the normal mode core shared with the plugin: counts, registers,
+motions, operators, pastes, insert mode and the undo tree. Tests and
+benchmarks use it with a MemoryAdapter.
+
+The engine never copies the whole document for a command: motions and
+operators run on a window of lines around the cursor, grown only when the
+result reaches its edge, and the undo tree records the changes made by the
+engine instead of comparing snapshots.
+"""
+import re
+
+# Local imports
+from spyder_vim.spyder.adapter import line_window, text_window
+from spyder_vim.spyder.motions import ARG_MOTIONS, MOTIONS, parse_motion
+from spyder_vim.spyder.operators import (RE_VIM_OPERATOR, apply_operator,
+                                         operator_range)
+from spyder_vim.spyder.registers import RegisterStore
+from spyder_vim.spyder.undo import UndoTree
+
+ESCAPE = "\x1b"
+CTRL_R = "\x12"
+RE_COMMAND = re.compile(r'^(?:"(.))?([1-9]\d*)?(.*)$', re.DOTALL)
+# Commands which are not motions or operators
+COMMANDS = ("x", "X", "D", "C", "Y", "p", "P", "u", CTRL_R, "i", "a", "I",
+            "A", "o", "O", "J")
+MOTION_PREFIXES = ("g",) + tuple(ARG_MOTIONS)
+# Motions which never leave the line of the cursor
+LINE_MOTIONS = ("h", "l", " ", "0", "^", "$") + tuple(ARG_MOTIONS)
+
+
+class VimEngine(object):
+    """Vim keystroke processing on an editor adapter."""
+
+    def __init__(self, adapter, registers=None):
+        """Create an engine editing the text of adapter."""
+        self.adapter = adapter
+        self.registers = registers if registers is not None \
+            else RegisterStore()
+        self.mode = "normal"
+        self.pending = ""
+        self.undo_tree = UndoTree()
+        # [start, end, removed] of the change made by the current command
+        self._change = None
+
+    # --- Input
+    def feed(self, keys):
+        """Process a string of keys."""
+        for key in keys:
+            self.press(key)
+
+    def press(self, key):
+        """Process one key."""
+        if self.mode == "insert":
+            self._insert_key(key)
+            return
+        if key == ESCAPE:
+            self.pending = ""
+            return
+        self.pending += key
+        if self._run(self.pending) is not None:
+            self.pending = ""
+            if self.mode == "normal":
+                self.checkpoint()
+
+    def _run(self, keys):
+        """Run the command in keys, return None if it is not complete."""
+        register, count, keys = RE_COMMAND.match(keys).groups()
+        register = register or "unnamed"
+        if not keys or keys == '"':
+            return None
+        match = RE_VIM_OPERATOR.match(keys)
+        if match and not match.group(1):
+            __, operator, motion_count, motion_keys = match.groups()
+            try:
+                motion = parse_motion(motion_keys, operator)
+            except ValueError:
+                return False
+            if motion is None:
+                return None
+            if count or motion_count:
+                count = int(count or 1) * int(motion_count or 1)
+            return self.operate(operator, motion[0], count, motion[1],
+                                register)
+        count = int(count) if count else None
+        if keys in COMMANDS:
+            return self._command(keys, count or 1, register)
+        if keys in MOTION_PREFIXES:
+            return None
+        if keys[0] in ARG_MOTIONS:
+            return self.move(keys[0], count, keys[1])
+        if keys in MOTIONS and keys[:1] not in "ia" and keys != "lines":
+            return self.move(keys, count)
+        return False
+
+    # --- Document access
+    def _line_bounds(self, position):
+        """Return the start and end positions of the line of position."""
+        adapter = self.adapter
+        line = adapter.block_number(position)
+        start = adapter.block_position(line)
+        return start, start + len(adapter.block_text(line))
+
+    def _first_non_blank(self, position):
+        start, end = self._line_bounds(position)
+        text = self.adapter.get_text(start, end)
+        return start + len(text) - len(text.lstrip(" \t"))
+
+    def _normal_position(self, position):
+        """Keep the cursor on a character in normal mode."""
+        start, end = self._line_bounds(position)
+        return max(start, min(position, end - 1))
+
+    def _window(self, compute, local=False):
+        """Run compute(text, position) on the lines around the cursor.
+
+        Return (offset, text, result), see text_window. If local, the
+        window is the line of the cursor.
+        """
+        adapter = self.adapter
+        position = adapter.cursor()
+        if local:
+            offset, text = line_window(adapter, position, 0)
+            return offset, text, compute(text, position - offset)
+        return text_window(adapter, position, compute)
+
+    # --- Edits and undo
+    def edit(self, edits):
+        """Apply (position, length, text) replacements, recorded for undo."""
+        for edit in edits:
+            self._record(*edit)
+            self.adapter.edit([edit])
+
+    def _record(self, position, length, inserted):
+        """Merge an edit into the change of the current command."""
+        get_text = self.adapter.get_text
+        if self._change is None:
+            self._change = [position, position + len(inserted),
+                            get_text(position, position + length)]
+            return
+        start, end, removed = self._change
+        if position < start:
+            removed = get_text(position, start) + removed
+            start = position
+        if position + length > end:
+            removed += get_text(end, position + length)
+            end = position + length
+        self._change = [start, end + len(inserted) - length, removed]
+
+    def checkpoint(self):
+        """Close the current change in the undo tree."""
+        if self._change is not None:
+            start, end, removed = self._change
+            self._change = None
+            self.undo_tree.add_change(start, removed,
+                                      self.adapter.get_text(start, end),
+                                      self.adapter.block_number(start))
+
+    def _undo_edits(self, edits):
+        if edits:
+            self.adapter.edit(edits)
+            self.adapter.set_cursor(self._normal_position(
+                min(edit[0] for edit in edits)))
+
+    # --- Motions and operators
+    def _lines_available(self, motion, count):
+        """Check j and k do not move past the document before windowing.
+
+        A failed motion would otherwise grow the window to the document.
+        """
+        if motion not in ("j", "k"):
+            return True
+        line = self.adapter.block_number(self.adapter.cursor())
+        if motion == "j":
+            return line + (count or 1) < self.adapter.block_count()
+        return line - (count or 1) >= 0
+
+    def move(self, motion, count=None, arg=None):
+        """Move the cursor with a motion."""
+        adapter = self.adapter
+        position = adapter.cursor()
+        if motion in ("G", "gg"):
+            if count is None:
+                count = adapter.block_count() if motion == "G" else 1
+            line = min(count, adapter.block_count()) - 1
+            adapter.set_cursor(self._first_non_blank(
+                adapter.block_position(line)))
+            return True
+        if not self._lines_available(motion, count):
+            return False
+        offset, __, result = self._window(
+            lambda text, position: MOTIONS[motion](text, position, count,
+                                                   arg),
+            motion in LINE_MOTIONS)
+        if result is None:
+            return False
+        start, end, kind = result
+        start += offset
+        end += offset
+        if kind == "inclusive":
+            target = end if start == position else start
+        else:
+            target = start if start != position else end
+        if kind == "line":
+            column = position - self._line_bounds(position)[0]
+            line_start, line_end = self._line_bounds(target)
+            target = min(line_start + column, line_end)
+        adapter.set_cursor(self._normal_position(target))
+        return True
+
+    def operate(self, operator, motion, count=None, arg=None,
+                register="unnamed"):
+        """Apply an operator to a motion or a text object."""
+        if not self._lines_available(motion, count):
+            return False
+        offset, text, result = self._window(
+            lambda text, position: operator_range(text, position, operator,
+                                                  motion, count, arg),
+            motion in LINE_MOTIONS)
+        if result is None:
+            return False
+        # The window holds the range and the lines around it
+        edits, content, position = apply_operator(
+            text, self.adapter.cursor() - offset, operator, motion, count,
+            arg)
+        if content is not None:
+            self.registers.set(content[0], content[1], register=register,
+                               cut=operator != "y")
+        self.edit([(edit_position + offset, length, new_text)
+                   for edit_position, length, new_text in edits])
+        self.adapter.set_cursor(position + offset)
+        if operator == "c":
+            self.mode = "insert"
+        return True
+
+    # --- Other commands
+    def _command(self, key, count, register):
+        adapter = self.adapter
+        position = adapter.cursor()
+        if key == "x":
+            return self.operate("d", "l", count, register=register)
+        elif key == "X":
+            return self.operate("d", "h", count, register=register)
+        elif key == "D":
+            return self.operate("d", "$", count, register=register)
+        elif key == "C":
+            return self.operate("c", "$", count, register=register)
+        elif key == "Y":
+            return self.operate("y", "lines", count, register=register)
+        elif key in "pP":
+            self.paste(key == "p", count, register)
+        elif key == "u":
+            self.checkpoint()
+            self._undo_edits(self.undo_tree.undo(count))
+        elif key == CTRL_R:
+            self.checkpoint()
+            self._undo_edits(self.undo_tree.redo(count))
+        elif key == "J":
+            for __ in range(max(count - 1, 1)):
+                end = self._line_bounds(position)[1]
+                if end == adapter.length():
+                    break
+                following = self._first_non_blank(end + 1)
+                self.edit([(end, following - end, " ")])
+            adapter.set_cursor(self._normal_position(position))
+        else:
+            self._enter_insert(key, position)
+        return True
+
+    def _enter_insert(self, key, position):
+        adapter = self.adapter
+        start, end = self._line_bounds(position)
+        if key == "a" and position < end:
+            position += 1
+        elif key == "I":
+            position = self._first_non_blank(position)
+        elif key == "A":
+            position = end
+        elif key == "o":
+            self.edit([(end, 0, "\n")])
+            position = end + 1
+        elif key == "O":
+            self.edit([(start, 0, "\n")])
+            position = start
+        adapter.set_cursor(position)
+        self.mode = "insert"
+
+    def paste(self, after=True, count=1, register="unnamed"):
+        """Paste a register after (p) or before (P) the cursor."""
+        content = self.registers.get(register)
+        if not content.text:
+            return
+        adapter = self.adapter
+        position = adapter.cursor()
+        start, end = self._line_bounds(position)
+        if content.mode == "line":
+            pasted = content.text if content.text.endswith("\n") \
+                else content.text + "\n"
+            pasted *= count
+            if not after:
+                insert_at = start
+            elif end == adapter.length():
+                # Last line without newline
+                self.edit([(end, 0, "\n" + pasted[:-1])])
+                adapter.set_cursor(self._first_non_blank(end + 1))
+                return
+            else:
+                insert_at = end + 1
+            self.edit([(insert_at, 0, pasted)])
+            adapter.set_cursor(self._first_non_blank(insert_at))
+        else:
+            pasted = content.text * count
+            if after and position < end:
+                position += 1
+            self.edit([(position, 0, pasted)])
+            adapter.set_cursor(position + len(pasted) - 1)
+
+    # --- Insert mode
+    def _insert_key(self, key):
+        adapter = self.adapter
+        position = adapter.cursor()
+        if key == ESCAPE:
+            self.mode = "normal"
+            if position > self._line_bounds(position)[0]:
+                position -= 1
+            adapter.set_cursor(position)
+            self.checkpoint()
+        elif key == "\b":
+            if position > 0:
+                self.edit([(position - 1, 1, "")])
+        else:
+            if key == "\r":
+                key = "\n"
+            self.edit([(position, 0, key)])
@@ -0,0 +1,921 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim Ex commands.
+
+parse_command splits a command line into its range, name, bang and
+arguments, and resolve_range turns the range addresses (numbers, ., $, %,
+marks, /pattern/, ?pattern? and +/- offsets) into line numbers.
+
+The range commands are resolved like operators: they read the lines of the
+range through an editor adapter and return the edits to apply, the text to
+store in a register and the new cursor position. A command changes its
+whole range with one replacement, so the caller applies it as a single
+document change. Lines are numbered from 0, the address 0 (before the
+first line) is -1.
+
+:global runs in two phases, like vim: mark_lines finds the matching lines
+in one pass over the text of the range, then the command runs on each
+marked line. LineMarks keeps the marks on their lines while the commands
+add and remove lines, so they are never searched again.
+"""
+import re
+from array import array
+from itertools import compress, groupby
+
+# Local imports
+from spyder_vim.spyder.operators import INDENT
+from spyder_vim.spyder.textbuffer import FenwickTree
+
+# Full name and shortest abbreviation of the commands
+EX_COMMANDS = {
+    "bdelete": "bd",
+    "bnext": "bn",
+    "bprevious": "bp",
+    "buffer": "b",
+    "close": "clo",
+    "copy": "co",
+    "delete": "d",
+    "edit": "e",
+    "global": "g",
+    "history": "his",
+    "join": "j",
+    "move": "m",
+    "normal": "norm",
+    "only": "on",
+    "read": "r",
+    "sort": "sor",
+    "split": "sp",
+    "substitute": "s",
+    "tabedit": "tabe",
+    "vglobal": "v",
+    "vsplit": "vs",
+    "yank": "y",
+}
+# Commands whose name is not an abbreviation of their full name
+EX_ALIASES = {"buffers": "ls", "files": "ls", "t": "copy"}
+RE_EX_NAME = re.compile(r"\s*([a-zA-Z]+|>+|<+)?(!?)\s*")
+RE_EX_NUMBER = re.compile(r"\d+")
+RE_EX_OFFSET = re.compile(r"\s*([+-])(\d*)|\s*(\d+)")
+RE_EX_COUNT = re.compile(r"^\s*([a-zA-Z\"*+-])?\s*(\d*)\s*$")
+RE_SUBSTITUTE_FLAGS = re.compile(r"^([&cegiIn]*)\s*(\d*)\s*$")
+# A \n not preceded by an escaped backslash
+RE_NEWLINE_ESCAPE = re.compile(r"(?<!\\)(?:\\\\)*\\n")
+INVERT_FLAGS = bytes.maketrans(b"\0\1", b"\1\0")
+# Number of the lines sorted by :sort b, f, n, o and x, and its base
+SORT_NUMBERS = {
+    "b": (re.compile(r"-?[01]+"), 2),
+    "f": (re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"), None),
+    "n": (re.compile(r"-?\d+"), 10),
+    "o": (re.compile(r"-?[0-7]+"), 8),
+    "x": (re.compile(r"-?(?:0[xX])?[0-9a-fA-F]+"), 16),
+}
+SORT_OPTIONS = "iru" + "".join(SORT_NUMBERS)
+
+
+class ExCommand(object):
+    """A parsed command line.
+
+    addresses is a list of (base, argument, offset, separator) tuples,
+    with base one of "number", ".", "$", "'", "/", "?" or None (offset
+    only) and separator "," or ";" (before the address).
+    """
+
+    __slots__ = ("addresses", "name", "bang", "args")
+
+    def __init__(self, addresses, name, bang, args):
+        """Create a command from its parsed parts."""
+        self.addresses = addresses
+        self.name = name
+        self.bang = bang
+        self.args = args
+
+
+def expand_name(name):
+    """Return the full name of an abbreviated command, or name."""
+    if name in EX_ALIASES:
+        return EX_ALIASES[name]
+    for full_name, abbreviation in EX_COMMANDS.items():
+        if full_name.startswith(name) and name.startswith(abbreviation):
+            return full_name
+    return name
+
+
+def _parse_pattern(text, position):
+    """Return the pattern ending at the next unescaped delimiter.
+
+    The delimiter is text[position - 1], the closing one is optional at the
+    end of text. Return (pattern, position after the closing delimiter,
+    True if there was a closing delimiter).
+    """
+    delimiter = text[position - 1]
+    pattern = []
+    while position < len(text):
+        char = text[position]
+        if char == "\\" and position + 1 < len(text):
+            following = text[position + 1]
+            if following != delimiter:
+                pattern.append(char)
+            pattern.append(following)
+            position += 2
+            continue
+        position += 1
+        if char == delimiter:
+            return "".join(pattern), position, True
+        pattern.append(char)
+    return "".join(pattern), position, False
+
+
+def _parse_address(text, position):
+    """Return (base, argument, offset, position) of one address."""
+    base = argument = None
+    char = text[position:position + 1]
+    if char.isdigit():
+        match = RE_EX_NUMBER.match(text, position)
+        base, argument = "number", int(match.group())
+        position = match.end()
+    elif char in (".", "$"):
+        base = char
+        position += 1
+    elif char == "'":
+        if position + 1 >= len(text):
+            raise ValueError("missing mark name")
+        base, argument = "'", text[position + 1]
+        position += 2
+    elif char in ("/", "?"):
+        base = char
+        argument, position, __ = _parse_pattern(text, position + 1)
+    offset = 0
+    found = base is not None
+    while True:
+        match = RE_EX_OFFSET.match(text, position)
+        if match is None:
+            break
+        sign, digits, number = match.groups()
+        if number is not None:
+            if not found:
+                break
+            offset += int(number)
+        else:
+            value = int(digits) if digits else 1
+            offset += value if sign == "+" else -value
+        found = True
+        position = match.end()
+    if not found:
+        return None, None, None, position
+    return base, argument, offset, position
+
+
+def parse_command(text):
+    """Parse a command line into an ExCommand.
+
+    Raise ValueError if the range can not be parsed.
+    """
+    addresses = []
+    position = 0
+    separator = None
+    while True:
+        while text[position:position + 1].isspace():
+            position += 1
+        if text[position:position + 1] == "%":
+            addresses.extend([("number", 1, 0, ","), ("$", None, 0, ",")])
+            position += 1
+        else:
+            base, argument, offset, position = _parse_address(text, position)
+            if offset is not None:
+                addresses.append((base, argument, offset, separator or ","))
+            elif separator is not None:
+                # A missing address after a separator is the cursor line
+                addresses.append((".", None, 0, separator))
+        separator = text[position:position + 1]
+        if separator not in (",", ";"):
+            break
+        if not addresses:
+            addresses.append((".", None, 0, ","))
+        position += 1
+    match = RE_EX_NAME.match(text, position)
+    name, bang = match.groups()
+    name = name or ""
+    args = text[match.end():]
+    if name[:1] in "<>" and name:
+        # :>> shifts twice, the extra characters are left in args
+        args = name[1:] + args
+        name = name[0]
+    return ExCommand(addresses, name, bool(bang), args)
+
+
+def _search_line(adapter, pattern, line, reverse):
+    """Return the next line matching pattern after line, wrapping around."""
+    try:
+        regex = re.compile(pattern)
+    except re.error as error:
+        raise ValueError("invalid pattern: {}".format(error))
+    count = adapter.block_count()
+    step = -1 if reverse else 1
+    for index in range(1, count + 1):
+        number = (line + step * index) % count
+        if regex.search(adapter.block_text(number)):
+            return number
+    raise ValueError("pattern not found: {}".format(pattern))
+
+
+def resolve_address(address, adapter, line, mark=None):
+    """Return the line of an address, relative to line for . and offsets.
+
+    mark is called with a mark name and returns its line or None.
+    """
+    base, argument, offset, __ = address
+    if base == "number":
+        line = argument - 1
+    elif base == "$":
+        line = adapter.block_count() - 1
+    elif base == "'":
+        line = mark(argument) if mark is not None else None
+        if line is None:
+            raise ValueError("mark not set: {}".format(argument))
+    elif base in ("/", "?"):
+        line = _search_line(adapter, argument, line, base == "?")
+    return line + offset
+
+
+def resolve_target(text, adapter, mark=None):
+    """Return the line of the address argument of :m and :t (-1 for 0)."""
+    command = parse_command(text)
+    if not command.addresses or command.name or command.args.strip():
+        raise ValueError("invalid address: {}".format(text.strip()))
+    current = adapter.block_number(adapter.cursor())
+    line = resolve_address(command.addresses[-1], adapter, current, mark)
+    if not -1 <= line < adapter.block_count():
+        raise ValueError("invalid address: {}".format(text.strip()))
+    return line
+
+
+def resolve_range(command, adapter, mark=None, whole=False):
+    """Return the (first, last) lines of the range of a command.
+
+    Without address, the range is the line of the cursor, or the whole
+    document if whole. A backward range is swapped. Raise ValueError if a
+    line is past the document.
+    """
+    current = adapter.block_number(adapter.cursor())
+    count = adapter.block_count()
+    if not command.addresses:
+        return (0, count - 1) if whole else (current, current)
+    lines = []
+    line = current
+    for address in command.addresses:
+        if address[3] == ";" and lines:
+            # ; moves the cursor to the previous address
+            line = lines[-1]
+        lines.append(resolve_address(address, adapter, line, mark))
+    first, last = lines[-2:] if len(lines) > 1 else lines * 2
+    if first > last:
+        first, last = last, first
+    if first < -1 or last >= count:
+        raise ValueError("invalid range")
+    return max(first, 0), max(last, 0)
+
+
+def parse_count(args):
+    """Return the (register, count) of [x] {count} arguments.
+
+    Raise ValueError if args are not a register and a count.
+    """
+    match = RE_EX_COUNT.match(args)
+    if match is None:
+        raise ValueError("trailing characters: {}".format(args.strip()))
+    register, count = match.groups()
+    return register, int(count) if count else None
+
+
+def apply_count(first, last, count, line_count):
+    """Return the range of {count} lines from the last line of a range."""
+    if count is None:
+        return first, last
+    return last, min(last + count - 1, line_count - 1)
+
+
+# %% Range commands
+def range_text(adapter, first, last):
+    """Return (start, end, text) of the lines first to last."""
+    start = adapter.block_position(first)
+    end = adapter.block_position(last) + len(adapter.block_text(last))
+    return start, end, adapter.get_text(start, end)
+
+
+def _joins_lines(regex):
+    r"""Return True if the pattern of regex names a newline (\n).
+
+    Other patterns are run on each line, so that \s or [^x] do not match
+    across lines, as in vim.
+    """
+    pattern = regex.pattern
+    return "\n" in pattern or RE_NEWLINE_ESCAPE.search(pattern) is not None
+
+
+def _first_non_blank(text):
+    return len(text) - len(text.lstrip(" \t"))
+
+
+def delete_lines(adapter, first, last):
+    """Delete lines first to last (:d).
+
+    Return (edits, register, cursor) like operators.
+    """
+    start, end, text = range_text(adapter, first, last)
+    register = (text + "\n", "line")
+    if last + 1 < adapter.block_count():
+        cursor = start + _first_non_blank(adapter.block_text(last + 1))
+        return [(start, end + 1 - start, "")], register, cursor
+    if first > 0:
+        # Deleting the last lines removes the newline before them
+        previous = adapter.block_position(first - 1)
+        cursor = previous + _first_non_blank(adapter.block_text(first - 1))
+        return [(start - 1, end - start + 1, "")], register, cursor
+    return [(start, end - start, "")], register, 0
+
+
+def yank_lines(adapter, first, last):
+    """Yank lines first to last (:y), the cursor does not move."""
+    __, __, text = range_text(adapter, first, last)
+    return [], (text + "\n", "line"), None
+
+
+def shift_lines(adapter, first, last, levels):
+    """Indent (levels > 0) or dedent lines first to last (:> and :<).
+
+    The cursor goes to the first non-blank of the last line.
+    """
+    start, end, text = range_text(adapter, first, last)
+    new_lines = []
+    for line in text.split("\n"):
+        if levels > 0:
+            line = INDENT * levels + line if line else line
+        else:
+            blanks = len(line) - len(line.lstrip())
+            line = line[min(blanks, -levels * len(INDENT)):]
+        new_lines.append(line)
+    new_text = "\n".join(new_lines)
+    edits = [(start, end - start, new_text)] if new_text != text else []
+    last_line = new_lines[-1]
+    cursor = start + len(new_text) - len(last_line) \
+        + _first_non_blank(last_line)
+    return edits, None, cursor
+
+
+def join_lines(adapter, first, last, spaces=True):
+    """Join lines first to last, at least two (:j).
+
+    Like J, the leading blanks of the joined lines are removed and they are
+    separated by a space, unless spaces is False (:j!).
+    """
+    if first == last:
+        last = first + 1
+    last = min(last, adapter.block_count() - 1)
+    if first == last:
+        return [], None, None
+    start, end, text = range_text(adapter, first, last)
+    lines = text.split("\n")
+    if spaces:
+        joined = lines[0]
+        cursor = max(len(joined) - 1, 0)
+        for line in lines[1:]:
+            line = line.lstrip()
+            if line:
+                # On the space before the last joined line
+                cursor = len(joined)
+                joined += " " + line
+    else:
+        joined = "".join(lines)
+        cursor = len(joined) - len(lines[-1])
+    return [(start, end - start, joined)], None, start + cursor
+
+
+def move_lines(adapter, first, last, target):
+    """Move lines first to last below line target (:m).
+
+    The lines between the range and target are rewritten with it, in one
+    replacement. Raise ValueError if target is inside the range.
+    """
+    if first <= target < last:
+        raise ValueError("cannot move a range of lines into itself")
+    if target == last or target == first - 1:
+        line = adapter.block_text(last)
+        return [], None, adapter.block_position(last) + \
+            _first_non_blank(line)
+    if target > last:
+        start, end, text = range_text(adapter, first, target)
+        lines = text.split("\n")
+        moved = last - first + 1
+        new_lines = lines[moved:] + lines[:moved]
+    else:
+        start, end, text = range_text(adapter, target + 1, last)
+        lines = text.split("\n")
+        moved = last - first + 1
+        new_lines = lines[-moved:] + lines[:-moved]
+    new_text = "\n".join(new_lines)
+    # The cursor goes to the last moved line
+    last_index = len(new_lines) - 1 if target > last else moved - 1
+    offset = sum(len(line) + 1 for line in new_lines[:last_index])
+    cursor = start + offset + _first_non_blank(new_lines[last_index])
+    return [(start, end - start, new_text)], None, cursor
+
+
+def copy_lines(adapter, first, last, target):
+    """Copy lines first to last below line target (:t and :co)."""
+    __, __, text = range_text(adapter, first, last)
+    if target < 0:
+        position = 0
+        inserted = text + "\n"
+        end = len(text)
+    else:
+        position = adapter.block_position(target) + len(
+            adapter.block_text(target))
+        inserted = "\n" + text
+        end = position + len(inserted)
+    # The cursor goes to the last copied line
+    last_line = text.rsplit("\n", 1)[-1]
+    cursor = end - len(last_line) + _first_non_blank(last_line)
+    return [(position, 0, inserted)], None, cursor
+
+
+# %% Substitute
+def parse_substitute(args):
+    r"""Parse the /pattern/replacement/[flags] [count] of :s.
+
+    Return (pattern, replacement, flags, count), pattern is None without
+    arguments (repeat the last substitute). Any character but letters,
+    digits, blanks, \, " and | can be the delimiter.
+    """
+    args = args.lstrip()
+    if not args:
+        return None, None, "", None
+    delimiter = args[0]
+    if delimiter.isalnum() or delimiter in '\\"|':
+        raise ValueError("invalid delimiter: {}".format(delimiter))
+    pattern, position, closed = _parse_pattern(args, 1)
+    replacement, flags = "", ""
+    if closed:
+        replacement, position, closed = _parse_pattern(args, position)
+    if closed:
+        flags = args[position:]
+    match = RE_SUBSTITUTE_FLAGS.match(flags)
+    if match is None:
+        raise ValueError("trailing characters: {}".format(flags.strip()))
+    flags, count = match.groups()
+    return pattern, replacement, flags, int(count) if count else None
+
+
+def _replacement_tokens(replacement, previous):
+    """Split a replacement into ("text", str), ("group", n), ("case", c)."""
+    tokens = []
+    position = 0
+    while position < len(replacement):
+        char = replacement[position]
+        position += 1
+        if char == "\\" and position < len(replacement):
+            char = replacement[position]
+            position += 1
+            if char.isdigit():
+                tokens.append(("group", int(char)))
+            elif char in "uUlLeE":
+                tokens.append(("case", char))
+            elif char in "rn":
+                tokens.append(("text", "\n"))
+            elif char == "t":
+                tokens.append(("text", "\t"))
+            else:
+                tokens.append(("text", char))
+        elif char == "&":
+            tokens.append(("group", 0))
+        elif char == "~":
+            tokens.extend(_replacement_tokens(previous, ""))
+        else:
+            tokens.append(("text", char))
+    return tokens
+
+
+def compile_replacement(replacement, previous=""):
+    r"""Compile a replacement of vim syntax into a function of a match.
+
+    & and \0 are the match, \1 to \9 its groups, ~ the previous
+    replacement, \r and \n a newline, \u and \l change the case of the
+    next character and \U and \L of the following ones, until \e or \E.
+    A replacement without group is returned as a string.
+    """
+    tokens = _replacement_tokens(replacement, previous)
+    if all(kind == "text" for kind, __ in tokens):
+        return "".join(value for __, value in tokens)
+    if all(kind != "case" for kind, __ in tokens):
+        parts = [value for __, value in tokens]
+
+        def expand(match):
+            return "".join([part if part.__class__ is str
+                            else match.group(part) or "" for part in parts])
+        return expand
+
+    def expand(match):
+        parts = []
+        one = mode = None
+        for kind, value in tokens:
+            if kind == "case":
+                if value in "ul":
+                    one = value
+                else:
+                    mode = value if value in "UL" else None
+                continue
+            text = value if kind == "text" else match.group(value) or ""
+            if mode is not None:
+                text = text.upper() if mode == "U" else text.lower()
+            if one is not None and text:
+                text = (text[0].upper() if one == "u"
+                        else text[0].lower()) + text[1:]
+                one = None
+            parts.append(text)
+        return "".join(parts)
+    return expand
+
+
+def substitute_lines(adapter, first, last, regex, replacement, every=False,
+                     count_only=False):
+    """Replace the matches of regex in lines first to last (:s).
+
+    replacement is a string or a function of a match (compile_replacement).
+    Only the first match of each line is replaced, unless every. An empty
+    match right after a match is skipped, as in vim. The regex runs on each
+    line, or on the whole range if it names a newline (see _joins_lines).
+    The new text is applied as one replacement, from the first to the last
+    match. Return (result, count, lines), with result the (edits, register,
+    cursor) to apply and count the matches replaced (only counted if
+    count_only) on lines lines.
+    """
+    start, __, text = range_text(adapter, first, last)
+    expand = replacement if callable(replacement) else \
+        (lambda match: replacement)
+    # Offset in text of the string searched and end of the last match
+    offset = 0
+    previous = line_end = -1
+    lines = count = 0
+    head = tail = None
+
+    def replace(match):
+        nonlocal previous, line_end, lines, count, head, tail
+        position = offset + match.start()
+        if position == previous and not match.group():
+            return ""
+        previous = offset + match.end()
+        if position > line_end:
+            lines += 1
+            line_end = text.find("\n", position)
+            if line_end == -1:
+                line_end = len(text)
+        elif not every:
+            return match.group()
+        count += 1
+        if head is None:
+            head = position
+        tail = previous
+        return match.group() if count_only else expand(match)
+
+    if _joins_lines(regex):
+        new_text = regex.sub(replace, text)
+    else:
+        new_lines = []
+        for line in text.split("\n"):
+            new_lines.append(regex.sub(replace, line))
+            offset += len(line) + 1
+        new_text = "\n".join(new_lines)
+    if count_only or not count:
+        return ([], None, None), count, lines
+    new_tail = len(new_text) - (len(text) - tail)
+    # The cursor goes to the line of the last replacement
+    line_start = new_text.rfind("\n", 0, new_tail) + 1
+    line_end = new_text.find("\n", line_start)
+    line = new_text[line_start:line_end if line_end != -1 else None]
+    cursor = start + line_start + _first_non_blank(line)
+    edits = [(start + head, tail - head, new_text[head:new_tail])]
+    return (edits, None, cursor), count, lines
+
+
+# %% Sort
+def parse_sort(args):
+    """Return the (options, pattern) of the arguments of :sort.
+
+    The options and the /pattern/ can be in any order, pattern is None
+    without pattern.
+    """
+    options = ""
+    pattern = None
+    position = 0
+    while position < len(args):
+        char = args[position]
+        position += 1
+        if char.isspace():
+            continue
+        if char in SORT_OPTIONS:
+            options += char
+        elif pattern is None and not char.isalnum() and char not in '\\"|':
+            pattern, position, __ = _parse_pattern(args, position)
+        else:
+            raise ValueError("trailing characters: {}".format(
+                args[position - 1:].strip()))
+    if sum(option in SORT_NUMBERS for option in set(options)) > 1:
+        raise ValueError("invalid argument: {}".format(args.strip()))
+    return options, pattern
+
+
+def _sort_keys(lines, options, regex):
+    """Return the sort key of each line, None for lines without key."""
+    keys = lines
+    if regex is not None:
+        keys = []
+        after = "r" not in options
+        for line, match in zip(lines, map(regex.search, lines)):
+            if match is None:
+                keys.append(None)
+            else:
+                keys.append(line[match.end():] if after else match.group())
+    number = [option for option in options if option in SORT_NUMBERS]
+    if number:
+        number_regex, base = SORT_NUMBERS[number[0]]
+        search = number_regex.search
+        matches = map(search, keys) if keys is lines else \
+            (key if key is None else search(key) for key in keys)
+        if base is None:
+            return [match if match is None else float(match.group())
+                    for match in matches]
+        return [match if match is None else int(match.group(), base)
+                for match in matches]
+    if "i" in options:
+        if keys is lines:
+            return [key.lower() for key in keys]
+        return [key if key is None else key.lower() for key in keys]
+    return keys
+
+
+def sort_lines(adapter, first, last, options="", regex=None, reverse=False):
+    """Sort lines first to last (:sort).
+
+    Lines are compared as strings, as lower case strings (i option) or by
+    their first number (b, f, n, o and x options). With regex, the key is
+    the text after the match, or the match with the r option. Lines without
+    key come first, in their order. The sort is stable, reverse reverses
+    the result and the u option keeps the first of equal lines. Only the
+    lines which moved are replaced, in one edit.
+    """
+    start, __, text = range_text(adapter, first, last)
+    lines = text.split("\n")
+    keys = _sort_keys(lines, options, regex)
+    unique = "u" in options
+    if keys is lines:
+        # Sort the lines themselves, without indirection
+        new_lines = sorted(lines, reverse=reverse)
+        if unique:
+            new_lines = [line for line, __ in groupby(new_lines)]
+    else:
+        if None in keys:
+            order = [index for index, key in enumerate(keys) if key is None]
+            order.extend(sorted((index for index, key in enumerate(keys)
+                                 if key is not None), key=keys.__getitem__))
+        else:
+            order = sorted(range(len(keys)), key=keys.__getitem__)
+        if reverse:
+            order.reverse()
+        if unique:
+            if not any(option in SORT_NUMBERS for option in options):
+                keys = [line.lower() for line in lines] if "i" in options \
+                    else lines
+            unique_order = order[:1]
+            for index in order[1:]:
+                if keys[index] != keys[unique_order[-1]]:
+                    unique_order.append(index)
+            order = unique_order
+        new_lines = [lines[index] for index in order]
+    cursor = adapter.block_position(first)
+    return _replace_lines(start, text, lines, new_lines), None, cursor
+
+
+def _replace_lines(start, text, lines, new_lines):
+    """Return the edit replacing the lines of text at start by new_lines.
+
+    Only the lines between the first and the last changed line are
+    replaced.
+    """
+    size = min(len(lines), len(new_lines))
+    head = 0
+    while head < size and lines[head] == new_lines[head]:
+        head += 1
+    tail = 0
+    while tail < size - head and lines[-1 - tail] == new_lines[-1 - tail]:
+        tail += 1
+    if head == len(lines) == len(new_lines):
+        return []
+    new_text = "\n".join(new_lines)
+    head_length = sum(len(line) + 1 for line in lines[:head])
+    tail_length = sum(len(line) + 1 for line in lines[len(lines) - tail:])
+    # Replace the newline before the changed lines, or after at the start
+    low = head_length - 1 if head else 0
+    high = len(text) - tail_length + (1 if tail and not head else 0)
+    new_high = len(new_text) - (len(text) - high)
+    return [(start + low, high - low, new_text[low:new_high])]
+
+
+# %% Filters
+def _output_lines(output):
+    """Return the lines of the output of a command, without last newline."""
+    output = output.replace("\r\n", "\n")
+    if output.endswith("\n"):
+        output = output[:-1]
+    return output.split("\n")
+
+
+def filter_lines(adapter, first, last, output):
+    """Replace lines first to last by the output of a filter (:{range}!).
+
+    Only the changed lines are replaced, the lines are deleted without
+    output. The cursor goes to the first non-blank of the first line.
+    """
+    if not output:
+        edits, __, cursor = delete_lines(adapter, first, last)
+        return edits, None, cursor
+    start, __, text = range_text(adapter, first, last)
+    new_lines = _output_lines(output)
+    edits = _replace_lines(start, text, text.split("\n"), new_lines)
+    return edits, None, start + _first_non_blank(new_lines[0])
+
+
+def insert_lines(adapter, line, text):
+    """Insert the lines of text below line, -1 for the top (:r).
+
+    The cursor goes to the first non-blank of the first inserted line.
+    """
+    if not text:
+        return [], None, None
+    lines = _output_lines(text)
+    inserted = "\n".join(lines)
+    if line < 0:
+        return [(0, 0, inserted + "\n")], None, _first_non_blank(lines[0])
+    position = adapter.block_position(line) + len(adapter.block_text(line))
+    cursor = position + 1 + _first_non_blank(lines[0])
+    return [(position, 0, "\n" + inserted)], None, cursor
+
+
+# %% Global
+def parse_global(args):
+    """Return the (pattern, command) of the /pattern/command of :g."""
+    args = args.lstrip()
+    if not args:
+        raise ValueError("regular expression missing from :global")
+    delimiter = args[0]
+    if delimiter.isalnum() or delimiter in '\\"|':
+        raise ValueError("invalid delimiter: {}".format(delimiter))
+    pattern, position, __ = _parse_pattern(args, 1)
+    return pattern, args[position:].lstrip()
+
+
+def mark_lines(adapter, first, last, regex, invert=False):
+    """Return an array of the lines first to last matching regex.
+
+    Each line is searched on its own. If regex names a newline (see
+    _joins_lines), the text of the range is searched instead: a line
+    matches if a match starts on it, the search goes on from the next line.
+    If invert, return the lines without match (:v).
+    """
+    __, __, text = range_text(adapter, first, last)
+    search = regex.search
+    if not _joins_lines(regex):
+        flags = bytearray(search(line) is not None
+                          for line in text.split("\n"))
+        if invert:
+            flags = flags.translate(INVERT_FLAGS)
+        return array("l", compress(range(first, last + 1), flags))
+    flags = bytearray(last - first + 1)
+    line = line_start = 0
+    while True:
+        match = search(text, line_start)
+        if match is None:
+            break
+        start = match.start()
+        line += text.count("\n", line_start, start)
+        flags[line] = 1
+        line_end = text.find("\n", start)
+        if line_end == -1:
+            break
+        line += 1
+        line_start = line_end + 1
+    if invert:
+        flags = flags.translate(INVERT_FLAGS)
+    return array("l", compress(range(first, last + 1), flags))
+
+
+class LineMarks(object):
+    """Lines marked by :g, moved by the edits of its commands.
+
+    The marks are visited in order with next. The line of a mark is its
+    line when it was marked plus an offset, the sum of the deltas of the
+    edits before it, kept in a FenwickTree so that adding lines moves all
+    the following marks at once. The marks of deleted lines are skipped.
+    """
+
+    def __init__(self, lines):
+        """Mark lines, a sorted list of line numbers."""
+        self.lines = lines
+        self.index = 0
+        # offsets.prefix(index + 1) is the offset of mark index
+        self._offsets = FenwickTree([0] * (len(lines) + 1))
+        self._deleted = bytearray(len(lines))
+
+    def __len__(self):
+        """Return the number of marks."""
+        return len(self.lines)
+
+    def line(self, index):
+        """Return the current line of a mark."""
+        return self.lines[index] + self._offsets.prefix(index + 1)
+
+    def _find(self, line):
+        """Return the index of the first mark left on or after line."""
+        low, high = self.index, len(self.lines)
+        if low == high or self.line(low) >= line:
+            # Edits usually happen before the next mark
+            return low
+        while low < high:
+            middle = (low + high) // 2
+            if self.line(middle) < line:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def next(self):
+        """Return the line of the next mark, None after the last one."""
+        while self.index < len(self.lines):
+            index = self.index
+            self.index += 1
+            if not self._deleted[index]:
+                return self.line(index)
+        return None
+
+    def note_edit(self, adapter, position, length, text):
+        """Move the marks for an edit, before it is applied to adapter.
+
+        The lines of the edit keep their marks, the marks of the lines it
+        removes are deleted and the following marks move.
+        """
+        removed_text = adapter.get_text(position, position + length)
+        removed = removed_text.count("\n")
+        added = text.count("\n")
+        if removed == added:
+            return
+        line = adapter.block_number(position)
+        if position != adapter.block_position(line) or \
+                removed_text[-1:] not in ("", "\n") or \
+                text[-1:] not in ("", "\n"):
+            # The first line is changed, not removed or inserted
+            line += 1
+        if removed > added:
+            first = line + added
+            end = self._find(line + removed)
+            for index in range(self._find(first), end):
+                # Keep the marks in order, on the first deleted line
+                self._deleted[index] = 1
+                delta = first - self.line(index)
+                self._offsets.add(index, delta)
+                self._offsets.add(index + 1, -delta)
+        self._offsets.add(self._find(line + removed), added - removed)
+
+
+class MarkedAdapter(object):
+    """Editor adapter proxy used by the commands of :g.
+
+    Its edits move the marks and its cursor is only kept here, the caller
+    moves the editor cursor after the last line.
+    """
+
+    def __init__(self, adapter, marks):
+        """Wrap adapter, moving marks on its edits."""
+        self.adapter = adapter
+        self.marks = marks
+        self._cursor = adapter.cursor()
+
+    def __getattr__(self, name):
+        """Forward the other calls to the editor adapter."""
+        return getattr(self.adapter, name)
+
+    def cursor(self):
+        """Return the cursor position kept by the proxy."""
+        return self._cursor
+
+    def set_cursor(self, position):
+        """Move the cursor of the proxy only."""
+        self._cursor = position
+
+    def edit(self, edits):
+        """Apply the edits one by one, moving the marks before each."""
+        for edit in edits:
+            self.marks.note_edit(self.adapter, *edit)
+            self.adapter.edit([edit])
@@ -0,0 +1,570 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim motions and text objects.
+
+Motions and text objects are pure functions of a text snapshot: they take
+(text, position, count, arg) and return a (start, end, kind) range, or None
+when the motion fails. They never touch the editor, so an operator can work
+out its whole range before changing anything on screen.
+
+kind is one of:
+
+* "exclusive": end is not part of the range.
+* "inclusive": end is the last character of the range.
+* "line": the range covers the whole lines of start and end.
+* "char": an exact range from a text object, end is not part of it.
+"""
+
+BRACKETS = {"(": ("(", ")"), ")": ("(", ")"), "b": ("(", ")"),
+            "[": ("[", "]"), "]": ("[", "]"),
+            "{": ("{", "}"), "}": ("{", "}"), "B": ("{", "}"),
+            "<": ("<", ">"), ">": ("<", ">")}
+QUOTES = "\"'`"
+BLANKS = " \t"
+
+
+# %% Helpers
+def line_start(text, position):
+    """Return the position of the start of the line of position."""
+    return text.rfind("\n", 0, position) + 1
+
+
+def line_end(text, position):
+    """Return the position of the end of the line (its newline)."""
+    end = text.find("\n", position)
+    return len(text) if end == -1 else end
+
+
+def first_non_blank(text, position):
+    """Return the position of the first non-blank of the line."""
+    start = line_start(text, position)
+    end = line_end(text, start)
+    while start < end and text[start] in BLANKS:
+        start += 1
+    return start
+
+
+def line_offset(text, position, count):
+    """Return the start of the line count lines below position.
+
+    count can be negative to go up. Return None past the document.
+    """
+    start = line_start(text, position)
+    for __ in range(count):
+        newline = text.find("\n", start)
+        if newline == -1:
+            return None
+        start = newline + 1
+    for __ in range(-count):
+        if start == 0:
+            return None
+        start = line_start(text, start - 1)
+    return start
+
+
+def line_number_start(text, number):
+    """Return the start of the line number (1 based), clamped."""
+    start = 0
+    for __ in range(number - 1):
+        newline = text.find("\n", start)
+        if newline == -1:
+            break
+        start = newline + 1
+    return start
+
+
+def _char_class(char, bigword):
+    """Return 0 for blanks, 1 for punctuation and 2 for keyword chars."""
+    if char.isspace():
+        return 0
+    if bigword or char.isalnum() or char == "_":
+        return 2
+    return 1
+
+
+def _is_empty_line(text, position):
+    return (text[position] == "\n"
+            and (position == 0 or text[position - 1] == "\n"))
+
+
+def matching_bracket(text, position):
+    """Return the position of the bracket matching the next one, or -1.
+
+    The first bracket at or after position is used.
+    """
+    start_position = -1
+    for i, char in enumerate(text[position:]):
+        if char in "([{":
+            start_char = char
+            start_position = i + position + 1
+            sub_text = text[start_position:]
+            break
+        elif char in ")]}":
+            start_char = char
+            start_position = i + position
+            sub_text = reversed(text[0:start_position])
+            break
+    if start_position == -1:
+        return -1
+    pairs = {"(": ")", "[": "]", "{": "}", ")": "(", "]": "[", "}": "{"}
+    stack = [start_char]
+    for i, char in enumerate(sub_text):
+        if char in pairs and pairs[char] == stack[-1]:
+            stack.pop()
+        elif char in pairs:
+            stack.append(char)
+        if not stack and start_char in "([{":
+            return start_position + i
+        elif not stack:
+            return start_position - i - 1
+    return -1
+
+
+# %% Motions
+def left(text, position, count, arg=None):
+    """Move count chars left, on the line (h)."""
+    start = max(line_start(text, position), position - (count or 1))
+    return start, position, "exclusive"
+
+
+def right(text, position, count, arg=None):
+    """Move count chars right, on the line (l)."""
+    end = min(line_end(text, position), position + (count or 1))
+    return position, end, "exclusive"
+
+
+def down(text, position, count, arg=None):
+    """Move down by count lines (j)."""
+    end = line_offset(text, position, count or 1)
+    if end is None:
+        return None
+    return position, end, "line"
+
+
+def up(text, position, count, arg=None):
+    """Move up by count lines (k)."""
+    start = line_offset(text, position, -(count or 1))
+    if start is None:
+        return None
+    return start, position, "line"
+
+
+def _next_word_start(text, position, bigword):
+    length = len(text)
+    start = position
+    char_class = _char_class(text[position], bigword)
+    if char_class:
+        while (position < length
+               and _char_class(text[position], bigword) == char_class):
+            position += 1
+    while position < length and text[position].isspace():
+        if position > start and _is_empty_line(text, position):
+            break
+        position += 1
+    return position
+
+
+def _word_end(text, position, bigword):
+    length = len(text)
+    position += 1
+    while position < length and text[position].isspace():
+        position += 1
+    if position >= length:
+        return length - 1
+    char_class = _char_class(text[position], bigword)
+    while (position + 1 < length
+           and _char_class(text[position + 1], bigword) == char_class):
+        position += 1
+    return position
+
+
+def _prev_word_start(text, position, bigword):
+    position -= 1
+    while position > 0 and text[position].isspace():
+        if _is_empty_line(text, position):
+            return position
+        position -= 1
+    if position <= 0:
+        return 0
+    char_class = _char_class(text[position], bigword)
+    while (position > 0
+           and _char_class(text[position - 1], bigword) == char_class):
+        position -= 1
+    return position
+
+
+def word_forward(text, position, count, arg=None, bigword=False):
+    """Move to the start of the count-th next word (w)."""
+    end = position
+    for __ in range(count or 1):
+        if end >= len(text):
+            break
+        end = _next_word_start(text, end, bigword)
+    return position, end, "exclusive"
+
+
+def bigword_forward(text, position, count, arg=None):
+    """W"""
+    return word_forward(text, position, count, bigword=True)
+
+
+def word_backward(text, position, count, arg=None, bigword=False):
+    """Move to the start of the count-th previous word (b)."""
+    start = position
+    for __ in range(count or 1):
+        if start == 0:
+            break
+        start = _prev_word_start(text, start, bigword)
+    return start, position, "exclusive"
+
+
+def bigword_backward(text, position, count, arg=None):
+    """B"""
+    return word_backward(text, position, count, bigword=True)
+
+
+def word_end(text, position, count, arg=None, bigword=False):
+    """Move to the end of the count-th word (e)."""
+    if not text:
+        return None
+    end = position
+    for __ in range(count or 1):
+        end = _word_end(text, end, bigword)
+    return position, end, "inclusive"
+
+
+def bigword_end(text, position, count, arg=None):
+    """E"""
+    return word_end(text, position, count, bigword=True)
+
+
+def start_of_line(text, position, count, arg=None):
+    """0"""
+    return line_start(text, position), position, "exclusive"
+
+
+def first_non_blank_of_line(text, position, count, arg=None):
+    """^"""
+    target = first_non_blank(text, position)
+    return min(position, target), max(position, target), "exclusive"
+
+
+def end_of_line(text, position, count, arg=None):
+    """$"""
+    start = line_offset(text, position, (count or 1) - 1)
+    if start is None:
+        return None
+    return position, line_end(text, start), "exclusive"
+
+
+def last_line(text, position, count, arg=None):
+    """G"""
+    if count is None:
+        target = line_start(text, len(text))
+    else:
+        target = line_number_start(text, count)
+    return min(position, target), max(position, target), "line"
+
+
+def first_line(text, position, count, arg=None):
+    """Move to line count, the first line by default (gg)."""
+    target = line_number_start(text, count or 1)
+    return min(position, target), max(position, target), "line"
+
+
+def lines(text, position, count, arg=None):
+    """dd, yy, gUU... : count lines from the cursor."""
+    end = line_offset(text, position, (count or 1) - 1)
+    if end is None:
+        end = len(text)
+    return position, end, "line"
+
+
+def paragraph_forward(text, position, count, arg=None):
+    """}"""
+    length = len(text)
+    end = line_start(text, position)
+    for __ in range(count or 1):
+        while end < length and text[end] == "\n":
+            end += 1
+        # The next empty line follows two newlines
+        newline = text.find("\n\n", end)
+        end = length if newline == -1 else newline + 1
+    return position, end, "exclusive"
+
+
+def paragraph_backward(text, position, count, arg=None):
+    """{"""
+    start = line_start(text, position)
+    for __ in range(count or 1):
+        # Empty lines, including an empty last line
+        while start > 0 and text[start:start + 1] in ("\n", ""):
+            start = line_start(text, start - 1)
+        newline = text.rfind("\n\n", 0, start)
+        start = 0 if newline == -1 else newline + 1
+    return start, position, "exclusive"
+
+
+def find_char(text, position, count, arg):
+    """Find the count-th arg forward on the line (f)."""
+    end = position
+    for __ in range(count or 1):
+        end = text.find(arg, end + 1, line_end(text, position))
+        if end == -1:
+            return None
+    return position, end, "inclusive"
+
+
+def till_char(text, position, count, arg):
+    """Go till the count-th arg forward on the line (t)."""
+    result = find_char(text, position, count, arg)
+    if result is None:
+        return None
+    return position, result[1] - 1, "inclusive"
+
+
+def find_char_backward(text, position, count, arg):
+    """F"""
+    start = position
+    for __ in range(count or 1):
+        start = text.rfind(arg, line_start(text, position), start)
+        if start == -1:
+            return None
+    return start, position, "exclusive"
+
+
+def till_char_backward(text, position, count, arg):
+    """T"""
+    result = find_char_backward(text, position, count, arg)
+    if result is None:
+        return None
+    return result[0] + 1, position, "exclusive"
+
+
+def match_pair(text, position, count, arg=None):
+    """%"""
+    target = matching_bracket(text, position)
+    if target == -1:
+        return None
+    return min(position, target), max(position, target), "inclusive"
+
+
+# %% Text objects
+def _word_run(text, position, bigword):
+    """Return the range of chars of the class at position, on its line."""
+    start = end = position
+    first, last = line_start(text, position), line_end(text, position)
+    if position >= last:
+        return position, position
+    char_class = _char_class(text[position], bigword)
+    while (start > first
+           and _char_class(text[start - 1], bigword) == char_class):
+        start -= 1
+    while end < last and _char_class(text[end], bigword) == char_class:
+        end += 1
+    return start, end
+
+
+def word_object(text, position, count, around, bigword=False):
+    """iw, aw, iW and aW."""
+    last = line_end(text, position)
+    start, end = _word_run(text, position, bigword)
+    on_blank = position < last and text[position] in BLANKS
+    for index in range(count or 1):
+        if index:
+            if end >= last:
+                break
+            __, end = _word_run(text, end, bigword)
+        if around:
+            if on_blank and end < last:
+                __, end = _word_run(text, end, bigword)
+            elif not on_blank:
+                blank_end = end
+                while blank_end < last and text[blank_end] in BLANKS:
+                    blank_end += 1
+                if blank_end > end:
+                    end = blank_end
+                elif index == 0:
+                    first = line_start(text, position)
+                    while start > first and text[start - 1] in BLANKS:
+                        start -= 1
+    return start, end, "char"
+
+
+def paragraph_object(text, position, count, around):
+    """Select count paragraphs, linewise (ip and ap)."""
+    def is_blank(start):
+        return not text[start:line_end(text, start)].strip()
+
+    start = line_start(text, position)
+    blank = is_blank(start)
+    while start > 0:
+        previous = line_start(text, start - 1)
+        if is_blank(previous) != blank:
+            break
+        start = previous
+    end = line_start(text, position)
+    for index in range((count or 1) * (2 if around else 1)):
+        if index:
+            following = line_offset(text, end, 1)
+            if following is None:
+                break
+            end = following
+            blank = is_blank(end)
+        while True:
+            following = line_offset(text, end, 1)
+            if following is None or is_blank(following) != blank:
+                break
+            end = following
+    return start, end, "line"
+
+
+def bracket_object(text, position, count, around, open_char, close_char):
+    """i(, a(, i[, a{..."""
+    start = position
+    if position < len(text) and text[position] == close_char:
+        start = position - 1
+    depth = 0
+    for __ in range(count or 1):
+        while True:
+            if start < 0:
+                return None
+            char = text[start]
+            if char == close_char:
+                depth += 1
+            elif char == open_char:
+                if depth == 0:
+                    break
+                depth -= 1
+            start -= 1
+        open_position = start
+        start -= 1
+    depth = 0
+    end = open_position + 1
+    while True:
+        if end >= len(text):
+            return None
+        char = text[end]
+        if char == open_char:
+            depth += 1
+        elif char == close_char:
+            if depth == 0:
+                break
+            depth -= 1
+        end += 1
+    if around:
+        return open_position, end + 1, "char"
+    start = open_position + 1
+    if text[start:start + 1] == "\n":
+        # Keep the brackets on their own lines
+        first = line_start(text, end)
+        if not text[first:end].strip():
+            return start + 1, first, "char"
+    return start, end, "char"
+
+
+def quote_object(text, position, count, around, quote):
+    """i", a", i' and a`."""
+    first, last = line_start(text, position), line_end(text, position)
+    quotes = []
+    index = first
+    while index < last:
+        if text[index] == "\\":
+            index += 2
+            continue
+        if text[index] == quote:
+            quotes.append(index)
+        index += 1
+    pairs = list(zip(quotes[::2], quotes[1::2]))
+    for start, end in pairs:
+        if start <= position <= end or position < start:
+            break
+    else:
+        return None
+    if not around:
+        return start + 1, end, "char"
+    end += 1
+    blank_end = end
+    while blank_end < last and text[blank_end] in BLANKS:
+        blank_end += 1
+    if blank_end > end:
+        end = blank_end
+    else:
+        while start > first and text[start - 1] in BLANKS:
+            start -= 1
+    return start, end, "char"
+
+
+def _text_object(key):
+    around = key[0] == "a"
+    name = key[1]
+    if name in "wW":
+        return (lambda text, position, count, arg=None: word_object(
+            text, position, count, around, bigword=name == "W"))
+    if name == "p":
+        return (lambda text, position, count, arg=None: paragraph_object(
+            text, position, count, around))
+    if name in BRACKETS:
+        open_char, close_char = BRACKETS[name]
+        return (lambda text, position, count, arg=None: bracket_object(
+            text, position, count, around, open_char, close_char))
+    return (lambda text, position, count, arg=None: quote_object(
+        text, position, count, around, name))
+
+
+MOTIONS = {
+    "h": left,
+    "l": right,
+    " ": right,
+    "j": down,
+    "k": up,
+    "w": word_forward,
+    "W": bigword_forward,
+    "b": word_backward,
+    "B": bigword_backward,
+    "e": word_end,
+    "E": bigword_end,
+    "0": start_of_line,
+    "^": first_non_blank_of_line,
+    "$": end_of_line,
+    "G": last_line,
+    "gg": first_line,
+    "}": paragraph_forward,
+    "{": paragraph_backward,
+    "%": match_pair,
+    "f": find_char,
+    "t": till_char,
+    "F": find_char_backward,
+    "T": till_char_backward,
+    "lines": lines,
+}
+MOTIONS.update((prefix + name, _text_object(prefix + name))
+               for prefix in "ia" for name in "wWp" + "".join(BRACKETS)
+               + QUOTES)
+ARG_MOTIONS = "ftFT"
+
+
+def parse_motion(keys, operator):
+    """Return (name, arg) of the motion typed after operator.
+
+    Return None if more keys are needed and raise ValueError if keys is not
+    a motion.
+    """
+    if keys in (operator, operator[-1]):
+        # Doubled operator: dd, gUU, gUgU, g~~...
+        return "lines", None
+    if keys in ("", "g", "i", "a"):
+        return None
+    if keys[0] in ARG_MOTIONS:
+        if len(keys) == 1:
+            return None
+        if len(keys) == 2:
+            return keys[0], keys[1]
+    elif keys in MOTIONS and keys != "lines":
+        return keys, None
+    raise ValueError(keys)
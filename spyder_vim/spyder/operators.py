@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim operators.
+
+An operator (d, c, y, <, >, =, gu, gU, g~) followed by a motion or a text
+object is resolved on a text snapshot into the edits to apply, the text to
+store in a register and the new cursor position. Nothing here touches an
+editor, the caller applies the result through its editor adapter.
+"""
+import re
+
+# Local imports
+from spyder_vim.spyder.motions import (MOTIONS, first_non_blank, line_end,
+                                       line_start)
+
+INDENT = "    "
+# [count]operator[count]motion, e.g. d5}, y3aw, gUiw
+RE_VIM_OPERATOR = re.compile(
+    r"^([1-9]\d*)?(d|c|y|>|<|=|g[uU~])([1-9]\d*)?(.*)$")
+
+
+def operator_range(text, position, operator, motion, count=None, arg=None):
+    """Return the (start, end, mode) range an operator works on.
+
+    mode is "line" or "char" and end is not part of the range. For "line"
+    ranges, start is the start of the first line and end the end of the
+    last line (without its newline). Return None if the motion fails.
+    """
+    if operator == "c" and motion in ("w", "W") and position < len(text) \
+            and not text[position].isspace():
+        # Like vim, cw changes up to the end of the word under the cursor
+        result = MOTIONS["e" if motion == "w" else "E"](
+            text, position - 1, count, arg)
+        result = (position,) + result[1:]
+    else:
+        result = MOTIONS[motion](text, position, count, arg)
+    if result is None:
+        return None
+    start, end, kind = result
+    if kind == "inclusive":
+        end = min(end + 1, len(text))
+    elif kind == "exclusive" and end > start:
+        if motion in ("w", "W") and "\n" in text[start:end]:
+            # The last word moved over ends the range, not the next line
+            newline = text.rfind("\n", start, end)
+            if newline > start:
+                end = newline
+        if text[end - 1] == "\n":
+            # Exclusive motion ending in column 0
+            end -= 1
+            if start <= first_non_blank(text, start):
+                kind = "line"
+    if operator in "<>=":
+        kind = "line"
+    if kind == "line":
+        return line_start(text, start), line_end(text, end), "line"
+    return start, end, "char"
+
+
+def apply_operator(text, position, operator, motion, count=None, arg=None):
+    """Resolve an operator on a text snapshot.
+
+    Return (edits, register, cursor) where edits is a list of
+    (position, length, text) replacements, register the (text, mode) to
+    store or None and cursor the position after the edits. Return None if
+    the motion fails.
+    """
+    result = operator_range(text, position, operator, motion, count, arg)
+    if result is None:
+        return None
+    start, end, mode = result
+    if operator in "dcy":
+        return _register_operator(operator, text, start, end, mode, position)
+    return _transform_operator(operator, text, start, end)
+
+
+def _register_operator(operator, text, start, end, mode, position):
+    """Yank, delete or change a range."""
+    register = (text[start:end] + ("\n" if mode == "line" else ""), mode)
+    if operator == "y":
+        if mode == "line" and start <= position <= end:
+            return [], register, position
+        return [], register, start
+    if mode == "char":
+        cursor = start
+        if operator == "d" and start > line_start(text, start) and (
+                end >= len(text) or text[end] == "\n"):
+            cursor -= 1
+        return [(start, end - start, "")], register, cursor
+    if operator == "c":
+        indent = text[start:first_non_blank(text, start)]
+        return [(start, end - start, indent)], register, start + len(indent)
+    if end < len(text):
+        cursor = first_non_blank(text, end + 1) - (end + 1 - start)
+        return [(start, end + 1 - start, "")], register, cursor
+    if start > 0:
+        # Deleting the last lines removes the newline before them
+        cursor = first_non_blank(text, start - 1)
+        return [(start - 1, end - start + 1, "")], register, cursor
+    return [(start, end - start, "")], register, 0
+
+
+def _transform_operator(operator, text, start, end):
+    """Change the case, the indentation or re-indent a range."""
+    old_text = text[start:end]
+    if operator == "gu":
+        new_text = old_text.lower()
+    elif operator == "gU":
+        new_text = old_text.upper()
+    elif operator == "g~":
+        new_text = old_text.swapcase()
+    else:
+        new_lines = []
+        for line in old_text.split("\n"):
+            if operator == ">":
+                line = INDENT + line if line else line
+            elif operator == "<":
+                blanks = len(line) - len(line.lstrip())
+                line = line[min(blanks, len(INDENT)):]
+            else:
+                # Python indentation can not be recomputed, = only
+                # normalizes tabs and trailing blanks
+                content = line.lstrip()
+                indent = line[:len(line) - len(content)]
+                line = indent.replace("\t", INDENT) + content.rstrip()
+            new_lines.append(line)
+        new_text = "\n".join(new_lines)
+    edits = [(start, end - start, new_text)] if new_text != old_text else []
+    if operator in "<>=":
+        first = new_text.split("\n", 1)[0]
+        return edits, None, start + len(first) - len(first.lstrip())
+    return edits, None, start
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim read-only pager for huge files (:view).
+
+The file is memory mapped and never read as a whole: moving finds the
+newlines around the current line and searches run the regular expression
+on the mapped bytes. Line numbers come from a sparse index, the offset of
+one line every LINE_STEP lines, built in a background thread. Commands
+which need a line number wait for the index to reach it.
+"""
+# Standard library imports
+import bisect
+import mmap
+import os
+import re
+import threading
+from itertools import accumulate
+
+LINE_STEP = 1024  # Lines between two offsets of the index
+INDEX_CHUNK = 2 ** 22  # Bytes indexed at once
+SEARCH_CHUNK = 2 ** 22  # Bytes searched at once by backward searches
+
+
+class LineIndex(object):
+    """Sparse index of the line offsets of a buffer.
+
+    offsets[k] is the offset of line k * LINE_STEP. The index is built by
+    chunks with build_chunk, in the thread started by start.
+    """
+
+    def __init__(self, buffer):
+        """Create an empty index of buffer."""
+        self.buffer = buffer
+        self.offsets = []
+        # Lines and bytes indexed
+        self.lines = 0
+        self.position = 0
+        self.done = len(buffer) == 0
+        if self.done:
+            self.offsets.append(0)
+            self.lines = 1
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Build the index in a background thread."""
+        self._thread = threading.Thread(target=self._build, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop building the index."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def wait(self, timeout=None):
+        """Wait for the index to be complete, return True if it is.
+
+        Without a background thread, the index is built in the caller.
+        """
+        if self._thread is None:
+            self._build()
+        else:
+            self._thread.join(timeout)
+        return self.done
+
+    def _build(self):
+        while not self.done and not self._stop.is_set():
+            self.build_chunk()
+
+    def build_chunk(self):
+        """Index the lines of the next chunk of the buffer."""
+        buffer = self.buffer
+        size = len(buffer)
+        position = self.position
+        end = min(size, position + INDEX_CHUNK)
+        data = buffer[position:end]
+        if end < size:
+            last = data.rfind(b"\n")
+            if last == -1:
+                # A line longer than a chunk
+                newline = buffer.find(b"\n", end)
+                end = size if newline == -1 else newline + 1
+                data = buffer[position:end]
+            else:
+                data = data[:last + 1]
+        # Lengths of the lines starting in data, with their newline
+        lengths = [len(part) + 1 for part in data.split(b"\n")]
+        if data.endswith(b"\n"):
+            lengths.pop()
+        starts = [0]
+        starts.extend(accumulate(lengths[:-1]))
+        first = -self.lines % LINE_STEP
+        self.offsets.extend(position + start
+                            for start in starts[first::LINE_STEP])
+        self.lines += len(starts)
+        self.position = position + len(data)
+        if self.position >= size:
+            if data.endswith(b"\n"):
+                # The empty line after the last newline
+                if self.lines % LINE_STEP == 0:
+                    self.offsets.append(size)
+                self.lines += 1
+            self.done = True
+
+    def progress(self):
+        """Return the fraction of the buffer indexed."""
+        return self.position / len(self.buffer) if len(self.buffer) else 1
+
+    def line_offset(self, line):
+        """Return the offset of line, or None if it is not indexed yet."""
+        if line >= self.lines:
+            return None
+        step, rest = divmod(line, LINE_STEP)
+        offset = self.offsets[step]
+        for __ in range(rest):
+            offset = self.buffer.find(b"\n", offset) + 1
+        return offset
+
+    def line_number(self, offset):
+        """Return the line of offset, or None if it is not indexed yet."""
+        if not self.done and offset >= self.position:
+            return None
+        step = bisect.bisect_right(self.offsets, offset) - 1
+        start = self.offsets[step]
+        return step * LINE_STEP + self.buffer[start:offset].count(b"\n")
+
+
+class Pager(object):
+    """Read-only view of a memory mapped file.
+
+    position is the offset of the current line, the first one shown.
+    """
+
+    def __init__(self, path, encoding="utf-8", index=True):
+        """Map the file at path, and index its lines if index is True."""
+        self.path = path
+        self.encoding = encoding
+        self._file = open(path, "rb")
+        if os.fstat(self._file.fileno()).st_size:
+            self.buffer = mmap.mmap(self._file.fileno(), 0,
+                                    access=mmap.ACCESS_READ)
+        else:
+            self.buffer = b""
+        self.size = len(self.buffer)
+        self.index = LineIndex(self.buffer)
+        if index and not self.index.done:
+            self.index.start()
+        self.position = 0
+        self.pattern = None
+        self.reverse = False
+
+    def close(self):
+        """Stop the index and unmap the file."""
+        self.index.stop()
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        self._file.close()
+
+    # --- Lines
+    def _line_end(self, offset):
+        end = self.buffer.find(b"\n", offset)
+        return self.size if end == -1 else end
+
+    def _line_start(self, offset):
+        return self.buffer.rfind(b"\n", 0, offset) + 1
+
+    def lines(self, count):
+        """Return the text of count lines from the current one."""
+        lines = []
+        offset = self.position
+        while len(lines) < count and offset <= self.size:
+            end = self._line_end(offset)
+            lines.append(self.buffer[offset:end].decode(self.encoding,
+                                                        "replace"))
+            if end == self.size:
+                break
+            offset = end + 1
+        return lines
+
+    def line_number(self):
+        """Return the current line (from 0), or None if not indexed yet."""
+        return self.index.line_number(self.position)
+
+    # --- Moves
+    def down(self, count=1):
+        """Move down by count lines (j)."""
+        for __ in range(count):
+            end = self._line_end(self.position)
+            if end == self.size:
+                break
+            self.position = end + 1
+
+    def up(self, count=1):
+        """Move up by count lines (k)."""
+        for __ in range(count):
+            if self.position == 0:
+                break
+            self.position = self._line_start(self.position - 1)
+
+    def first(self):
+        """Go to the first line (gg)."""
+        self.position = 0
+
+    def last(self):
+        """Go to the last line (G)."""
+        self.position = self._line_start(self.size)
+
+    def goto_line(self, line, wait=True):
+        """Go to line (from 0) or to the last line if there are less.
+
+        Return False if the line is not indexed and wait is False.
+        """
+        while True:
+            offset = self.index.line_offset(line)
+            if offset is not None:
+                self.position = offset
+                return True
+            if self.index.done:
+                self.last()
+                return True
+            if not wait:
+                return False
+            self.index.wait(0.05)
+
+    # --- Search
+    def search(self, pattern, reverse=False):
+        """Search pattern (a Python regular expression) from the cursor.
+
+        Return True if a match was found. Raise re.error if pattern is not
+        valid.
+        """
+        self.pattern = re.compile(pattern.encode(self.encoding),
+                                  re.MULTILINE)
+        self.reverse = reverse
+        return self.next()
+
+    def next(self, reverse=False):
+        """Go to the next match (n), or the previous one (N)."""
+        if self.pattern is None:
+            return False
+        if self.reverse ^ reverse:
+            start = self._search_backward(self.position, 0)
+            if start is None:
+                start = self._search_backward(self.size, self.position)
+        else:
+            end = self._line_end(self.position) + 1
+            start = self._search_forward(end, self.size)
+            if start is None:
+                start = self._search_forward(0, end)
+        if start is None:
+            return False
+        self.position = self._line_start(start)
+        return True
+
+    def _search_forward(self, start, end):
+        match = self.pattern.search(self.buffer, start, end)
+        return None if match is None else match.start()
+
+    def _search_backward(self, end, limit):
+        """Return the last match starting before end, from limit."""
+        while end > limit:
+            start = max(limit, end - SEARCH_CHUNK)
+            if start > limit:
+                start = self._line_start(start)
+            found = None
+            for match in self.pattern.finditer(self.buffer, start, end):
+                found = match.start()
+            if found is not None:
+                return found
+            end = start
+        return None
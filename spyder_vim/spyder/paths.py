@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim index of the files of a project, to open them by name (:e).
+
+The tree is scanned once in a background thread, then single directories
+are scanned again when they change. Files are found from a dictionary of
+their names, so opening a file by name never walks the tree, even in a
+project of 100k files.
+"""
+# Standard library imports
+import os
+import os.path as osp
+import threading
+from collections import deque
+
+# Directories never indexed, besides the hidden ones
+IGNORED_DIRS = frozenset(["__pycache__", "node_modules"])
+READ_CHUNK = 2 ** 20  # Bytes read at once by read_ahead
+
+
+def scan_directory(path):
+    """Return the (files, subdirectories) names of a directory, or None.
+
+    Hidden and ignored subdirectories are left out, as are links to
+    directories, which could make cycles.
+    """
+    files = set()
+    subdirectories = set()
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                name = entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not (name.startswith(".")
+                                or name in IGNORED_DIRS):
+                            subdirectories.add(name)
+                    elif entry.is_file():
+                        files.add(name)
+                except OSError:
+                    continue
+    except OSError:
+        return None
+    return files, subdirectories
+
+
+def read_ahead(path):
+    """Read a file and drop its content, to have it in the system cache."""
+    try:
+        with open(path, "rb") as fh:
+            while fh.read(READ_CHUNK):
+                pass
+    except OSError:
+        pass
+
+
+class PathIndex(object):
+    """Files under a root directory, by name.
+
+    directories maps the relative path of each directory ("" for the root)
+    to its (files, subdirectories) names, and names maps each file name to
+    the directories which have a file of that name. The directories queued
+    by refresh are scanned in the thread started by start.
+    """
+
+    def __init__(self, root):
+        """Create an empty index of the files under root."""
+        self.root = root
+        self.directories = {}
+        self.names = {}
+        self.files = 0
+        # Incremented by every change
+        self.version = 0
+        self.done = False
+        self._queue = deque([""])
+        # Directories scanned for the first time, see take_directories
+        self._new = []
+        self._lock = threading.Lock()
+        self._running = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Scan the queued directories in a background thread."""
+        with self._lock:
+            if self._running or not self._queue:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._build, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop scanning."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def wait(self, timeout=None):
+        """Wait for the index to be complete, return True if it is.
+
+        Without a background thread, the index is built in the caller.
+        """
+        if self._thread is None:
+            with self._lock:
+                self._running = True
+            self._build()
+        else:
+            self._thread.join(timeout)
+        return self.done
+
+    def refresh(self, directory):
+        """Scan a directory again, and its new subdirectories."""
+        with self._lock:
+            self._queue.append(directory)
+            self.done = False
+        self.start()
+
+    def _build(self):
+        while True:
+            with self._lock:
+                if self._stop.is_set() or not self._queue:
+                    self.done = not self._queue
+                    self._running = False
+                    return
+                directory = self._queue.popleft()
+            listing = scan_directory(osp.join(self.root, directory))
+            with self._lock:
+                self._update(directory, listing)
+
+    def _update(self, directory, listing):
+        """Store the listing of a directory, None if it was removed."""
+        if listing is not None and directory not in self.directories:
+            self._new.append(directory)
+        old_files, old_subdirectories = self.directories.pop(
+            directory, (set(), set()))
+        if listing is None:
+            listing = (set(), set())
+        else:
+            self.directories[directory] = listing
+        files, subdirectories = listing
+        self.version += 1
+        for name in old_files - files:
+            directories = self.names[name]
+            directories.discard(directory)
+            if not directories:
+                del self.names[name]
+        for name in files - old_files:
+            self.names.setdefault(name, set()).add(directory)
+        self.files += len(files) - len(old_files)
+        for name in old_subdirectories - subdirectories:
+            self._update(osp.join(directory, name), None)
+        for name in subdirectories - old_subdirectories:
+            self._queue.append(osp.join(directory, name))
+
+    def take_directories(self):
+        """Return the directories scanned since the last call."""
+        with self._lock:
+            directories, self._new = self._new, []
+        return directories
+
+    def listing(self, directory):
+        """Return the (files, subdirectories) of a directory, or None."""
+        with self._lock:
+            return self.directories.get(directory)
+
+    def names_with_prefix(self, prefix):
+        """Return the sorted file names starting with prefix."""
+        with self._lock:
+            return sorted(name for name in self.names
+                          if name.startswith(prefix))
+
+    def find(self, name):
+        """Return the relative paths of the files matching name, sorted.
+
+        name is a file name or the end of a relative path (pkg/mod.py).
+        """
+        head, base = osp.split(osp.normpath(name))
+        with self._lock:
+            directories = list(self.names.get(base, ()))
+        suffix = os.sep + head
+        return sorted(osp.join(directory, base) for directory in directories
+                      if not head or directory == head
+                      or directory.endswith(suffix))
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim command latency statistics and profiles.
+
+When enabled (:perf on), every command handler records its call count and
+a latency histogram, with the number of calls to the costly editor methods
+made while it runs. When disabled, handlers are called directly and the
+editors are left untouched.
+
+While a profile is captured (:profile start), the key handling runs under
+cProfile and every key, command and overlay update is recorded as a span
+of a Chrome trace (chrome://tracing or https://ui.perfetto.dev).
+"""
+# Standard library imports
+import cProfile
+import json
+import os
+import os.path as osp
+import threading
+from time import perf_counter
+
+# Sub-buckets per power of two, the relative error of a bucket is 1/8
+SUB_BUCKET_BITS = 3
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+# Editor methods counted while a handler runs
+EDITOR_METHODS = ("set_extra_selections", "setTextCursor", "toPlainText")
+# Editor methods recorded as overlay spans in profiles
+OVERLAY_METHODS = ("set_extra_selections", "clear_extra_selections")
+
+
+def bucket_index(value):
+    """Return the histogram bucket of an integer value.
+
+    Values below 2 * SUB_BUCKETS have their own bucket, above the buckets
+    split each power of two in SUB_BUCKETS, like HDR histograms.
+    """
+    if value < 2 * SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return shift * SUB_BUCKETS + (value >> shift)
+
+
+def bucket_range(index):
+    """Return the lowest and highest values of a bucket."""
+    if index < 2 * SUB_BUCKETS:
+        return index, index
+    shift = index // SUB_BUCKETS - 1
+    mantissa = index - shift * SUB_BUCKETS
+    return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+
+class Histogram(object):
+    """Counts of integer values in logarithmic buckets."""
+
+    __slots__ = ("counts", "count", "maximum")
+
+    def __init__(self):
+        """Create an empty histogram."""
+        self.counts = {}
+        self.count = 0
+        self.maximum = 0
+
+    def add(self, value):
+        """Record a value."""
+        index = bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        if value > self.maximum:
+            self.maximum = value
+
+    def percentile(self, fraction):
+        """Return the highest value of the bucket holding the percentile."""
+        if not self.count:
+            return 0
+        rank = max(1, fraction * self.count)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(bucket_range(index)[1], self.maximum)
+        return self.maximum
+
+
+class HandlerStats(object):
+    """Calls, latency and editor calls of a command handler."""
+
+    __slots__ = ("calls", "total", "histogram", "editor_calls")
+
+    def __init__(self):
+        """Create the statistics of a handler not called yet."""
+        self.calls = 0
+        # In microseconds
+        self.total = 0
+        self.histogram = Histogram()
+        self.editor_calls = dict.fromkeys(EDITOR_METHODS, 0)
+
+
+class Profiler(object):
+    """cProfile statistics and trace events of the plugin key handling.
+
+    cProfile only runs inside the outermost span, so the profile holds the
+    plugin frames and what they call, not the rest of Spyder.
+    """
+
+    def __init__(self, path):
+        """Create a profiler saving its results under path."""
+        self.path = path
+        self.profile = cProfile.Profile()
+        self.events = []
+        self._depth = 0
+        self._origin = perf_counter()
+        # Fails if another profiler is running
+        self.profile.enable()
+        self.profile.disable()
+
+    def span(self, name, category, function, *args, **kwargs):
+        """Call function, recorded as a span of the trace."""
+        outer = self._depth == 0
+        self._depth += 1
+        if outer:
+            self.profile.enable()
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            end = perf_counter()
+            if outer:
+                self.profile.disable()
+            self._depth -= 1
+            self.events.append({
+                "name": name, "cat": category, "ph": "X",
+                "ts": round((start - self._origin) * 1e6, 1),
+                "dur": round((end - start) * 1e6, 1),
+                "pid": os.getpid(), "tid": threading.get_ident()})
+
+    def save(self):
+        """Write the profile and the trace, return their paths.
+
+        The trace is written next to the profile with a .json extension.
+        """
+        self.profile.disable()
+        dirname = osp.dirname(self.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self.profile.dump_stats(self.path)
+        trace_path = osp.splitext(self.path)[0] + ".json"
+        with open(trace_path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events,
+                       "displayTimeUnit": "ms"}, f)
+        return self.path, trace_path
+
+
+class PerfStats(object):
+    """Latency statistics and profile of the command handlers."""
+
+    def __init__(self):
+        """Create disabled statistics."""
+        self.enabled = False
+        self.handlers = {}
+        self.profiler = None
+        self._current = None
+        # Editors with wrappers, by id
+        self._editors = {}
+
+    def run(self, name, editor, function, *args, **kwargs):
+        """Call function, recorded as handler name if enabled.
+
+        Calls made while another handler runs are part of it.
+        """
+        if self.profiler is not None:
+            self._instrument(editor)
+            return self.profiler.span(name, "command", self._measure, name,
+                                      editor, function, *args, **kwargs)
+        return self._measure(name, editor, function, *args, **kwargs)
+
+    def _measure(self, name, editor, function, *args, **kwargs):
+        if not self.enabled or self._current is not None:
+            return function(*args, **kwargs)
+        stats = self.handlers.get(name) or HandlerStats()
+        self._instrument(editor)
+        self._current = stats
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = int((perf_counter() - start) * 1e6)
+            self._current = None
+            self.handlers[name] = stats
+            stats.calls += 1
+            stats.total += elapsed
+            stats.histogram.add(elapsed)
+
+    def _instrument(self, editor):
+        """Wrap the editor methods which are counted or profiled.
+
+        The wrappers are instance attributes, so only Python callers are
+        seen.
+        """
+        if editor is None or id(editor) in self._editors:
+            return
+        for name in set(EDITOR_METHODS + OVERLAY_METHODS):
+            setattr(editor, name, self._wrapper(name, getattr(editor, name)))
+        self._editors[id(editor)] = editor
+        editor.destroyed.connect(
+            lambda *args, key=id(editor): self._editors.pop(key, None))
+
+    def _wrapper(self, name, method):
+        def wrapper(*args, **kwargs):
+            if self._current is not None and name in EDITOR_METHODS:
+                self._current.editor_calls[name] += 1
+            if self.profiler is not None and name in OVERLAY_METHODS:
+                return self.profiler.span(name, "overlay", method, *args,
+                                          **kwargs)
+            return method(*args, **kwargs)
+        return wrapper
+
+    def _release(self):
+        """Remove the editor wrappers if nothing uses them."""
+        if self.enabled or self.profiler is not None:
+            return
+        for editor in self._editors.values():
+            for name in set(EDITOR_METHODS + OVERLAY_METHODS):
+                try:
+                    delattr(editor, name)
+                except (AttributeError, RuntimeError):
+                    pass
+        self._editors.clear()
+
+    def start(self):
+        """Enable the statistics."""
+        self.enabled = True
+
+    def stop(self):
+        """Disable the statistics."""
+        self.enabled = False
+        self._release()
+
+    def start_profile(self, path):
+        """Start capturing a profile written to path."""
+        self.profiler = Profiler(path)
+
+    def stop_profile(self):
+        """Stop the profile, write it and return the written paths."""
+        profiler = self.profiler
+        self.profiler = None
+        self._release()
+        return profiler.save()
+
+    def reset(self):
+        """Forget the recorded statistics."""
+        self.handlers.clear()
+
+    def report(self):
+        """Return the statistics as a text table, slowest handlers first."""
+        lines = ["{:<16} {:>7} {:>10} {:>8} {:>8} {:>8} {:>8} {:>6} "
+                 "{:>6} {:>6}".format("handler", "calls", "total ms",
+                                      "mean ms", "p50 ms", "p99 ms",
+                                      "max ms", "sel", "cursor", "text")]
+        handlers = sorted(self.handlers.items(),
+                          key=lambda item: item[1].total, reverse=True)
+        for name, stats in handlers:
+            histogram = stats.histogram
+            calls = stats.calls
+            editor_calls = [stats.editor_calls[method] / calls
+                            for method in EDITOR_METHODS]
+            lines.append(
+                "{:<16} {:>7} {:>10.1f} {:>8.2f} {:>8.2f} {:>8.2f} {:>8.2f} "
+                "{:>6.1f} {:>6.1f} {:>6.1f}".format(
+                    name, calls, stats.total / 1e3, stats.total / calls / 1e3,
+                    histogram.percentile(0.5) / 1e3,
+                    histogram.percentile(0.99) / 1e3,
+                    histogram.maximum / 1e3, *editor_calls))
+        if not handlers:
+            lines.append("no command recorded" if self.enabled
+                         else "statistics are off, start them with :perf on")
+        return "\n".join(lines)
@@ -6,7 +6,14 @@
 # ----------------------------------------------------------------------------
 """
 spyder-vim Plugin.
+
+The vim widget is built the first time the command line gets the focus, by
+Esc or by a click on it: at startup the plugin only adds a placeholder and
+the Esc shortcut, widgets.py is not even imported.
 """
+# Standard library imports
+import logging
+from time import perf_counter
 
 # Third-party imports
 from qtpy.QtCore import Qt
@@ -21,9 +28,12 @@ from spyder.api.translations import get_translation
 # Local imports
 from spyder_vim.spyder.confpage import SpyderVimConfigPage
 from spyder_vim.spyder.container import SpyderVimContainer
-from spyder_vim.spyder.widgets import VimWidget
+from spyder_vim.spyder.stub import VimStub
 
 _ = get_translation("spyder_vim.spyder")
+logger = logging.getLogger(__name__)
+
+STARTUP_BUDGET = 0.005  # s, time of on_editor_available
 
 
 class SpyderVim(SpyderPluginV2):
@@ -60,15 +70,25 @@ class SpyderVim(SpyderPluginV2):
         """
         Set up interactions when Editor plugin available.
         """
+        start = perf_counter()
         editor = self.get_plugin(Plugins.Editor)
         widget = editor.get_widget()
-        self.vim_cmd = VimWidget(widget, self.main)
-        widget.layout().addWidget(self.vim_cmd)
+        self.vim_cmd = None
+        self._stub = VimStub(widget)
+        self._stub.sig_activated.connect(self.focus_vim)
+        widget.layout().addWidget(self._stub)
         sc = QShortcut(
             QKeySequence("Esc"),
             widget.editorsplitter,
-            self.vim_cmd.commandline.setFocus)
+            self.focus_vim)
         sc.setContext(Qt.WidgetWithChildrenShortcut)
+        elapsed = perf_counter() - start
+        if elapsed > STARTUP_BUDGET:
+            logger.warning("Startup took %.1f ms, over its budget of %.1f ms",
+                           elapsed * 1000, STARTUP_BUDGET * 1000)
+        else:
+            logger.debug("Startup took %.1f ms, budget %.1f ms",
+                         elapsed * 1000, STARTUP_BUDGET * 1000)
 
     def check_compatibility(self):
         valid = True
@@ -76,7 +96,27 @@ class SpyderVim(SpyderPluginV2):
         return valid, message
 
     def on_close(self, cancellable=True):
+        if getattr(self, "vim_cmd", None) is not None:
+            self.vim_cmd.viminfo.flush()
         return True
 
     # --- Public API
     # ------------------------------------------------------------------------
+    def setup_vim(self):
+        """Return the vim widget, built in place of the stub on first call."""
+        if self.vim_cmd is None:
+            start = perf_counter()
+            from spyder_vim.spyder.widgets import VimWidget
+            widget = self.get_plugin(Plugins.Editor).get_widget()
+            self.vim_cmd = VimWidget(widget, self.main)
+            widget.layout().replaceWidget(self._stub, self.vim_cmd)
+            self._stub.hide()
+            self._stub.deleteLater()
+            self._stub = None
+            logger.debug("Vim widget built in %.1f ms",
+                         (perf_counter() - start) * 1000)
+        return self.vim_cmd
+
+    def focus_vim(self):
+        """Give the focus to the vim command line."""
+        self.setup_vim().commandline.setFocus()
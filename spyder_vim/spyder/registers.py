@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""spyder-vim registers."""
+
+NUMBERED_REGISTERS = "123456789"
+READ_ONLY_REGISTERS = ".%#:"
+
+
+class Register(object):
+    """Register content stored as a list of chunks.
+
+    Appending only adds a chunk, the chunks are joined the first time the
+    text is read. The list of lines used by linewise pastes is computed once
+    per content. A chunk can also be a function returning the text, for
+    registers restored from disk.
+    """
+
+    __slots__ = ("mode", "_chunks", "_lines")
+
+    def __init__(self, text="", mode=False):
+        """Create a register holding text, pasted by line if mode is line."""
+        self.mode = mode
+        self._chunks = [text]
+        self._lines = None
+
+    @property
+    def text(self):
+        """Return the register text."""
+        if len(self._chunks) > 1 or callable(self._chunks[0]):
+            self._chunks = ["".join(chunk() if callable(chunk) else chunk
+                                    for chunk in self._chunks)]
+        return self._chunks[0]
+
+    def lines(self):
+        """Return the register text split in lines."""
+        if self._lines is None:
+            self._lines = self.text.splitlines()
+        return self._lines
+
+    def append(self, text, mode):
+        """Append text to the register."""
+        self._chunks.append(text)
+        self._lines = None
+        self.mode = mode
+
+
+class RegisterStore(object):
+    """Vim registers.
+
+    The numbered registers 1-9 are a ring buffer, so a delete shifts them
+    by moving the head instead of copying every entry.
+
+    The listener, if set, is told about every change to save it (see
+    VimInfo.set_register and VimInfo.push_deleted).
+    """
+
+    def __init__(self, listener=None):
+        """Create empty registers, changes are told to listener."""
+        self.listener = listener
+        self._ring = [Register() for __ in NUMBERED_REGISTERS]
+        self._head = 0
+        self._registers = {"0": Register(), "-": Register(),
+                           "unnamed": Register()}
+
+    def __contains__(self, name):
+        """Return True if name is a register."""
+        return name in NUMBERED_REGISTERS or name in self._registers
+
+    def __getitem__(self, name):
+        """Return the Register object of name."""
+        if name in NUMBERED_REGISTERS:
+            index = (self._head + int(name) - 1) % len(self._ring)
+            return self._ring[index]
+        return self._registers[name]
+
+    def set(self, text, mode, register="unnamed", cut=False):
+        """Store text in the register and update the special registers."""
+        # Delete and small delete registers
+        if cut and (mode == "line" or "\n" in text):
+            self._push(Register(text, mode))
+            changed = []
+        else:
+            self._registers["0"] = Register(text, mode)
+            self._registers["-"] = Register(text, mode)
+            changed = ["0", "-"]
+        # General register
+        if register.isdigit() or register in READ_ONLY_REGISTERS:
+            pass
+        elif register.islower():
+            self._registers[register] = Register(text, mode)
+            changed.append(register)
+        elif register.isupper():
+            register = register.lower()
+            if register in self._registers:
+                self._registers[register].append(text, mode)
+            else:
+                self._registers[register] = Register(text, mode)
+            changed.append(register)
+        if register in self._registers:
+            # The unnamed register points to the last used register
+            self._registers["unnamed"] = self._registers[register]
+        else:
+            self._registers["unnamed"] = Register(text, mode)
+        if self.listener is not None:
+            if not changed:
+                self.listener.push_deleted(text, mode)
+            for name in changed:
+                if name != "unnamed":
+                    content = self._registers[name]
+                    self.listener.set_register(
+                        name, lambda content=content: content.text,
+                        content.mode)
+
+    def restore(self, registers, deleted):
+        """Restore registers saved by a previous session.
+
+        registers maps names to (text, mode) and deleted holds the
+        (text, mode) of the last deletes, oldest first.
+        """
+        for name, (text, mode) in registers.items():
+            self._registers[name] = Register(text, mode)
+        for text, mode in deleted:
+            self._push(Register(text, mode))
+
+    def _push(self, register):
+        """Shift the numbered registers and store register in 1."""
+        self._head = (self._head - 1) % len(self._ring)
+        self._ring[self._head] = register
+
+    def get(self, register="unnamed"):
+        """Return the register or an empty one if it was never set."""
+        if register in self:
+            return self[register]
+        return Register()
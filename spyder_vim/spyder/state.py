@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim state of each document.
+
+The results of the last search, the '< and '> marks and the change list
+belong to a document, so switching files never moves the cursor to the
+matches of another file. States are created on first use and the least
+recently used ones are dropped once their estimated size exceeds a limit:
+a dropped state is created again, empty, if its document is used again.
+Registers, named marks and the jump list are global, see VimInfo.
+"""
+# Standard library imports
+from collections import OrderedDict
+
+CHANGELIST_SIZE = 100  # Changes kept per document, as in Vim
+STATE_MEMORY_LIMIT = 32 * 2 ** 20  # Estimated bytes of all the states
+# Estimated bytes of a state, of each search match and of each change
+STATE_SIZE = 1024
+MATCH_SIZE = 256
+CHANGE_SIZE = 64
+
+
+class DocumentState(object):
+    """Vim state of one document.
+
+    search is the result of the last search in the document, see
+    VimKeys.search, and visual_lines the (first, last) lines of its last
+    visual selection. changes holds the (line, column) of the last changes,
+    oldest first, and change_index the position of g; and g, in it, None
+    until they are used after a change. Size changes are reported to
+    states, the DocumentStates holding the state, if any.
+    """
+
+    __slots__ = ("_search", "visual_lines", "changes", "change_index",
+                 "_states")
+
+    def __init__(self, states=None):
+        """Create an empty state, reporting its size to states."""
+        self._states = states
+        self._search = {}
+        self.visual_lines = None
+        self.changes = []
+        self.change_index = None
+
+    @property
+    def search(self):
+        """Return the result of the last search."""
+        return self._search
+
+    @search.setter
+    def search(self, search):
+        self._resize(MATCH_SIZE * (len(search.get("stack", ()))
+                                   - len(self._search.get("stack", ()))))
+        self._search = search
+
+    def size(self):
+        """Return the estimated size of the state in bytes."""
+        return (STATE_SIZE + MATCH_SIZE * len(self._search.get("stack", ()))
+                + CHANGE_SIZE * len(self.changes))
+
+    def add_change(self, line, column):
+        """Record a change, merged with the previous one on the same line."""
+        if self.changes and self.changes[-1][0] == line:
+            self.changes[-1] = (line, column)
+        else:
+            count = len(self.changes)
+            self.changes.append((line, column))
+            del self.changes[:-CHANGELIST_SIZE]
+            self._resize(CHANGE_SIZE * (len(self.changes) - count))
+        self.change_index = None
+
+    def step_change(self, count):
+        """Move count changes back (count < 0) or forward in the list.
+
+        Return the (line, column) reached, or None at the end of the list.
+        """
+        if not self.changes:
+            return None
+        index = self.change_index
+        if index is None:
+            index = len(self.changes)
+        new_index = min(max(index + count, 0), len(self.changes) - 1)
+        if new_index == index or (count > 0 and new_index < index):
+            return None
+        self.change_index = new_index
+        return self.changes[new_index]
+
+    def _resize(self, delta):
+        """Report a change of the estimated size."""
+        if self._states is not None and delta:
+            self._states._size += delta
+
+
+class DocumentStates(object):
+    """States by document, the least recently used dropped past limit.
+
+    The estimated size of the states is kept up to date by the states
+    themselves, so using a state does not go through all of them.
+    """
+
+    def __init__(self, limit=STATE_MEMORY_LIMIT):
+        """Create states of up to limit estimated bytes."""
+        self.limit = limit
+        self._states = OrderedDict()
+        self._size = 0
+
+    def __contains__(self, key):
+        """Return True if key has a state."""
+        return key in self._states
+
+    def __len__(self):
+        """Return the number of states."""
+        return len(self._states)
+
+    def get(self, key):
+        """Return the state of key, created if needed.
+
+        Older states are dropped if the states are over the limit, never
+        the one returned.
+        """
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = DocumentState(self)
+            self._size += state.size()
+        self._states.move_to_end(key)
+        while self._size > self.limit and len(self._states) > 1:
+            __, dropped = self._states.popitem(last=False)
+            self._drop(dropped)
+        return state
+
+    def pop(self, key):
+        """Drop the state of key, if any."""
+        state = self._states.pop(key, None)
+        if state is not None:
+            self._drop(state)
+
+    def size(self):
+        """Return the estimated size of the states in bytes."""
+        return self._size
+
+    def _drop(self, state):
+        """Stop counting a dropped state."""
+        self._size -= state.size()
+        state._states = None
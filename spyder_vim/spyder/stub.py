@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim placeholder of the command line.
+
+Shown under the editor at startup instead of the vim widget, which is only
+built the first time vim is used, so that starting Spyder does not pay for
+importing and building it.
+"""
+# Third party imports
+from qtpy.QtCore import Signal
+from qtpy.QtWidgets import QLineEdit
+
+
+class VimStub(QLineEdit):
+    """Empty command line, replaced by the vim widget on first use."""
+
+    # Emitted when the stub gets the focus
+    sig_activated = Signal()
+
+    def focusInEvent(self, event):
+        """Ask for the vim widget."""
+        QLineEdit.focusInEvent(self, event)
+        self.sig_activated.emit()
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim text buffer.
+
+TextBuffer stores the text as a list of chunks of about CHUNK_SIZE
+characters (a flat rope). Two Fenwick trees index the chunk lengths and
+their newline counts, so converting between offsets and lines, inserting
+and deleting take O(log n) plus the size of one chunk, whatever the size
+of the text.
+"""
+
+CHUNK_SIZE = 2 ** 14
+
+
+class FenwickTree(object):
+    """Prefix sums of a list of integers with O(log n) updates."""
+
+    def __init__(self, values):
+        """Build the tree of values in O(n)."""
+        size = len(values)
+        tree = [0] + list(values)
+        for index in range(1, size + 1):
+            parent = index + (index & -index)
+            if parent <= size:
+                tree[parent] += tree[index]
+        self._tree = tree
+        self._size = size
+        self._step = 1 << (size.bit_length() - 1) if size else 0
+
+    def add(self, index, delta):
+        """Add delta to the value at index."""
+        index += 1
+        tree = self._tree
+        while index <= self._size:
+            tree[index] += delta
+            index += index & -index
+
+    def prefix(self, index):
+        """Return the sum of the values before index."""
+        total = 0
+        tree = self._tree
+        while index > 0:
+            total += tree[index]
+            index -= index & -index
+        return total
+
+    def find(self, value):
+        """Return (index, rest), prefix(index) <= value < prefix(index + 1).
+
+        rest is value - prefix(index). index is the number of values if
+        value is past the total.
+        """
+        index = 0
+        step = self._step
+        tree = self._tree
+        while step:
+            following = index + step
+            if following <= self._size and tree[following] <= value:
+                index = following
+                value -= tree[following]
+            step >>= 1
+        return index, value
+
+
+class TextBuffer(object):
+    """Text stored in chunks with a line index."""
+
+    def __init__(self, text=""):
+        """Split text into chunks of CHUNK_SIZE characters."""
+        self._set_chunks([text[index:index + CHUNK_SIZE]
+                          for index in range(0, len(text), CHUNK_SIZE)])
+
+    def _set_chunks(self, chunks):
+        """Replace the chunks and rebuild the indexes."""
+        self._chunks = [chunk for chunk in chunks if chunk] or [""]
+        # Newline offsets of the chunks, computed when a line is looked up
+        self._newline_offsets = {}
+        self._lengths = FenwickTree([len(chunk) for chunk in self._chunks])
+        self._newlines = FenwickTree([chunk.count("\n")
+                                      for chunk in self._chunks])
+        self._length = sum(len(chunk) for chunk in self._chunks)
+        self._line_count = self._newlines.prefix(len(self._chunks)) + 1
+
+    def __len__(self):
+        """Return the number of characters."""
+        return self._length
+
+    def __str__(self):
+        """Return the whole text."""
+        return "".join(self._chunks)
+
+    def _locate(self, position):
+        """Return (chunk index, offset in chunk) of position."""
+        index, offset = self._lengths.find(position)
+        if index >= len(self._chunks):
+            index = len(self._chunks) - 1
+            offset = len(self._chunks[index])
+        return index, offset
+
+    # --- Text
+    def get_text(self, start, end):
+        """Return the text between start and end."""
+        start = max(start, 0)
+        end = min(end, self._length)
+        if start >= end:
+            return ""
+        index, offset = self._locate(start)
+        parts = []
+        remaining = end - start
+        while remaining > 0:
+            part = self._chunks[index][offset:offset + remaining]
+            parts.append(part)
+            remaining -= len(part)
+            index += 1
+            offset = 0
+        return "".join(parts)
+
+    # --- Lines
+    def line_count(self):
+        """Return the number of lines."""
+        return self._line_count
+
+    def line_start(self, line):
+        """Return the position of the start of line (from 0)."""
+        if line <= 0:
+            return 0
+        line = min(line, self._line_count - 1)
+        # Chunk holding the newline ending the previous line
+        index, rest = self._newlines.find(line - 1)
+        offsets = self._newline_offsets.get(index)
+        if offsets is None:
+            chunk = self._chunks[index]
+            offsets = []
+            offset = chunk.find("\n")
+            while offset != -1:
+                offsets.append(offset)
+                offset = chunk.find("\n", offset + 1)
+            self._newline_offsets[index] = offsets
+        return self._lengths.prefix(index) + offsets[rest] + 1
+
+    def line_end(self, line):
+        """Return the position of the end of line, before its newline."""
+        if line >= self._line_count - 1:
+            return self._length
+        return self.line_start(line + 1) - 1
+
+    def line_of(self, position):
+        """Return the line (from 0) of position."""
+        index, offset = self._locate(min(max(position, 0), self._length))
+        return (self._newlines.prefix(index)
+                + self._chunks[index].count("\n", 0, offset))
+
+    # --- Edits
+    def replace(self, position, length, text):
+        """Replace length characters at position by text."""
+        if length:
+            self._delete(position, length)
+        if text:
+            self._insert(position, text)
+
+    def _insert(self, position, text):
+        index, offset = self._locate(position)
+        chunk = self._chunks[index]
+        chunk = chunk[:offset] + text + chunk[offset:]
+        self._length += len(text)
+        if len(chunk) > 2 * CHUNK_SIZE:
+            self._set_chunks(
+                self._chunks[:index]
+                + [chunk[start:start + CHUNK_SIZE]
+                   for start in range(0, len(chunk), CHUNK_SIZE)]
+                + self._chunks[index + 1:])
+            return
+        self._chunks[index] = chunk
+        self._newline_offsets.pop(index, None)
+        self._lengths.add(index, len(text))
+        newlines = text.count("\n")
+        if newlines:
+            self._newlines.add(index, newlines)
+            self._line_count += newlines
+
+    def _delete(self, position, length):
+        length = min(length, self._length - position)
+        index, offset = self._locate(position)
+        emptied = False
+        while length > 0:
+            chunk = self._chunks[index]
+            removed = chunk[offset:offset + length]
+            if not removed:
+                index += 1
+                offset = 0
+                continue
+            self._chunks[index] = (chunk[:offset]
+                                   + chunk[offset + len(removed):])
+            self._newline_offsets.pop(index, None)
+            self._lengths.add(index, -len(removed))
+            newlines = removed.count("\n")
+            if newlines:
+                self._newlines.add(index, -newlines)
+                self._line_count -= newlines
+            self._length -= len(removed)
+            length -= len(removed)
+            emptied = emptied or not self._chunks[index]
+        if emptied:
+            self._set_chunks(self._chunks)
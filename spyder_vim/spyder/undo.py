@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim undo tree.
+
+The tree records one node per vim command. Nodes store a single reverse
+diff (position, removed text, inserted text) so memory grows with the size
+of the edits, not with the size of the document. Moving between any two
+states returns the list of replacements to apply, which the caller runs
+inside one edit block.
+
+The tree does not keep the text of the document, its changes are given by
+the caller with add_change. ChangeRecorder builds them from the change
+notifications of an editor, for documents also edited by other code. It
+keeps a copy of the document, as QTextDocument does not give the removed
+text: ChangeRecorders only keeps the copies of the documents last used
+under a limit. A document without copy, or whose history was dropped, is
+undone with the undo stack of the editor instead.
+"""
+# Standard library imports
+import bisect
+from collections import OrderedDict
+from time import time
+
+# Local imports
+from spyder_vim.spyder.textbuffer import TextBuffer
+
+# Characters of the copies of the documents kept by the recorders
+RECORDER_MEMORY_LIMIT = 32 * 2 ** 20
+
+
+class UndoNode(object):
+    """State reached after one vim command."""
+
+    __slots__ = ("seq", "parent", "children", "cur_child", "position",
+                 "removed", "inserted", "line", "time", "depth")
+
+    def __init__(self, seq, parent=None, position=0, removed="", inserted="",
+                 line=0):
+        """Create a node of change number seq, below parent."""
+        self.seq = seq
+        self.parent = parent
+        self.children = []
+        self.cur_child = None
+        self.position = position
+        self.removed = removed
+        self.inserted = inserted
+        self.line = line
+        self.time = time()
+        self.depth = parent.depth + 1 if parent is not None else 0
+
+    def is_line_change(self):
+        """Return True if the change is confined to a single line."""
+        return "\n" not in self.removed and "\n" not in self.inserted
+
+
+class UndoTree(object):
+    """Branching undo history of a document."""
+
+    def __init__(self):
+        """Create a tree with only the root state."""
+        self.root = UndoNode(0)
+        self.nodes = [self.root]
+        self.cur = self.root
+
+    # --- Change tracking
+    def add_change(self, position, removed, inserted, line=0):
+        """Record a change made by one command.
+
+        removed is replaced by inserted at position, on line. Return the new
+        node or None if nothing changed.
+        """
+        head = 0
+        while (head < len(removed) and head < len(inserted)
+               and removed[head] == inserted[head]):
+            head += 1
+        tail = 0
+        while (tail < len(removed) - head and tail < len(inserted) - head
+               and removed[-tail - 1] == inserted[-tail - 1]):
+            tail += 1
+        if head == len(removed) == len(inserted):
+            return None
+        line += removed.count("\n", 0, head)
+        return self._add_node(position + head,
+                              removed[head:len(removed) - tail],
+                              inserted[head:len(inserted) - tail], line)
+
+    def _add_node(self, position, removed, inserted, line):
+        node = UndoNode(len(self.nodes), self.cur, position, removed,
+                        inserted, line)
+        self.cur.children.append(node)
+        self.cur.cur_child = node
+        self.nodes.append(node)
+        self.cur = node
+        return node
+
+    # --- Navigation
+    def undo(self, count=1):
+        """Go up count nodes toward the root."""
+        target = self.cur
+        for __ in range(count):
+            if target.parent is None:
+                break
+            target = target.parent
+        return self._goto(target)
+
+    def redo(self, count=1):
+        """Go down count nodes along the most recently used branch."""
+        target = self.cur
+        for __ in range(count):
+            if target.cur_child is None:
+                break
+            target = target.cur_child
+        return self._goto(target)
+
+    def step(self, count):
+        """Move count states in chronological order (g-, g+)."""
+        seq = min(max(self.cur.seq + count, 0), len(self.nodes) - 1)
+        return self._goto(self.nodes[seq])
+
+    def travel(self, seconds):
+        """Go to the state seconds later (or earlier if negative)."""
+        target_time = self.cur.time + seconds
+        times = [node.time for node in self.nodes[1:]]
+        seq = bisect.bisect_right(times, target_time)
+        if seconds > 0:
+            seq = max(seq, self.cur.seq)
+        else:
+            seq = min(seq, self.cur.seq)
+        return self._goto(self.nodes[seq])
+
+    def line_changes(self):
+        """Return the latest changes done on a single line, newest first."""
+        changes = []
+        node = self.cur
+        while (node.parent is not None and node.is_line_change()
+               and node.line == self.cur.line):
+            changes.append(node)
+            node = node.parent
+        return changes
+
+    def _goto(self, target):
+        """Move to target and return the replacements to apply.
+
+        Each replacement is a (position, length, text) tuple, to be applied
+        in order.
+        """
+        edits = []
+        node = self.cur
+        down = []
+        while node.depth > target.depth:
+            edits.append((node.position, len(node.inserted), node.removed))
+            node = node.parent
+        while target.depth > node.depth:
+            down.append(target)
+            target = target.parent
+        while node is not target:
+            edits.append((node.position, len(node.inserted), node.removed))
+            node = node.parent
+            down.append(target)
+            target = target.parent
+        for child in reversed(down):
+            child.parent.cur_child = child
+            edits.append((child.position, len(child.removed),
+                          child.inserted))
+        if down:
+            self.cur = down[0]
+        else:
+            self.cur = node
+        return edits
+
+
+class ChangeRecorder(object):
+    """Record the changes of an editor in an undo tree.
+
+    The changes notified by the adapter (EditorAdapter.on_change) between
+    two commits are merged into one change of the tree. The removed text
+    is read from a TextBuffer copy of the document, updated with each
+    change, so recording costs the size of the edits, not of the document.
+    The copy is only made by track, and dropped by release: the history no
+    longer matches the document if it changes meanwhile, so it is dropped
+    too. Size changes of the copy are reported to recorders, the
+    ChangeRecorders holding the recorder, if any.
+    """
+
+    def __init__(self, adapter, recorders=None):
+        """Record the changes of adapter, reporting sizes to recorders."""
+        self.adapter = adapter
+        self.tree = UndoTree()
+        self._recorders = recorders
+        self._buffer = None
+        # [start, end, removed] of the changes since the last commit
+        self._change = None
+
+    def size(self):
+        """Return the number of characters of the copy of the document."""
+        return 0 if self._buffer is None else len(self._buffer)
+
+    def track(self):
+        """Copy the document, if needed, to record its next changes."""
+        if self._buffer is None:
+            self._buffer = TextBuffer(self.adapter.text())
+            self._resize(len(self._buffer))
+
+    def release(self):
+        """Drop the copy of the document, until the next track."""
+        self._resize(-self.size())
+        self._buffer = None
+        self._change = None
+
+    def note_change(self, position, removed, added, length):
+        """Record a document change (QTextDocument.contentsChange)."""
+        buffer = self._buffer
+        if buffer is None:
+            if len(self.tree.nodes) > 1:
+                self.tree = UndoTree()
+            return
+        # Changes of the first block can be reported past the end
+        removed = min(removed, len(buffer) - position)
+        added = min(added, length - position)
+        inserted = self.adapter.get_text(position, position + added)
+        if buffer.get_text(position, position + removed) == inserted:
+            # Highlighting also emits contentsChange
+            return
+        if self._change is None:
+            self._change = [position, position + added,
+                            buffer.get_text(position, position + removed)]
+        else:
+            start, end, old = self._change
+            if position < start:
+                old = buffer.get_text(position, start) + old
+                start = position
+            if position + removed > end:
+                old += buffer.get_text(end, position + removed)
+                end = position + removed
+            self._change = [start, end + added - removed, old]
+        buffer.replace(position, removed, inserted)
+        self._resize(added - removed)
+        if len(buffer) != length:
+            # Out of sync, start again from the document
+            self.release()
+            self.tree = UndoTree()
+            self.track()
+
+    def discard(self):
+        """Forget the changes since the last commit (e.g. undo edits)."""
+        self._change = None
+
+    def commit(self):
+        """Close the current command and record its changes in the tree.
+
+        Return the new node or None if the text is unchanged.
+        """
+        if self._change is None:
+            return None
+        start, end, removed = self._change
+        self._change = None
+        buffer = self._buffer
+        return self.tree.add_change(start, removed,
+                                    buffer.get_text(start, end),
+                                    buffer.line_of(start))
+
+    def _resize(self, delta):
+        """Report a change of the size of the copy."""
+        if self._recorders is not None and delta:
+            self._recorders._size += delta
+
+
+class ChangeRecorders(object):
+    """Recorders by document, the least recently used released past limit.
+
+    limit is the number of characters of the copies of the documents, so
+    that the documents edited with vim do not all keep a copy.
+    """
+
+    def __init__(self, limit=RECORDER_MEMORY_LIMIT):
+        """Create recorders keeping copies of up to limit characters."""
+        self.limit = limit
+        self._recorders = OrderedDict()
+        self._size = 0
+
+    def __contains__(self, key):
+        """Return True if key has a recorder."""
+        return key in self._recorders
+
+    def __len__(self):
+        """Return the number of recorders."""
+        return len(self._recorders)
+
+    def get(self, key, adapter):
+        """Return the recorder of key, created if needed, tracking changes.
+
+        The copies of older documents are released if the copies are over
+        the limit, never the one of the recorder returned.
+        """
+        recorder = self._recorders.get(key)
+        if recorder is None:
+            recorder = self._recorders[key] = ChangeRecorder(adapter, self)
+        self._recorders.move_to_end(key)
+        recorder.track()
+        if self._size > self.limit:
+            for other in self._recorders.values():
+                if self._size <= self.limit:
+                    break
+                if other is not recorder:
+                    other.release()
+        return recorder
+
+    def peek(self, key):
+        """Return the recorder of key, or None, without using it."""
+        return self._recorders.get(key)
+
+    def pop(self, key):
+        """Drop the recorder of key, if any."""
+        recorder = self._recorders.pop(key, None)
+        if recorder is not None:
+            recorder.release()
+
+    def size(self):
+        """Return the number of characters of the copies."""
+        return self._size
+
+
+def apply_edits(text, edits):
+    """Apply (position, length, text) replacements to a string."""
+    for position, length, inserted in edits:
+        text = text[:position] + inserted + text[position + length:]
+    return text
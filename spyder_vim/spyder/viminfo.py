@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim state saved across sessions (viminfo).
+
+The state file is append-only: every change adds one JSON record per line
+and the last record of a key wins when the file is read back. The file is
+rewritten with only the live records once it grows past twice their count.
+Command line histories are ordered dictionaries of their entries, so that a
+repeated entry is found and moved to the end in constant time. Registers
+larger than INLINE_SIZE are written to separate files named after
+their content hash and only read when the register is used.
+"""
+import hashlib
+import json
+import os
+import os.path as osp
+from collections import OrderedDict
+
+VIMINFO_FILENAME = "viminfo"
+BLOB_DIRNAME = "registers"
+INLINE_SIZE = 4096
+COMPACT_MIN_RECORDS = 1000
+HISTORY_SIZE = 100
+JUMPLIST_SIZE = 100
+DELETED_SIZE = 9
+# Number of fields of each kind of record
+RECORD_SIZES = {"r": 5, "d": 4, "m": 5, "h": 3, "s": 3, "j": 4}
+
+
+class BlobText(object):
+    """Register text stored in its own file, read when called."""
+
+    __slots__ = ("name", "dirname")
+
+    def __init__(self, name, dirname):
+        """Refer to the blob name in the directory of the state file."""
+        self.name = name
+        self.dirname = dirname
+
+    def __call__(self):
+        """Return the text, empty if the blob cannot be read."""
+        try:
+            with open(osp.join(self.dirname, BLOB_DIRNAME, self.name),
+                      encoding="utf-8", errors="replace", newline="") as fh:
+                return fh.read()
+        except OSError:
+            return ""
+
+
+class VimInfo(object):
+    """Registers, marks, search, history and jump list of past sessions."""
+
+    def __init__(self, dirname, schedule_flush=None):
+        """Create the state of dirname, loaded on first use."""
+        self.dirname = dirname
+        self.schedule_flush = schedule_flush
+        self.loaded = False
+        self.registers = {}
+        self.deleted = []
+        self.marks = {}
+        self.file_marks = {}
+        self.history = {":": OrderedDict(), "/": OrderedDict(),
+                        "?": OrderedDict()}
+        self.last_search = None
+        self.jumps = []
+        self._pending = []
+        self._pending_registers = {}
+        self._records = 0
+
+    @property
+    def path(self):
+        """Return the path of the state file."""
+        return osp.join(self.dirname, VIMINFO_FILENAME)
+
+    # --- Loading
+    def load(self):
+        """Read the state file, only once.
+
+        Invalid records, e.g. lines truncated by a crash, are ignored.
+        """
+        if self.loaded:
+            return
+        self.loaded = True
+        try:
+            with open(self.path, encoding="utf-8", errors="replace") as fh:
+                for line in fh:
+                    try:
+                        record = json.loads(line)
+                        if not (isinstance(record, list) and record
+                                and RECORD_SIZES.get(str(record[0]))
+                                == len(record)):
+                            continue
+                        self._read_record(record)
+                    except (ValueError, TypeError, AttributeError):
+                        continue
+                    self._records += 1
+        except OSError:
+            return
+        if self._needs_compaction():
+            self.compact()
+
+    def _read_record(self, record):
+        kind = record[0]
+        if kind == "r":
+            __, name, mode, text, blob = record
+            self.registers[name] = (self._text_source(text, blob), mode)
+        elif kind == "d":
+            __, mode, text, blob = record
+            self.deleted.append((self._text_source(text, blob), mode))
+            del self.deleted[:-DELETED_SIZE]
+        elif kind == "m":
+            __, name, path, line, column = record
+            self._store_mark(name, path, line, column)
+        elif kind == "h":
+            __, history_type, entry = record
+            self._store_history(history_type, entry)
+        elif kind == "s":
+            __, pattern, reverse = record
+            self.last_search = (pattern, reverse)
+        elif kind == "j":
+            __, path, line, column = record
+            self._store_jump(path, line, column)
+
+    def _text_source(self, text, blob):
+        """Return the text or a BlobText reading it from its file."""
+        if blob is None:
+            return text
+        return BlobText(blob, self.dirname)
+
+    # --- Updates
+    def set_register(self, name, text, mode):
+        """Save a register.
+
+        text can also be a function returning the text, it is called when
+        the record is written.
+        """
+        self.load()
+        self.registers[name] = (text, mode)
+        self._pending_registers[name] = (text, mode)
+        self._changed()
+
+    def push_deleted(self, text, mode):
+        """Save a delete shifting the numbered registers."""
+        self.load()
+        self.deleted.append((text, mode))
+        del self.deleted[:-DELETED_SIZE]
+        self._pending.append(("d", text, mode))
+        self._changed()
+
+    def set_mark(self, name, path, line, column):
+        """Save a mark, uppercase marks are global."""
+        self.load()
+        self._store_mark(name, path, line, column)
+        self._pending.append(["m", name, path, line, column])
+        self._changed()
+
+    def get_mark(self, name, path):
+        """Return (path, line, column) of a mark or None."""
+        self.load()
+        if name.isupper():
+            return self.marks.get(name)
+        position = self.file_marks.get(path, {}).get(name)
+        if position is None:
+            return None
+        return (path,) + position
+
+    def add_history(self, history_type, entry):
+        """Save a command line entry."""
+        self.load()
+        self._store_history(history_type, entry)
+        self._pending.append(["h", history_type, entry])
+        self._changed()
+
+    def set_last_search(self, pattern, reverse):
+        """Save the last search pattern and direction."""
+        self.load()
+        self.last_search = (pattern, reverse)
+        self._pending.append(["s", pattern, reverse])
+        self._changed()
+
+    def add_jump(self, path, line, column):
+        """Save a jump list entry."""
+        self.load()
+        self._store_jump(path, line, column)
+        self._pending.append(["j", path, line, column])
+        self._changed()
+
+    def _store_mark(self, name, path, line, column):
+        if name.isupper():
+            self.marks[name] = (path, line, column)
+        else:
+            self.file_marks.setdefault(path, {})[name] = (line, column)
+
+    def get_history(self, history_type):
+        """Return the entries of a command line history, oldest first."""
+        self.load()
+        return list(self.history.get(history_type, ()))
+
+    def _store_history(self, history_type, entry):
+        history = self.history.setdefault(history_type, OrderedDict())
+        history.pop(entry, None)
+        history[entry] = None
+        if len(history) > HISTORY_SIZE:
+            history.popitem(last=False)
+
+    def _store_jump(self, path, line, column):
+        # Only one entry per line, like vim
+        self.jumps = [jump for jump in self.jumps
+                      if jump[:2] != (path, line)]
+        self.jumps.append((path, line, column))
+        del self.jumps[:-JUMPLIST_SIZE]
+
+    def _changed(self):
+        if self.schedule_flush is not None:
+            self.schedule_flush()
+
+    # --- Writing
+    def flush(self):
+        """Append the pending records to the state file."""
+        if not self._pending and not self._pending_registers:
+            return
+        lines = []
+        for record in self._pending:
+            if record[0] == "d":
+                __, text, mode = record
+                lines.append(["d", mode] + self._text_record(text))
+            else:
+                lines.append(record)
+        for name, (text, mode) in self._pending_registers.items():
+            lines.append(["r", name, mode] + self._text_record(text))
+        self._pending = []
+        self._pending_registers = {}
+        self._write(lines, "a")
+        self._records += len(lines)
+        if self._needs_compaction():
+            self.compact()
+
+    def compact(self):
+        """Rewrite the state file with only the live records."""
+        lines = []
+        for name, (text, mode) in self.registers.items():
+            lines.append(["r", name, mode] + self._text_record(text))
+        for text, mode in self.deleted:
+            lines.append(["d", mode] + self._text_record(text))
+        for name, position in self.marks.items():
+            lines.append(["m", name] + list(position))
+        for path, marks in self.file_marks.items():
+            for name, (line, column) in marks.items():
+                lines.append(["m", name, path, line, column])
+        for history_type, history in self.history.items():
+            for entry in history:
+                lines.append(["h", history_type, entry])
+        if self.last_search is not None:
+            lines.append(["s"] + list(self.last_search))
+        for jump in self.jumps:
+            lines.append(["j"] + list(jump))
+        self._write(lines, "w")
+        self._records = len(lines)
+        self._remove_unused_blobs(lines)
+
+    def _live_records(self):
+        return (len(self.registers) + len(self.deleted) + len(self.marks)
+                + sum(len(marks) for marks in self.file_marks.values())
+                + sum(len(history) for history in self.history.values())
+                + len(self.jumps) + 1)
+
+    def _needs_compaction(self):
+        return (self._records > COMPACT_MIN_RECORDS
+                and self._records > 2 * self._live_records())
+
+    def _text_record(self, text):
+        """Return [text, blob] with large texts written out of line."""
+        if isinstance(text, BlobText):
+            return [None, text.name]
+        if callable(text):
+            text = text()
+        if len(text) <= INLINE_SIZE:
+            return [text, None]
+        data = text.encode("utf-8")
+        blob = hashlib.sha1(data).hexdigest()
+        blob_dir = osp.join(self.dirname, BLOB_DIRNAME)
+        blob_path = osp.join(blob_dir, blob)
+        if not osp.isfile(blob_path):
+            os.makedirs(blob_dir, exist_ok=True)
+            with open(blob_path, "wb") as fh:
+                fh.write(data)
+        return [None, blob]
+
+    def _write(self, records, mode):
+        os.makedirs(self.dirname, exist_ok=True)
+        data = "".join(json.dumps(record, separators=(",", ":")) + "\n"
+                       for record in records)
+        if mode == "a":
+            with open(self.path, "a", encoding="utf-8") as fh:
+                fh.write(data)
+        else:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                fh.write(data)
+            os.replace(tmp_path, self.path)
+
+    def _remove_unused_blobs(self, records):
+        blob_dir = osp.join(self.dirname, BLOB_DIRNAME)
+        used = set(record[-1] for record in records
+                   if record[0] in "rd" and record[-1] is not None)
+        try:
+            blobs = os.listdir(blob_dir)
+        except OSError:
+            return
+        for blob in blobs:
+            if blob not in used:
+                try:
+                    os.remove(osp.join(blob_dir, blob))
+                except OSError:
+                    pass
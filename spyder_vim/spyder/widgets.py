@@ -9,25 +9,65 @@ spyder-vim Main Widget.
 """
 import re
 import bisect
-from time import time
+import os
+import os.path as osp
+import stat
+import threading
+from keyword import iskeyword
+from time import strftime, time
 
 from qtpy.QtWidgets import (QWidget, QLineEdit, QHBoxLayout, QTextEdit, QLabel,
-                            QSizePolicy, QApplication)
-from qtpy.QtGui import QTextCursor, QTextDocument
-from qtpy.QtCore import Qt, QObject, QRegularExpression, Signal, QPoint
+                            QSizePolicy, QApplication, QPlainTextEdit,
+                            QSplitter, QVBoxLayout)
+from qtpy.QtGui import QClipboard, QKeySequence, QTextCursor, QTextDocument
+from qtpy.QtCore import (Qt, QEvent, QObject, QRegularExpression, Signal,
+                         QPoint, QTimer, QEventLoop, QProcess,
+                         QFileSystemWatcher)
 
 # Spyder imports
+from spyder.config.base import get_conf_path
 from spyder.config.gui import is_dark_interface
 from spyder.api.translations import get_translation
+from spyder.plugins.editor.widgets.editorstack import EditorStack
+
+# Local imports
+from spyder_vim.spyder.adapter import EditorAdapter, line_window, text_window
+from spyder_vim.spyder.buffers import BufferList, display_name
+from spyder_vim.spyder.completion import (CompletionCache, completion_context,
+                                          path_candidates, prefix_matches,
+                                          split_path)
+from spyder_vim.spyder.engine import ESCAPE, VimEngine
+from spyder_vim.spyder.ex import (EX_ALIASES, LineMarks, MarkedAdapter,
+                                  apply_count, compile_replacement, copy_lines,
+                                  delete_lines, expand_name, filter_lines,
+                                  insert_lines, join_lines, mark_lines,
+                                  move_lines, parse_command,
+                                  parse_count, parse_global, parse_sort,
+                                  parse_substitute, range_text,
+                                  resolve_range, resolve_target, shift_lines,
+                                  sort_lines, substitute_lines, yank_lines)
+from spyder_vim.spyder.motions import matching_bracket, parse_motion
+from spyder_vim.spyder.operators import (INDENT, RE_VIM_OPERATOR,
+                                         apply_operator, operator_range)
+from spyder_vim.spyder.pager import Pager
+from spyder_vim.spyder.paths import PathIndex, read_ahead, scan_directory
+from spyder_vim.spyder.perf import PerfStats
+from spyder_vim.spyder.registers import RegisterStore
+from spyder_vim.spyder.state import DocumentStates
+from spyder_vim.spyder.undo import ChangeRecorders
+from spyder_vim.spyder.viminfo import VimInfo
+from spyder_vim.spyder.windows import neighbor, split_sizes, window_order
 
 # Localization
 _ = get_translation("spyder_vim.spyder")
 
 
-VIM_COMMAND_PREFIX = ":!/?"
-VIM_PREFIX = "acdfFgmritTyzZ@'`\"<>"
+VIM_COMMAND_PREFIX = ":/?"
+VIM_PREFIX = "acdfFgmqritTyzZ@'`\"<>\x17"
 RE_VIM_PREFIX_STR = r"^(\d*)([{prefixes}].|[^{prefixes}0123456789])(.*)$"
 RE_VIM_PREFIX = re.compile(RE_VIM_PREFIX_STR.format(prefixes=VIM_PREFIX))
+# [count]![count]motion, opens the command line with the lines to filter
+RE_VIM_FILTER = re.compile(r"^([1-9]\d*)?!([1-9]\d*)?(.*)$")
 
 VIM_VISUAL_OPS = "bdehHjJklLnNpPGyw$^0 \r\b%~<>"
 VIM_VISUAL_PREFIX = "agi"
@@ -51,9 +91,168 @@ SYMBOLS_REPLACEMENT = {
     "^": "CARET",
     "\"": "QUOTE",
     "%": "PERCENT",
-    "~": "TILDE"
+    "~": "TILDE",
+    "-": "MINUS",
+    "+": "PLUS",
+    "'": "APOSTROPHE",
+    "`": "BACKTICK",
+    ";": "SEMICOLON",
+    ",": "COMMA",
+    "\x17": "CTRL_W"
 }
-INDENT = "    "
+UNDO_TIME_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+RE_UNDO_TIME = re.compile(r"^(\d*)([{units}]?)$".format(
+    units="".join(UNDO_TIME_UNITS)))
+JUMP_COMMANDS = ("G", "gg", "n", "N", "PERCENT", "H", "L", "M", "APOSTROPHE",
+                 "BACKTICK")
+VIMINFO_FLUSH_DELAY = 2000  # ms
+PASTE_STREAM_SIZE = 2 ** 20  # Pastes larger than this are inserted in chunks
+PASTE_CHUNK_SIZE = 2 ** 18
+# Lines scanned around the cursor by % and text objects in large files
+LARGE_FILE_SCAN_LINES = 1000
+# Most lines with search highlights in large files
+LARGE_FILE_HIGHLIGHT_LINES = 300
+PAGER_STATUS_INTERVAL = 200  # ms, status updates while the index is built
+SHELL_CHUNK_SIZE = 2 ** 16  # Bytes written to a shell command at once
+SHELL_STATUS_INTERVAL = 200  # ms, progress updates of shell commands
+PATH_INDEX_INTERVAL = 100  # ms, checks of the file index and read aheads
+PATH_WATCH_LIMIT = 4096  # Most directories watched for changes
+READ_AHEAD_SIZE = 2 ** 20  # Files larger than this are read in a thread
+# Project file names are completed in a thread past this many files
+COMPLETION_THREAD_FILES = 10000
+COMPLETION_INTERVAL = 50  # ms, checks of the completion threads
+
+# "* is the selection (primary) clipboard, "+ the system clipboard
+CLIPBOARD_REGISTERS = {"*": "unnamed", "+": "unnamedplus"}
+DEFAULT_OPTIONS = {
+    "clipboard": "unnamedplus",
+    # Large file mode thresholds, 0 disables a threshold
+    "largefilesize": 10 * 10 ** 6,  # characters
+    "largefilelines": 200000,
+    # Shell of :!, the commands are run with shell -c (cmd.exe /c)
+    "shell": os.environ.get("SHELL") or os.environ.get("COMSPEC") or "/bin/sh",
+}
+OPTION_VALUES = {
+    "clipboard": ("unnamed", "unnamedplus", "none"),
+}
+# Titles of the command line histories in :history
+HISTORY_NAMES = {":": "cmd", "/": "search", "?": "backward search"}
+# Colon commands taking a range, called with (args, line_range, bang)
+RANGE_COMMANDS = ("NUMBER", "copy", "delete", "global_", "join", "move",
+                  "normal", "read", "sort", "substitute", "vglobal", "yank",
+                  "EXCLAMATION", "GREATER", "LESS")
+# Range commands working on the whole document without range
+WHOLE_RANGE_COMMANDS = ("global_", "sort", "vglobal")
+# Range commands called without line_range when there is no address
+OPTIONAL_RANGE_COMMANDS = ("EXCLAMATION",)
+# Colon commands without range taking a bang, called with (args, bang)
+BANG_COMMANDS = ("bdelete", "edit")
+
+
+# %% Editor adapter
+class CodeEditorAdapter(EditorAdapter):
+    """Adapter of a Spyder CodeEditor."""
+
+    def __init__(self, editor):
+        """Create the adapter of a CodeEditor."""
+        self.editor = editor
+        self.document = editor.document()
+
+    @property
+    def key(self):
+        """Return the QTextDocument, shared by the splits of a file."""
+        return self.document
+
+    @property
+    def filename(self):
+        """Return the path of the file of the editor."""
+        return self.editor.filename
+
+    def text(self):
+        """Return the whole text."""
+        return self.editor.toPlainText()
+
+    def length(self):
+        """Return the number of characters."""
+        return self.document.characterCount() - 1
+
+    def get_text(self, start, end):
+        """Return the text between two positions."""
+        cursor = QTextCursor(self.document)
+        cursor.setPosition(start)
+        cursor.setPosition(end, QTextCursor.KeepAnchor)
+        return cursor.selectedText().replace('\u2029', '\n')
+
+    def block_count(self):
+        """Return the number of lines."""
+        return self.document.blockCount()
+
+    def block_text(self, number):
+        """Return the text of a line, without its newline."""
+        return self.document.findBlockByNumber(number).text()
+
+    def block_position(self, number):
+        """Return the position of the start of a line."""
+        return self.document.findBlockByNumber(number).position()
+
+    def block_number(self, position):
+        """Return the line of a position."""
+        return self.document.findBlock(position).blockNumber()
+
+    def cursor(self):
+        """Return the cursor position."""
+        return self.editor.textCursor().position()
+
+    def set_cursor(self, position):
+        """Move the cursor."""
+        cursor = self.editor.textCursor()
+        cursor.setPosition(position)
+        self.editor.setTextCursor(cursor)
+
+    def overlay(self, name):
+        """Return the (start, end) ranges of extra selections."""
+        return [(selection.cursor.selectionStart(),
+                 selection.cursor.selectionEnd())
+                for selection in self.editor.get_extra_selections(name)]
+
+    def set_overlay(self, name, ranges):
+        """Show (start, end) ranges as extra selections."""
+        selections = self.editor.get_extra_selections(name)
+        text_format = selections[0].format if selections else None
+        new_selections = []
+        for start, end in ranges:
+            selection = QTextEdit.ExtraSelection()
+            if text_format is not None:
+                selection.format = text_format
+            selection.cursor = QTextCursor(self.document)
+            selection.cursor.setPosition(start)
+            selection.cursor.setPosition(end, QTextCursor.KeepAnchor)
+            new_selections.append(selection)
+        if new_selections:
+            self.editor.set_extra_selections(name, new_selections)
+        else:
+            self.editor.clear_extra_selections(name)
+
+    def edit(self, edits):
+        """Apply replacements in one edit block, undone at once."""
+        cursor = self.editor.textCursor()
+        cursor.beginEditBlock()
+        for position, length, text in edits:
+            cursor.setPosition(position)
+            cursor.setPosition(position + length, QTextCursor.KeepAnchor)
+            cursor.insertText(text)
+        cursor.endEditBlock()
+
+    def on_change(self, callback):
+        """Call callback(position, removed, added, length) on changes."""
+        document = self.document
+        document.contentsChange.connect(
+            lambda position, removed, added: callback(
+                position, removed, added, document.characterCount() - 1))
+
+    def on_close(self, callback):
+        """Call callback when the document is destroyed."""
+        self.document.destroyed.connect(callback)
 
 
 # %% Vim shortcuts
@@ -67,19 +266,21 @@ class VimKeys(QObject):
         self._widget = widget
         self._prev_cursor = None
         self.visual_mode = False
-        self.search_dict = {}
-        self.registers = {}
-        for i in range(10):
-            self.registers[str(i)] = ""
-        self.registers["unnamed"] = ("", False)
+        # Registers are shared by all documents, search results and the
+        # change list are kept per document
+        self.registers = RegisterStore()
         self.register = "unnamed"
+        self.states = DocumentStates()
+        self._watched = set()
+        self._recorders = ChangeRecorders()
+        self._jump_index = 0
 
     def __call__(self, key, repeat):
         """Execute vim command."""
         leftover = ""
         if key.startswith("_"):
             return
-        elif key[0] in "fFr":
+        elif key[0] in "fFrmq'`\x17":
             leftover = key[1]
             key = key[0]
         elif key[0] in "ia" and self.visual_mode == "char":
@@ -95,48 +296,78 @@ class VimKeys(QObject):
         except AttributeError:
             print("unknown key", key)
         else:
+            editor = self._widget.editor()
+            if (self.visual_mode
+                    and self._prev_cursor.document() is not editor.document()):
+                # The selection was made in another document
+                self.visual_mode = False
+                self.mode_changed.emit("normal")
+            # Created on the first key, to record the changes from then on
+            self._state()
+            if key in JUMP_COMMANDS:
+                self.record_jump()
+            self.checkpoint()
+            perf = self._widget.perf
             if leftover:
-                method(leftover, repeat)
+                perf.run(key, editor, method, leftover, repeat)
             else:
-                method(repeat=repeat)
+                perf.run(key, editor, method, repeat=repeat)
+            self.checkpoint()
 
     def QUOTE(self, leftover, repeat=1):
         """Set the register value"""
         self.register = leftover
 
-    def set_register(self, text, mode, register="unnamed", cut=False):
-        """Set the register value inside the dictionary of registers."""
-        # Delete and small delete registers
-        if cut and (mode == "line" or text.find("\n") != -1):
-            for i in reversed(range(2, 9)):
-                self.registers[str(i)] = self.registers[str(i-1)] 
-            self.registers["1"] = (text, mode) 
-        else:
-            self.registers["0"] = (text, mode)
-            self.registers["-"] = (text, mode) 
-            pass
-        # General register
-        if register in [str(i) for i in range(10)]:
-            pass
-        elif register in [".", "%", "#" ":"]:
-            pass # To implement
-        elif register.islower():
-            self.registers[register] = (text, mode) 
-        elif register.isupper():
-            previous_text, _ = self.get_register(register.lower())
-            self.registers[register.lower()] = (previous_text + text, mode) 
-        self.registers["unamed"] = (text, mode) 
+    def set_register(self, text, mode, register="unnamed", cut=False,
+                     copied=None):
+        """Set the register value inside the register store.
+
+        copied tells if the editor already put text in the clipboard, which
+        is the case of cuts done with editor.cut() (the default for cuts).
+        """
+        clipboard = self._widget.clipboard
+        if copied is None:
+            copied = cut
+        if register in CLIPBOARD_REGISTERS:
+            clipboard.set_text(text, mode, register)
+        elif register == "unnamed" and not copied:
+            for name, option in CLIPBOARD_REGISTERS.items():
+                if option in self._widget.options["clipboard"].split(","):
+                    clipboard.set_text(text, mode, name)
+        self.registers.set(text, mode, register=register, cut=cut)
         self.register = "unnamed"
 
     def get_register(self, register="unnamed"):
-        """Get the register from the dictionary of registers."""
-        if register in self.registers:
-            text, mode = self.registers[str(register)]
-        else:
-            text = ""
-            mode = False
+        """Get the register from the register store."""
         self.register = "unnamed"
-        return text, mode
+        if register in CLIPBOARD_REGISTERS:
+            return self._widget.clipboard.text(register)
+        content = self.registers.get(register)
+        return content.text, content.mode
+
+    def record_jump(self):
+        """Add the cursor position to the jump list."""
+        adapter = self._widget.adapter()
+        position = adapter.cursor()
+        line = adapter.block_number(position)
+        column = position - adapter.block_position(line)
+        viminfo = self._widget.viminfo
+        viminfo.add_jump(adapter.filename, line, column)
+        self._jump_index = len(viminfo.jumps)
+
+    def _go_to_position(self, path, line, column):
+        """Move the cursor to a position, opening its file if needed."""
+        editor = self._widget.editor()
+        if path != editor.filename:
+            self._widget.main.editor.load(path)
+            editor = self._widget.editor()
+            if path != editor.filename:
+                return
+        block = editor.document().findBlockByNumber(line)
+        if not block.isValid():
+            block = editor.document().lastBlock()
+        column = min(column, max(block.length() - 2, 0))
+        self._set_cursor(block.position() + column, QTextCursor.MoveAnchor)
 
     def _move_cursor(self, movement, repeat=1):
         cursor = self._editor_cursor()
@@ -188,6 +419,18 @@ class VimKeys(QObject):
         end = selection.cursor.selectionEnd()
         return start, end
 
+    def _scan_text(self):
+        """Return (offset, text) of the text to scan around the cursor.
+
+        This is the whole document, or the lines around the cursor in large
+        file mode, so brackets and quotes further away are not found.
+        """
+        adapter = self._widget.adapter()
+        if self._widget.large_file():
+            return line_window(adapter, adapter.cursor(),
+                               LARGE_FILE_SCAN_LINES)
+        return 0, adapter.text()
+
     def _editor_cursor(self):
         """Return editor's cursor."""
         editor = self._widget.editor()
@@ -212,8 +455,127 @@ class VimKeys(QObject):
         cur_time = int(time())
         self._widget.selection_type = (cur_time, selection_type)
 
+    @property
+    def search_dict(self):
+        """Return the last search results of the current document."""
+        return self._state().search
+
+    @search_dict.setter
+    def search_dict(self, search_dict):
+        self._state().search = search_dict
+
+    def _state(self):
+        """Return the vim state of the current document."""
+        adapter = self._widget.adapter()
+        self._watch(adapter)
+        return self.states.get(adapter.key)
+
+    def _watch(self, adapter):
+        """Follow the changes of a document until it is closed."""
+        key = adapter.key
+        if key not in self._watched:
+            self._watched.add(key)
+            adapter.on_change(
+                lambda position, removed, added, length: self._note_change(
+                    key, position, removed, added, length))
+            adapter.on_close(lambda: self._forget(key))
+
+    def _note_change(self, document, position, removed, added, length):
+        """Add a change of a document to its change list and undo tree."""
+        recorder = self._recorders.peek(document)
+        if recorder is not None:
+            recorder.note_change(position, removed, added, length)
+        block = document.findBlock(position)
+        self.states.get(document).add_change(block.blockNumber(),
+                                             position - block.position())
+
+    def _forget(self, key):
+        """Drop the state and the undo tree of a closed document."""
+        self._watched.discard(key)
+        self.states.pop(key)
+        self._recorders.pop(key)
+
+    def _recorder(self):
+        """Return the recorder of the changes of the current document."""
+        adapter = self._widget.adapter()
+        self._watch(adapter)
+        return self._recorders.get(adapter.key, adapter)
+
+    def _undo_tree(self):
+        """Return the undo tree of the current document."""
+        return self._recorder().tree
+
+    def checkpoint(self):
+        """Close the current change in the undo tree."""
+        if self._widget.large_file():
+            # The editor undo stack is used instead, see _editor_undo
+            self._recorders.pop(self._widget.editor().document())
+            return
+        self._recorder().commit()
+
+    def _apply_edits(self, edits):
+        """Apply (position, length, text) replacements in one edit block."""
+        adapter = self._widget.adapter()
+        adapter.edit(edits)
+        position = min(edit[0] for edit in edits)
+        block = adapter.block_number(position)
+        block_start = adapter.block_position(block)
+        if position == block_start + len(adapter.block_text(block)) \
+                and position > block_start:
+            position -= 1
+        adapter.set_cursor(position)
+
+    def _editor_undo(self, count):
+        """Undo (count < 0) or redo changes with the editor undo stack.
+
+        Used in large file mode, where recording the changes would keep a
+        copy of the document.
+        """
+        editor = self._widget.editor()
+        for __ in range(abs(count)):
+            if count < 0:
+                editor.undo()
+            else:
+                editor.redo()
+        self._widget.update_vim_cursor()
+
+    def _undo_goto(self, edits):
+        """Move the document to another state of the undo tree."""
+        if edits:
+            self._apply_edits(edits)
+            self._recorder().discard()
+        self._widget.update_vim_cursor()
+
+    def undo_travel(self, count=0, seconds=0):
+        """Go to an older or newer text state (:earlier, :later)."""
+        if self._widget.large_file():
+            self._widget.show_message("not available in large file mode")
+            return
+        self.checkpoint()
+        tree = self._undo_tree()
+        if seconds:
+            self._undo_goto(tree.travel(seconds))
+        else:
+            self._undo_goto(tree.step(count))
+
+    def visual_lines(self):
+        """Return the (first, last) lines of the visual selection.
+
+        Outside of visual mode, return those of the last selection or None.
+        """
+        if not self.visual_mode:
+            return self._state().visual_lines
+        start, end = sorted(self._get_selection_positions())
+        if self.visual_mode == 'line' and end > start:
+            end -= 1
+        document = self._widget.editor().document()
+        return (document.findBlock(start).blockNumber(),
+                document.findBlock(end).blockNumber())
+
     def exit_visual_mode(self):
         """Exit visual mode."""
+        if self.visual_mode:
+            self._state().visual_lines = self.visual_lines()
         self.mode_changed.emit("normal")
         editor = self._widget.editor()
         editor.clear_extra_selections('vim_visual')
@@ -233,6 +595,10 @@ class VimKeys(QObject):
     def search(self, key, reverse=False):
         """"Search regular expressions key inside document"""
         editor = self._widget.editor()
+        if self._widget.large_file():
+            # Matches are found when moving to them, see _search_next
+            self._highlight_visible(key)
+            return {"pattern": key, "key": key, "reverse": reverse}
         cursor = QTextCursor(editor.document())
         cursor.movePosition(QTextCursor.Start)
         # Find key in document forward
@@ -251,12 +617,25 @@ class VimKeys(QObject):
             cursor = editor.document().find(QRegularExpression(key), cursor,
                                         QTextDocument.FindCaseSensitively)
         editor.set_extra_selections('search', [i for i in search_stack])
-        search_dict = {"stack": search_stack, "reverse": reverse}
+        search_dict = {"stack": search_stack, "key": key, "reverse": reverse}
         return search_dict
 
     def n(self, repeat=1, reverse=False):
         """Move cursor to the next searched key"""
         cursor = self._editor_cursor()
+        last_search = self._widget.viminfo.last_search
+        search_dict = self.search_dict
+        if last_search and (search_dict.get("key"), search_dict.get(
+                "reverse")) != tuple(last_search):
+            # First search in this document since the pattern changed, or
+            # search pattern of a previous session
+            pattern, search_reverse = last_search
+            self.search_dict = self.search(pattern, reverse=search_reverse)
+        if "pattern" in self.search_dict:
+            self._search_next(reverse)
+            if repeat > 1:
+                self.n(repeat - 1, reverse=reverse)
+            return
         search_stack = self.search_dict.get("stack", None)
         if not search_stack:
             return
@@ -285,6 +664,118 @@ class VimKeys(QObject):
         """Move cursor to the previous searched key"""
         self.n(repeat, reverse=True)
 
+    def _search_next(self, reverse=False):
+        """Move to the next match of a large file search."""
+        pattern = self.search_dict["pattern"]
+        document = self._widget.editor().document()
+        regexp = QRegularExpression(pattern)
+        flags = QTextDocument.FindCaseSensitively
+        position = self._editor_cursor().position()
+        if self.search_dict["reverse"] ^ reverse:
+            flags |= QTextDocument.FindBackward
+            cursor = document.find(regexp, position, flags)
+            if cursor.isNull():
+                cursor = document.find(regexp, document.characterCount() - 1,
+                                       flags)
+        else:
+            cursor = document.find(regexp, position + 1, flags)
+            if cursor.isNull():
+                cursor = document.find(regexp, 0, flags)
+        if cursor.isNull():
+            return
+        self._set_cursor(cursor.selectionStart(), QTextCursor.MoveAnchor)
+        self._highlight_visible(pattern)
+
+    def _highlight_visible(self, pattern):
+        """Highlight the matches of pattern in the visible lines only."""
+        editor = self._widget.editor()
+        block = editor.firstVisibleBlock()
+        start = block.position()
+        offset = editor.contentOffset()
+        height = editor.viewport().height()
+        end = block.position() + block.length() - 1
+        for __ in range(LARGE_FILE_HIGHLIGHT_LINES):
+            end = block.position() + block.length() - 1
+            block = block.next()
+            if (not block.isValid() or editor.blockBoundingGeometry(
+                    block).translated(offset).top() > height):
+                break
+        cursor = QTextCursor(editor.document())
+        cursor.setPosition(start)
+        cursor.setPosition(end, QTextCursor.KeepAnchor)
+        matches = QRegularExpression(pattern).globalMatch(
+            cursor.selectedText())
+        selections = []
+        while matches.hasNext():
+            match = matches.next()
+            selection = QTextEdit.ExtraSelection()
+            selection.format.setBackground(Qt.blue)
+            selection.format.setForeground(Qt.black)
+            selection.cursor = QTextCursor(editor.document())
+            selection.cursor.setPosition(start + match.capturedStart())
+            selection.cursor.setPosition(start + match.capturedEnd(),
+                                         QTextCursor.KeepAnchor)
+            selections.append(selection)
+        editor.set_extra_selections('search', selections)
+
+    # %% Marks and jumps
+    def m(self, leftover, repeat=1):
+        """Set mark at cursor position."""
+        if not leftover.isalpha():
+            return
+        editor = self._widget.editor()
+        line, column = editor.get_cursor_line_column()
+        self._widget.viminfo.set_mark(leftover, editor.filename, line, column)
+
+    def BACKTICK(self, leftover, repeat=1):
+        """Go to the position of a mark."""
+        mark = self._widget.viminfo.get_mark(leftover,
+                                             self._widget.editor().filename)
+        if mark is not None:
+            self._go_to_position(*mark)
+
+    def APOSTROPHE(self, leftover, repeat=1):
+        """Go to the first non-blank character of the line of a mark."""
+        mark = self._widget.viminfo.get_mark(leftover,
+                                             self._widget.editor().filename)
+        if mark is not None:
+            path, line, __ = mark
+            self._go_to_position(path, line, 0)
+            self.CARET()
+
+    def gSEMICOLON(self, repeat=1):
+        """Go to an older position in the change list."""
+        self._go_to_change(-repeat)
+
+    def gCOMMA(self, repeat=1):
+        """Go to a newer position in the change list."""
+        self._go_to_change(repeat)
+
+    def _go_to_change(self, count):
+        position = self._state().step_change(count)
+        if position is not None:
+            self._go_to_position(self._widget.editor().filename, *position)
+
+    def CTRL_O(self, repeat=1):
+        """Go to an older position in the jump list."""
+        viminfo = self._widget.viminfo
+        if self._jump_index >= len(viminfo.jumps):
+            self.record_jump()
+            self._jump_index = len(viminfo.jumps) - 1
+        jumps = viminfo.jumps
+        index = max(self._jump_index - repeat, 0)
+        if index != self._jump_index:
+            self._jump_index = index
+            self._go_to_position(*jumps[index])
+
+    def CTRL_I(self, repeat=1):
+        """Go to a newer position in the jump list."""
+        jumps = self._widget.viminfo.jumps
+        index = min(self._jump_index + repeat, len(jumps) - 1)
+        if index > self._jump_index:
+            self._jump_index = index
+            self._go_to_position(*jumps[index])
+
     # %% Movement
     def h(self, repeat=1):
         """Move cursor to the left."""
@@ -621,49 +1112,12 @@ class VimKeys(QObject):
         """Go to matching bracket"""
         editor = self._widget.editor()
         cursor = self._editor_cursor()
-        text = editor.toPlainText()
         position = cursor.position()
-        # Find starting position      
-        start_position = -1
-        for i, j in enumerate(text[position::]):
-            if j in list("([{"):
-                start_char = j
-                start_position = i + position + 1
-                sub_text = text[start_position::]
-                break
-            elif j in list(")]}"):
-                start_char = j
-                start_position = i + position
-                sub_text = reversed(text[0:start_position])
-                break
-        if start_position == -1:
-            return
-        # Find final position      
-        end_position = -1
-        stack = [start_char]
-        for i, j in enumerate(sub_text):
-            if j == "(" and stack[-1] == ")":
-                stack.pop()
-            elif j == "[" and stack[-1] == "]":
-                stack.pop()
-            elif j == "{" and stack[-1] == "}":
-                stack.pop()
-            elif j == ")" and stack[-1] == "(":
-                stack.pop()
-            elif j == "]" and stack[-1] == "[":
-                stack.pop()
-            elif j == "}" and stack[-1] == "{":
-                stack.pop()
-            elif j in list("([{)]}"):
-                stack.append(j)
-            if not stack and start_char in list("([{"):
-                end_position = start_position + i 
-                break
-            elif not stack and start_char in list(")]}"):
-                end_position = start_position - i - 1
-                break
+        offset, text = self._scan_text()
+        end_position = matching_bracket(text, position - offset)
         if end_position == -1:
             return
+        end_position += offset
         # Move cursor
         if self.visual_mode == 'char':
             selection = editor.get_extra_selections('vim_visual')[0]
@@ -688,8 +1142,8 @@ class VimKeys(QObject):
         elif leftover in list("\"\'([{<>}])"):
             editor = self._widget.editor()
             cursor = self._editor_cursor()
-            text = editor.toPlainText()
-            position = cursor.position()
+            offset, text = self._scan_text()
+            position = cursor.position() - offset
             # Find the starting position
             start_position = -1
             if leftover == "(":
@@ -753,6 +1207,10 @@ class VimKeys(QObject):
                 if not stack:
                      end_position = i + start_position - 1
                      break
+            if end_position == -1:
+                return
+            start_position += offset
+            end_position += offset
 
             selection = editor.get_extra_selections('vim_visual')[0]
             selection.cursor.setPosition(start_position)
@@ -780,8 +1238,8 @@ class VimKeys(QObject):
         elif leftover in list("\"\'([{<>}])"):
             editor = self._widget.editor()
             cursor = self._editor_cursor()
-            text = editor.toPlainText()
-            position = cursor.position()
+            offset, text = self._scan_text()
+            position = cursor.position() - offset
             # Find the starting position
             start_position = -1
             if leftover == "(":
@@ -845,6 +1303,10 @@ class VimKeys(QObject):
                 if not stack:
                      end_position = i + start_position - 1
                      break
+            if end_position == -1:
+                return
+            start_position += offset
+            end_position += offset
 
             selection = editor.get_extra_selections('vim_visual')[0]
             selection.cursor.setPosition(start_position-1)
@@ -882,19 +1344,58 @@ class VimKeys(QObject):
     # %% Editing and cases(visual)
     def u(self, repeat):
         """Undo changes."""
-        if not self.visual_mode:
-            for count in range(repeat):
-                self._widget.editor().undo()
-            self._widget.update_vim_cursor()
+        if not self.visual_mode and self._widget.large_file():
+            self._editor_undo(-repeat)
+        elif not self.visual_mode:
+            tree = self._undo_tree()
+            if len(tree.nodes) == 1:
+                # Changes made before the document was tracked
+                editor = self._widget.editor()
+                for count in range(repeat):
+                    editor.undo()
+                self._recorder().discard()
+                self._widget.update_vim_cursor()
+            else:
+                self._undo_goto(tree.undo(repeat))
         else:
             # TODO: make selection lowercase
             pass
 
+    def CTRL_R(self, repeat=1):
+        """Redo changes."""
+        if self._widget.large_file():
+            self._editor_undo(repeat)
+        else:
+            self._undo_goto(self._undo_tree().redo(repeat))
+
+    def gMINUS(self, repeat=1):
+        """Go to the previous text state in time."""
+        if self._widget.large_file():
+            self._editor_undo(-repeat)
+        else:
+            self._undo_goto(self._undo_tree().step(-repeat))
+
+    def gPLUS(self, repeat=1):
+        """Go to the next text state in time."""
+        if self._widget.large_file():
+            self._editor_undo(repeat)
+        else:
+            self._undo_goto(self._undo_tree().step(repeat))
+
     def U(self, repeat):
         """Undo all latest changes on one line."""
         if self.visual_mode:
             # TODO: make selection uppercase
             pass
+        elif self._widget.large_file():
+            self._widget.show_message("not available in large file mode")
+        else:
+            # Recorded as a new change, so U itself can be undone
+            changes = self._undo_tree().line_changes()
+            if changes:
+                self._apply_edits([(node.position, len(node.inserted),
+                                    node.removed) for node in changes])
+                self._move_cursor(QTextCursor.StartOfLine)
 
     # %% Deletions
     def d(self, repeat):
@@ -1077,7 +1578,6 @@ class VimKeys(QObject):
             cursor.movePosition(QTextCursor.Right, QTextCursor.KeepAnchor)
         text = cursor.selectedText().replace('\u2029', '\n')
         self.set_register(text, self.visual_mode, register=self.register)
-        QApplication.clipboard().setText(text)
         cursor.setPosition(cursor.selectionStart())
         if self.visual_mode == 'char':
             self._update_selection_type('char')
@@ -1097,7 +1597,6 @@ class VimKeys(QObject):
         """Copy line."""
         cursor = self._editor_cursor()
         text = self._get_line(cursor, lines=repeat)
-        QApplication.clipboard().setText(text)
         self._update_selection_type("line")
         self.set_register(text, self._widget.selection_type[1], register=self.register)
 
@@ -1109,7 +1608,7 @@ class VimKeys(QObject):
                             repeat - 1)
         cursor.movePosition(QTextCursor.EndOfWord, QTextCursor.KeepAnchor)
         text = cursor.selectedText().replace('\u2029', '\n')
-        QApplication.clipboard().setText(text)
+        self._update_selection_type("char")
         self.set_register(text, self._widget.selection_type[1], register=self.register)
 
     def yDOLLAR(self, repeat):
@@ -1119,7 +1618,7 @@ class VimKeys(QObject):
         cursor.movePosition(QTextCursor.EndOfLine, QTextCursor.KeepAnchor,
                             repeat)
         text = cursor.selectedText().replace('\u2029', '\n')
-        QApplication.clipboard().setText(text)
+        self._update_selection_type("char")
         self.set_register(text, self._widget.selection_type[1], register=self.register)
 
     def p(self, repeat):
@@ -1139,8 +1638,14 @@ class VimKeys(QObject):
 
     def P(self, repeat):
         """Paste line above current line, paste characters before cursor."""
-        text, selection_state = self.get_register(register=self.register)
-        lines = text.splitlines()
+        if self.register in CLIPBOARD_REGISTERS:
+            text, selection_state = self.get_register(self.register)
+            lines = text.splitlines()
+        else:
+            content = self.registers.get(self.register)
+            self.register = "unnamed"
+            text, selection_state = content.text, content.mode
+            lines = content.lines()
         mode_state = self.visual_mode
         if mode_state:
             self.d(1)
@@ -1148,29 +1653,24 @@ class VimKeys(QObject):
         cursor = editor.textCursor()
         if selection_state == 'line':
             if not mode_state:
-                text *= repeat
                 startBlockPosition = cursor.block().position()
                 cursor.movePosition(QTextCursor.StartOfLine)
-                cursor.insertText(text)
+                self._insert_text(cursor, text, repeat)
                 cursor.setPosition(startBlockPosition)
                 if lines[0].strip():
                     cursor.movePosition(QTextCursor.NextWord)
                 cursor.movePosition(QTextCursor.StartOfLine)
                 editor.setTextCursor(cursor)
             elif mode_state == 'char':
-                text *= repeat
-                text = '\n' + text
-                cursor.insertText(text)
+                self._insert_text(cursor, text, repeat, prefix='\n')
             elif mode_state == 'line':
-                text *= repeat
-                cursor.insertText(text)
+                self._insert_text(cursor, text, repeat)
 
         elif selection_state == 'char':
             if mode_state == 'line':
                 text = text + '\n'
             startPosition = cursor.position()
-            for i in range(repeat):
-                cursor.insertText(text)
+            self._insert_text(cursor, text, repeat)
             if len(lines) > 1 or mode_state == 'line':
                 cursor.setPosition(startPosition)
                 editor.setTextCursor(cursor)
@@ -1180,6 +1680,31 @@ class VimKeys(QObject):
             pass
         self._widget.update_vim_cursor()
 
+    def _insert_text(self, cursor, text, repeat=1, prefix=""):
+        """Insert prefix then repeat copies of text in one edit block.
+
+        Large pastes are inserted in chunks while the event loop keeps
+        running (without user input) and show their progress in the status
+        label.
+        """
+        size = len(prefix) + len(text) * repeat
+        cursor.beginEditBlock()
+        if size <= PASTE_STREAM_SIZE:
+            cursor.insertText(prefix + text * repeat)
+        else:
+            cursor.insertText(prefix)
+            per_chunk = max(1, PASTE_CHUNK_SIZE // max(len(text), 1))
+            done = 0
+            while done < repeat:
+                count = min(per_chunk, repeat - done)
+                cursor.insertText(text * count)
+                done += count
+                self._widget.show_progress(_("PASTE"), done / repeat)
+                QApplication.processEvents(
+                    QEventLoop.ExcludeUserInputEvents)
+            self._widget.show_progress()
+        cursor.endEditBlock()
+
     # %% Files
     def ZZ(self, repeat):
         """Save and close current file."""
@@ -1187,6 +1712,46 @@ class VimKeys(QObject):
         self._widget.main.editor.close_action.trigger()
         self._widget.commandline.setFocus()
 
+    def CTRL_CARET(self, repeat=-1):
+        """Go to the alternate file, or to buffer {count}."""
+        try:
+            self._widget.vim_commands.buffer(
+                "#" if repeat == -1 else str(repeat))
+        except ValueError as error:
+            self._widget.show_message(str(error))
+
+    # %% Windows
+    def CTRL_W(self, leftover, repeat=1):
+        """Move between the editor splits, resize, split or close them."""
+        windows = self._widget.windows
+        try:
+            if leftover in ("h", "j", "k", "l"):
+                windows.move(leftover, repeat)
+            elif leftover in ("w", "W"):
+                windows.cycle(repeat if leftover == "w" else -repeat)
+            elif leftover == "p":
+                windows.go_previous()
+            elif leftover in ("=", "_", "|"):
+                windows.resize(leftover)
+            elif leftover in ("s", "v"):
+                windows.split(vertical=leftover == "v")
+            elif leftover == "c":
+                windows.close()
+            elif leftover == "o":
+                windows.only()
+        except ValueError as error:
+            self._widget.show_message(str(error))
+        self._widget.commandline.setFocus()
+
+    # %% Command line
+    def q(self, leftover, repeat=1):
+        """List a command line history (q:, q/, q?).
+
+        Recording (q{register}) is not supported.
+        """
+        if leftover in HISTORY_NAMES:
+            self._widget.vim_commands.history(leftover)
+
     # %% Visual mode
     def v(self, repeat):
         """Start Visual mode per character."""
@@ -1224,7 +1789,7 @@ class VimKeys(QObject):
     # TODO: CTRL + V sets visual mode to 'block'
     def gt(self, repeat):
         """Cycle to next file."""
-        editorstack = self._widget.editor_widget.get_current_editorstack()
+        editorstack = self._widget.windows.editorstack()
         if repeat == -1:
             editorstack.tabs.tab_navigate(1)
         else:  # {i}gt: go to tab in position i
@@ -1235,7 +1800,7 @@ class VimKeys(QObject):
 
     def gT(self, repeat):
         """Cycle to previous file."""
-        editorstack = self._widget.editor_widget.get_current_editorstack()
+        editorstack = self._widget.windows.editorstack()
         for _ in range(repeat):
             editorstack.tabs.tab_navigate(-1)
         self._widget.commandline.setFocus()
@@ -1403,6 +1968,47 @@ class VimKeys(QObject):
         editor.setTextCursor(cursor)
         self.CARET()
 
+    # %% Operators
+    def operate(self, operator, motion, count=None, arg=None):
+        """Apply operator to the range of a motion or text object.
+
+        The range is computed on a snapshot of the text without moving the
+        cursor, then the change is done in one edit block and the cursor is
+        moved once.
+        """
+        adapter = self._widget.adapter()
+        position = adapter.cursor()
+        if self._widget.large_file():
+            # Only the lines holding the range are read
+            offset, text, __ = text_window(
+                adapter, position,
+                lambda text, position: operator_range(
+                    text, position, operator, motion, count, arg))
+        else:
+            offset, text = 0, adapter.text()
+        result = apply_operator(text, position - offset, operator, motion,
+                                count, arg)
+        if result is None:
+            return
+        edits, register, position = result
+        if offset:
+            edits = [(edit_position + offset, length, new_text)
+                     for edit_position, length, new_text in edits]
+            position += offset
+        self.checkpoint()
+        if register is not None:
+            text, mode = register
+            self._update_selection_type(mode)
+            self.set_register(text, mode, register=self.register,
+                              cut=operator != "y", copied=False)
+        if edits:
+            adapter.edit(edits)
+        adapter.set_cursor(position)
+        self._widget.update_vim_cursor()
+        self.checkpoint()
+        if operator == "c":
+            self.i()
+
 # %% Vim commands
 class VimCommands(object):
     """Colon prefix commands."""
@@ -1410,24 +2016,120 @@ class VimCommands(object):
     def __init__(self, widget):
         """Main constructor."""
         self._widget = widget
+        # (pattern, replacement, flags) of the last :s
+        self._last_substitute = None
+        # MarkedAdapter of the running :g
+        self._global = None
 
     def __call__(self, cmd):
         """Execute colon prefix command."""
         if not cmd or cmd.startswith("_"):
             return
-        cmd = cmd.split(None, 1)
-        args = cmd[1] if len(cmd) > 1 else ""
-        cmd = cmd[0]
+        try:
+            command = parse_command(cmd)
+            if not (command.name or command.addresses or command.bang):
+                return
+            method, name = self._method(command)
+            args = self._arguments(command, name)
+        except ValueError as error:
+            self._widget.show_message(str(error))
+            return
 
-        if cmd.isdigit():
-            self.NUMBER(cmd)
-        else:
-            try:
-                method = self.__getattribute__(cmd)
-            except AttributeError:
-                print("unknown command", cmd)
+        self._widget.vim_keys.checkpoint()
+        try:
+            if name in ("perf", "profile"):
+                # The statistics do not include their own commands
+                method(*args)
             else:
-                method(args)
+                self._widget.perf.run(":" + name, self._widget.editor(),
+                                      method, *args)
+        except ValueError as error:
+            self._widget.show_message(str(error))
+        self._widget.vim_keys.checkpoint()
+
+    def _method(self, command):
+        """Return the (method, name) of a parsed command."""
+        name = expand_name(command.name)
+        if not name and command.bang:
+            # :!cmd and :{range}!filter
+            name = "!"
+        name = SYMBOLS_REPLACEMENT.get(name, name) or "NUMBER"
+        if iskeyword(name):
+            name += "_"
+        try:
+            return self.__getattribute__(name), name
+        except AttributeError:
+            raise ValueError("unknown command {}".format(command.name))
+
+    def _arguments(self, command, name):
+        """Return the arguments of the method of a command.
+
+        The range of range commands is resolved from the cursor.
+        """
+        if name in OPTIONAL_RANGE_COMMANDS and not command.addresses:
+            return command.args, None, command.bang
+        if name in RANGE_COMMANDS:
+            line_range = resolve_range(command, self._adapter(),
+                                       self._mark_line,
+                                       whole=name in WHOLE_RANGE_COMMANDS)
+            if self._widget.vim_keys.visual_mode:
+                self._widget.vim_keys.exit_visual_mode()
+            return command.args, line_range, command.bang
+        if command.addresses:
+            raise ValueError("no range allowed")
+        if name in BANG_COMMANDS:
+            return command.args, command.bang
+        if command.bang:
+            raise ValueError("no ! allowed")
+        return (command.args,)
+
+    def _adapter(self):
+        """Return the adapter of the current editor, or of the running :g."""
+        if self._global is not None:
+            return self._global
+        return self._widget.adapter()
+
+    def _update_cursor(self):
+        """Show the vim cursor, after the last line of a :g."""
+        if self._global is None:
+            self._widget.update_vim_cursor()
+
+    def _show_message(self, message):
+        """Show a message, unless in a :g, like vim."""
+        if self._global is None:
+            self._widget.show_message(message)
+
+    def _mark_line(self, name):
+        """Return the line of a mark in the current file, or None."""
+        if name in "<>":
+            lines = self._widget.vim_keys.visual_lines()
+            if lines is None:
+                return None
+            return lines[0] if name == "<" else lines[1]
+        filename = self._widget.editor().filename
+        mark = self._widget.viminfo.get_mark(name, filename)
+        if mark is None or mark[0] != filename:
+            return None
+        return mark[1]
+
+    def _apply(self, result, register=None, adapter=None):
+        """Apply the (edits, register, cursor) result of a range command.
+
+        adapter is the adapter of the current editor by default.
+        """
+        edits, content, cursor = result
+        vim_keys = self._widget.vim_keys
+        if content is not None:
+            text, mode = content
+            vim_keys._update_selection_type(mode)
+            vim_keys.set_register(text, mode, register=register or "unnamed",
+                                  cut=bool(edits), copied=False)
+        adapter = adapter or self._adapter()
+        if edits:
+            adapter.edit(edits)
+        if cursor is not None:
+            adapter.set_cursor(cursor)
+        self._update_cursor()
 
     # %% Files
     def w(self, args=""):
@@ -1450,37 +2152,751 @@ class VimCommands(object):
         self._widget.main.editor.new_action.trigger()
         self._widget.commandline.setFocus()
 
-    def e(self, args=""):
-        """Reload current file."""
+    def edit(self, args="", bang=False):
+        """Open a file by path or name (:e[!] [file]).
+
+        Without file, reload the current file, :e . shows the open dialog.
+        If the current file is modified, it is only left or reloaded with !,
+        which discards its changes.
+        """
         args = args.strip()
-        if not args:  # Revert without asking
-            editor = self._widget.main.editor
-            editorstack = editor.get_current_editorstack()
-            editorstack.reload(editorstack.get_stack_index())
-        elif args == ".":
+        editorstack = self._widget.windows.editorstack()
+        index = editorstack.get_stack_index()
+        finfo = editorstack.data[index]
+        modified = finfo.editor.document().isModified()
+        if modified and not bang:
+            raise ValueError("no write since last change (add ! to override)")
+        if (modified or not args) and osp.isfile(finfo.filename):
+            # Revert without asking
+            editorstack.reload(index)
+        if args == ".":
             self._widget.main.editor.open_action.trigger()
+        elif args:
+            self._widget.files.open(args)
+
+        self._widget.commandline.setFocus()
+
+    def split(self, args=""):
+        """Split the editor horizontally (:sp [file])."""
+        args = args.strip()
+        if args:
+            self._widget.files.open(args, split="split")
         else:
-            print("not implemented")
+            self._widget.windows.split()
+        self._widget.commandline.setFocus()
 
+    def vsplit(self, args=""):
+        """Split the editor side by side (:vs [file])."""
+        args = args.strip()
+        if args:
+            self._widget.files.open(args, split="vsplit")
+        else:
+            self._widget.windows.split(vertical=True)
+        self._widget.commandline.setFocus()
+
+    def close(self, args=""):
+        """Close the current split (:clo)."""
+        self._widget.windows.close()
         self._widget.commandline.setFocus()
 
-    def NUMBER(self, args=""):
-        """Go to line."""
+    def only(self, args=""):
+        """Close all the splits but the current one (:on)."""
+        self._widget.windows.only()
+        self._widget.commandline.setFocus()
+
+    def tabedit(self, args=""):
+        """Open a file in a new tab (:tabe [file]), or a new file."""
+        args = args.strip()
+        if args:
+            self._widget.files.open(args)
+            self._widget.commandline.setFocus()
+        else:
+            self.n()
+
+    # %% Buffers
+    def _buffers(self):
+        """Return the current editorstack and the list of its files."""
+        editorstack = self._widget.windows.editorstack()
+        buffers = self._widget.buffers
+        buffers.update(editorstack.get_filenames())
+        return editorstack, buffers
+
+    def _buffer_path(self, args, editorstack, buffers):
+        """Return the path of a buffer, by number, name, % or #."""
+        args = args.strip()
+        if not args or args == "%":
+            return editorstack.get_current_filename()
+        if args == "#":
+            # Spyder keeps the order in which the files were shown
+            try:
+                index = editorstack.stack_history[-2]
+            except IndexError:
+                raise ValueError("no alternate file")
+            return editorstack.data[index].filename
+        if args.isdigit():
+            path = buffers.paths.get(int(args))
+            if path is None:
+                raise ValueError("buffer {} does not exist".format(args))
+            return path
+        return buffers.find(args)
+
+    def _show_buffer(self, editorstack, path):
+        """Show an open file."""
+        editorstack.set_stack_index(editorstack.has_filename(path))
+        self._widget.commandline.setFocus()
+
+    def ls(self, args=""):
+        """List the open files with their number (:ls, :buffers, :files).
+
+        % marks the current file, # the alternate file and + the modified
+        files.
+        """
+        editorstack, buffers = self._buffers()
+        current = editorstack.get_current_filename()
+        try:
+            alternate = self._buffer_path("#", editorstack, buffers)
+        except ValueError:
+            alternate = None
+        editors = {finfo.filename: finfo.editor
+                   for finfo in editorstack.data}
+        cwd = os.getcwd()
+        lines = []
+        for number in buffers.sorted_numbers():
+            path = buffers.paths[number]
+            editor = editors[path]
+            name = display_name(path, cwd)
+            lines.append('{:3d} {:2} {:1} "{}" line {}'.format(
+                number,
+                "%a" if path == current else "#" if path == alternate else "",
+                "+" if editor.document().isModified() else "",
+                name, editor.textCursor().blockNumber() + 1))
+        print("\n".join(lines))
+
+    def buffer(self, args=""):
+        """Show an open file by number, % or #, or name (:b {name}).
+
+        Names are matched as fuzzy subsequences of the file names, or of the
+        paths if the name has a slash.
+        """
+        editorstack, buffers = self._buffers()
+        self._show_buffer(editorstack,
+                          self._buffer_path(args, editorstack, buffers))
+
+    def _buffer_step(self, args, direction):
+        """Show the open file count numbers before or after the current."""
+        args = args.strip()
+        if args and not args.isdigit():
+            raise ValueError("invalid argument {}".format(args))
+        editorstack, buffers = self._buffers()
+        numbers = buffers.sorted_numbers()
+        if not numbers:
+            return
+        current = buffers.numbers[editorstack.get_current_filename()]
+        index = numbers.index(current) + direction * int(args or 1)
+        self._show_buffer(editorstack,
+                          buffers.paths[numbers[index % len(numbers)]])
+
+    def bnext(self, args=""):
+        """Show the next open file (:bn [count])."""
+        self._buffer_step(args, 1)
+
+    def bprevious(self, args=""):
+        """Show the previous open file (:bp [count])."""
+        self._buffer_step(args, -1)
+
+    def bdelete(self, args="", bang=False):
+        """Close an open file (:bd[!] [N|name]), the current one by default.
+
+        A modified file is only closed with !, discarding its changes.
+        """
+        editorstack, buffers = self._buffers()
+        path = self._buffer_path(args, editorstack, buffers)
+        index = editorstack.has_filename(path)
+        if editorstack.data[index].editor.document().isModified() \
+                and not bang:
+            raise ValueError("no write since last change for buffer {} "
+                             "(add ! to override)".format(
+                                 buffers.numbers[path]))
+        editorstack.close_file(index, force=True)
+        self._widget.commandline.setFocus()
+
+    # %% History
+    def history(self, args=""):
+        """List a command line history, : by default (:his [:|/|?])."""
+        history_type = args.strip() or ":"
+        if history_type not in HISTORY_NAMES:
+            raise ValueError("invalid argument {}".format(history_type))
+        lines = ["      #  {} history".format(HISTORY_NAMES[history_type])]
+        lines.extend("{:7d}  {}".format(number, entry) for number, entry in
+                     enumerate(self._widget.viminfo.get_history(
+                         history_type), 1))
+        print("\n".join(lines))
+
+    # %% Options
+    def set(self, args=""):
+        """Set options (name=value, name, noname, name?)."""
+        options = self._widget.options
+        for arg in args.split():
+            name, sep, value = arg.partition("=")
+            if name.endswith("?") or (not sep and name in options
+                                      and not isinstance(options[name],
+                                                         bool)):
+                name = name.rstrip("?")
+                print("{}={}".format(name, options.get(name)))
+            elif not sep and name in options:
+                options[name] = True
+            elif not sep and name[2:] in options and name.startswith("no"):
+                options[name[2:]] = False
+            elif name not in options:
+                print("unknown option", name)
+            elif isinstance(options[name], int):
+                try:
+                    options[name] = int(value)
+                except ValueError:
+                    print("invalid value", value)
+            elif name in OPTION_VALUES and not set(value.split(",")) <= set(
+                    OPTION_VALUES[name]):
+                print("invalid value", value)
+            else:
+                options[name] = value
+
+    # %% Undo
+    def _undo_travel(self, args, direction):
+        """Go to an older or newer text state."""
+        match = RE_UNDO_TIME.match(args.strip())
+        if not match:
+            print("invalid argument", args)
+            return
+        count, unit = match.groups()
+        count = int(count) if count else 1
+        if unit:
+            self._widget.vim_keys.undo_travel(
+                seconds=direction * count * UNDO_TIME_UNITS[unit])
+        else:
+            self._widget.vim_keys.undo_travel(count=direction * count)
+
+    def earlier(self, args=""):
+        """Go to older text state ({count}, {N}s, {N}m, {N}h or {N}d)."""
+        self._undo_travel(args, -1)
+
+    def later(self, args=""):
+        """Go to newer text state ({count}, {N}s, {N}m, {N}h or {N}d)."""
+        self._undo_travel(args, 1)
+
+    # %% Performance
+    def perf(self, args=""):
+        """Show the command latency statistics (on, off, reset)."""
+        args = args.strip()
+        perf = self._widget.perf
+        if args == "on":
+            perf.start()
+        elif args == "off":
+            perf.stop()
+        elif args == "reset":
+            perf.reset()
+        elif args:
+            print("invalid argument", args)
+        else:
+            print(perf.report())
+
+    def profile(self, args=""):
+        """Capture a profile of the key handling (start [file], stop).
+
+        stop writes the cProfile statistics to file, by default in the
+        configuration directory, and a Chrome trace next to it.
+        """
+        action, __, path = args.strip().partition(" ")
+        perf = self._widget.perf
+        if action == "start":
+            if perf.profiler is not None:
+                print("profile already started")
+                return
+            path = path.strip() or osp.join(
+                self._widget.viminfo.dirname,
+                strftime("profile-%Y%m%d-%H%M%S.prof"))
+            try:
+                perf.start_profile(osp.expanduser(path))
+            except ValueError as error:
+                # Another profiler is running
+                print("cannot start profile:", error)
+        elif action == "stop":
+            if perf.profiler is None:
+                print("no profile started")
+                return
+            try:
+                paths = perf.stop_profile()
+            except OSError as error:
+                print("cannot write profile:", error)
+            else:
+                print("profile written to {} and {}".format(*paths))
+        else:
+            print("invalid argument", args)
+
+    # %% Pager
+    def view(self, args=""):
+        """Open a file in a read-only pager, for files too large to edit."""
+        path = osp.expanduser(args.strip())
+        if not path:
+            print("missing file name")
+            return
+        try:
+            pager = VimPager(path, self._widget)
+        except (OSError, ValueError) as error:
+            print("cannot open file:", error)
+            return
+        pager.show()
+
+    # %% Ranges
+    def NUMBER(self, args="", line_range=None, bang=False):
+        """Go to the last line of the range."""
+        if self._global is not None:
+            self._global.set_cursor(
+                self._global.block_position(line_range[1]))
+            return
         editor = self._widget.editor()
-        editor.go_to_line(int(args))
+        editor.go_to_line(line_range[1] + 1)
         self._widget.update_vim_cursor()
 
+    def delete(self, args="", line_range=None, bang=False):
+        """Delete lines ([range]d [x] {count})."""
+        register, count = parse_count(args)
+        adapter = self._adapter()
+        first, last = apply_count(*line_range, count, adapter.block_count())
+        self._apply(delete_lines(adapter, first, last), register)
+
+    def yank(self, args="", line_range=None, bang=False):
+        """Yank lines ([range]y [x] {count})."""
+        register, count = parse_count(args)
+        adapter = self._adapter()
+        first, last = apply_count(*line_range, count, adapter.block_count())
+        self._apply(yank_lines(adapter, first, last), register)
+
+    def move(self, args="", line_range=None, bang=False):
+        """Move lines below an address ([range]m {address})."""
+        adapter = self._adapter()
+        target = resolve_target(args, adapter, self._mark_line)
+        edits, __, cursor = move_lines(adapter, *line_range, target)
+        if edits and self._global is not None:
+            # Copy and delete the lines, for the marks of :g to follow them
+            copy = copy_lines(adapter, *line_range, target)[0]
+            delete = delete_lines(adapter, *line_range)[0]
+            edits = delete + copy if target < line_range[0] else \
+                copy + delete
+        self._apply((edits, None, cursor))
+
+    def copy(self, args="", line_range=None, bang=False):
+        """Copy lines below an address ([range]t {address})."""
+        adapter = self._adapter()
+        target = resolve_target(args, adapter, self._mark_line)
+        self._apply(copy_lines(adapter, *line_range, target))
+
+    def _shift(self, args, line_range, symbol):
+        """Shift lines once per symbol ([range]> {count}, [range]>> ...)."""
+        levels = 1 + len(args) - len(args.lstrip(symbol))
+        register, count = parse_count(args.lstrip(symbol))
+        if register is not None:
+            raise ValueError("trailing characters: {}".format(args.strip()))
+        adapter = self._adapter()
+        first, last = apply_count(*line_range, count, adapter.block_count())
+        if symbol == "<":
+            levels = -levels
+        self._apply(shift_lines(adapter, first, last, levels))
+
+    def GREATER(self, args="", line_range=None, bang=False):
+        """Indent lines ([range]> {count})."""
+        self._shift(args, line_range, ">")
+
+    def LESS(self, args="", line_range=None, bang=False):
+        """Dedent lines ([range]< {count})."""
+        self._shift(args, line_range, "<")
+
+    def join(self, args="", line_range=None, bang=False):
+        """Join lines ([range]j[!] {count}), without spaces with !."""
+        register, count = parse_count(args)
+        if register is not None:
+            raise ValueError("trailing characters: {}".format(args.strip()))
+        adapter = self._adapter()
+        first, last = line_range
+        if count is not None:
+            # {count} lines from the last line of the range
+            first, last = last, last + count - 1
+        self._apply(join_lines(adapter, first, last, spaces=not bang))
+
+    def substitute(self, args="", line_range=None, bang=False):
+        """Replace a pattern ([range]s/pattern/replacement/[flags] [count]).
+
+        The pattern is a Python regular expression, the replacement uses the
+        vim syntax (see compile_replacement). Flags: g (every match of the
+        lines), i and I (ignore case or not), n (count the matches), e (no
+        error without match) and & (flags of the last :s). Without argument,
+        :s repeats the last substitute.
+        """
+        pattern, replacement, flags, count = parse_substitute(args)
+        last_substitute = self._last_substitute
+        if pattern is None:
+            if last_substitute is None:
+                raise ValueError("no previous substitute")
+            pattern, replacement, flags = last_substitute
+        elif "&" in flags and last_substitute is not None:
+            flags += last_substitute[2]
+        if not pattern:
+            last_search = self._widget.viminfo.last_search
+            if not last_search:
+                raise ValueError("no previous regular expression")
+            pattern = last_search[0]
+        if "c" in flags:
+            raise ValueError("the c flag is not supported")
+        try:
+            regex = re.compile(pattern, re.MULTILINE | (
+                re.IGNORECASE if "i" in flags.replace("I", "") else 0))
+        except re.error as error:
+            raise ValueError("invalid pattern: {}".format(error))
+        previous = last_substitute[1] if last_substitute else ""
+        self._last_substitute = (pattern, replacement, flags.replace("&", ""))
+        adapter = self._adapter()
+        first, last = apply_count(*line_range, count, adapter.block_count())
+        result, count, lines = substitute_lines(
+            adapter, first, last, regex,
+            compile_replacement(replacement, previous), every="g" in flags,
+            count_only="n" in flags)
+        if not count:
+            if "e" not in flags:
+                self._show_message(
+                    "pattern not found: {}".format(pattern))
+            return
+        self._apply(result)
+        self._show_message("{} {} on {} line{}".format(
+            count, ("match" if count == 1 else "matches") if "n" in flags
+            else "substitution" + ("s" if count > 1 else ""),
+            lines, "s" if lines > 1 else ""))
+
+    def sort(self, args="", line_range=None, bang=False):
+        """Sort lines ([range]sort[!] [b][f][i][n][o][r][u][x] [/pattern/]).
+
+        See sort_lines for the options, ! sorts in reverse order. An empty
+        pattern is the last search.
+        """
+        options, pattern = parse_sort(args)
+        regex = None
+        if pattern is not None:
+            if not pattern:
+                last_search = self._widget.viminfo.last_search
+                if not last_search:
+                    raise ValueError("no previous regular expression")
+                pattern = last_search[0]
+            try:
+                regex = re.compile(pattern)
+            except re.error as error:
+                raise ValueError("invalid pattern: {}".format(error))
+        adapter = self._adapter()
+        self._apply(sort_lines(adapter, *line_range, options, regex,
+                               reverse=bang))
+
+    def EXCLAMATION(self, args="", line_range=None, bang=False):
+        """Run a shell command (:!cmd) or filter lines ([range]!filter).
+
+        The command runs in the background, the lines are replaced by its
+        output when it finishes, unless they were changed meanwhile.
+        """
+        command = args.strip()
+        if not command:
+            raise ValueError("missing shell command")
+        if line_range is None:
+            self._widget.shell.run(command, self._show_output)
+            return
+        if self._global is not None:
+            raise ValueError("cannot filter lines in :global")
+        adapter = self._widget.adapter()
+        start, end, text = range_text(adapter, *line_range)
+        selection = QTextCursor(adapter.document)
+        selection.setPosition(start)
+        selection.setPosition(end, QTextCursor.KeepAnchor)
+
+        def replace(output):
+            if selection.isNull() or selection.selectedText().replace(
+                    "\u2029", "\n") != text:
+                self._widget.show_message(
+                    "lines changed, filter output discarded")
+                return
+            first = adapter.block_number(selection.selectionStart())
+            last = adapter.block_number(selection.selectionEnd())
+            self._apply_later(filter_lines(adapter, first, last, output),
+                              adapter)
+
+        self._widget.shell.run(command, replace, text + "\n")
+
+    def read(self, args="", line_range=None, bang=False):
+        """Insert a file or the output of a shell command ([line]r[!] ...).
+
+        The text is inserted below the line, the output of a shell command
+        (:r !cmd) when the command finishes.
+        """
+        if bang or args.lstrip().startswith("!"):
+            command = args.strip().lstrip("!").strip()
+            if not command:
+                raise ValueError("missing shell command")
+            adapter = self._widget.adapter()
+            line = line_range[1]
+            anchor = QTextCursor(adapter.document)
+            anchor.setPosition(adapter.block_position(line))
+
+            def insert(output):
+                if anchor.isNull():
+                    return
+                line = adapter.block_number(anchor.position())
+                self._apply_later(insert_lines(adapter, line, output),
+                                  adapter)
+
+            self._widget.shell.run(command, insert)
+            return
+        path = osp.expanduser(args.strip())
+        if not path:
+            raise ValueError("missing file name")
+        try:
+            with open(path, encoding="utf-8") as text_file:
+                text = text_file.read()
+        except (OSError, ValueError) as error:
+            raise ValueError("cannot read file: {}".format(error))
+        adapter = self._adapter()
+        self._apply(insert_lines(adapter, line_range[1], text))
+
+    def _apply_later(self, result, adapter):
+        """Apply the result of a shell command as its own undo step."""
+        vim_keys = self._widget.vim_keys
+        vim_keys.checkpoint()
+        self._apply(result, adapter=adapter)
+        vim_keys.checkpoint()
+
+    def _show_output(self, output):
+        """Show the output of :!cmd, its last line in the command line."""
+        output = output.rstrip("\n")
+        if output:
+            print(output)
+        self._widget.commandline.setPlaceholderText(
+            output.rsplit("\n", 1)[-1])
+
+    def global_(self, args="", line_range=None, bang=False):
+        """Run a command on the matching lines ([range]g[!]/pattern/cmd).
+
+        With !, on the lines which do not match, like :v.
+        """
+        self._run_global(args, line_range, invert=bang)
+
+    def vglobal(self, args="", line_range=None, bang=False):
+        """Run a command on the lines not matching ([range]v/pattern/cmd)."""
+        self._run_global(args, line_range, invert=True)
+
+    def _run_global(self, args, line_range, invert):
+        """Mark the lines matching a pattern, then run a command on them.
+
+        The command runs with the cursor at the start of each marked line,
+        in one edit block. Without command, go to the last marked line.
+        """
+        if self._global is not None:
+            raise ValueError("cannot use :global recursively")
+        pattern, text = parse_global(args)
+        if not pattern:
+            last_search = self._widget.viminfo.last_search
+            if not last_search:
+                raise ValueError("no previous regular expression")
+            pattern = last_search[0]
+        try:
+            regex = re.compile(pattern, re.MULTILINE)
+        except re.error as error:
+            raise ValueError("invalid pattern: {}".format(error))
+        adapter = self._widget.adapter()
+        lines = mark_lines(adapter, *line_range, regex, invert)
+        if not lines:
+            self._widget.show_message("pattern not found: {}".format(pattern))
+            return
+        command = parse_command(text)
+        if not command.name and not command.addresses:
+            self.NUMBER(line_range=(lines[-1], lines[-1]))
+            return
+        method, name = self._method(command)
+        marks = LineMarks(lines)
+        self._global = MarkedAdapter(adapter, marks)
+        cursor = QTextCursor(adapter.document)
+        cursor.beginEditBlock()
+        try:
+            line = marks.next()
+            while line is not None:
+                self._global.set_cursor(adapter.block_position(line))
+                method(*self._arguments(command, name))
+                line = marks.next()
+        finally:
+            cursor.endEditBlock()
+            adapter.set_cursor(self._global.cursor())
+            self._global = None
+            self._widget.update_vim_cursor()
+
+    def normal(self, args="", line_range=None, bang=False):
+        """Run normal mode keys on each line of the range.
+
+        The keys run in the headless engine, an unfinished command or insert
+        is ended with Escape. The lines are changed in one edit block, the
+        range follows the lines added or removed by the keys.
+        """
+        if not args:
+            raise ValueError("argument required")
+        adapter = self._adapter()
+        engine = VimEngine(adapter, self._widget.vim_keys.registers)
+        first, last = line_range
+        cursor = QTextCursor(adapter.document)
+        cursor.beginEditBlock()
+        try:
+            line = first
+            while line <= last and line < adapter.block_count():
+                count = adapter.block_count()
+                adapter.set_cursor(adapter.block_position(line))
+                engine.feed(args + ESCAPE)
+                delta = adapter.block_count() - count
+                last += delta
+                line += 1 + delta
+        finally:
+            cursor.endEditBlock()
+        self._update_cursor()
+
+
+# %% Clipboard
+class VimClipboard(QObject):
+    """Deferred and deduplicated access to the system clipboards.
+
+    Writes are done when the event loop is idle and skipped when the
+    clipboard already holds the same text. The clipboard is only read when
+    a clipboard register is pasted.
+    """
+
+    def __init__(self, widget):
+        """Create the clipboard access of the vim widget."""
+        QObject.__init__(self, widget)
+        self._widget = widget
+        self._pending = {}
+        self._written = {}
+        self._writing = False
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self.flush)
+        clipboard = QApplication.clipboard()
+        clipboard.dataChanged.connect(
+            lambda: self._on_changed(QClipboard.Clipboard))
+        clipboard.selectionChanged.connect(
+            lambda: self._on_changed(QClipboard.Selection))
+
+    def _mode(self, register):
+        """Return the QClipboard mode of a clipboard register."""
+        if register == "*" and QApplication.clipboard().supportsSelection():
+            return QClipboard.Selection
+        return QClipboard.Clipboard
+
+    def _on_changed(self, mode):
+        if self._writing:
+            return
+        # Changed by another application, forget what we wrote
+        self._written.pop(mode, None)
+        if mode == QClipboard.Clipboard:
+            self._widget.on_copy()
+
+    def set_text(self, text, register_mode, register="+"):
+        """Schedule writing text to the clipboard of register."""
+        self._pending[self._mode(register)] = (text, register_mode)
+        self._timer.start()
+
+    def text(self, register="+"):
+        """Return (text, mode) of the clipboard of register."""
+        mode = self._mode(register)
+        if mode in self._pending:
+            return self._pending[mode]
+        if mode in self._written:
+            return self._written[mode]
+        text = QApplication.clipboard().text(mode)
+        return text, "line" if text.endswith("\n") else "char"
+
+    def flush(self):
+        """Write the pending texts to the clipboards."""
+        self._timer.stop()
+        pending, self._pending = self._pending, {}
+        clipboard = QApplication.clipboard()
+        for mode, content in pending.items():
+            if self._written.get(mode, (None,))[0] == content[0]:
+                continue
+            self._writing = True
+            try:
+                clipboard.setText(content[0], mode)
+            finally:
+                self._writing = False
+            self._written[mode] = content
+
 
 # %%
 class VimLineEdit(QLineEdit):
     """Vim Command input."""
 
+    def __init__(self, parent):
+        """Create the command line, not browsing the history."""
+        QLineEdit.__init__(self, parent)
+        # [typed text, entries, index] while browsing the history
+        self._history = None
+
     def keyPressEvent(self, event):
         """Capture Backspace and ESC Keypresses."""
+        profiler = self.parent().perf.profiler
+        if profiler is None:
+            self._key_press(event)
+        else:
+            text = event.text()
+            name = text if text.isprintable() and text else \
+                QKeySequence(event.key() | int(event.modifiers())).toString()
+            profiler.span(name, "key", self._key_press, event)
+
+    def focusNextPrevChild(self, forward):
+        """Keep Tab and Shift-Tab for the completion."""
+        return False
+
+    def event(self, event):
+        """Keep Ctrl-W from the close shortcut of the editor."""
+        if (event.type() == QEvent.ShortcutOverride
+                and event.key() == Qt.Key_W
+                and event.modifiers() & Qt.ControlModifier):
+            event.accept()
+            return True
+        return QLineEdit.event(self, event)
+
+    def _key_press(self, event):
+        if event.key() not in (Qt.Key_Up, Qt.Key_Down):
+            self._history = None
+        if event.key() not in (Qt.Key_Tab, Qt.Key_Backtab):
+            self.parent().completion.reset()
         if event.key() == Qt.Key_Escape:
+            self.parent().shell.cancel()
             if self.parent().vim_keys.visual_mode:
                 self.parent().vim_keys.exit_visual_mode()
             self.clear()
+        elif (self.text().endswith("\x17") and Qt.Key_A <= event.key()
+                <= Qt.Key_Z and event.modifiers() & Qt.ControlModifier):
+            # Ctrl-W Ctrl-H is Ctrl-W h, Ctrl-W Ctrl-W is Ctrl-W w
+            self.setText(self.text() + chr(event.key()).lower())
+        elif (event.key() == Qt.Key_W
+                and event.modifiers() & Qt.ControlModifier):
+            self.setText(self.text() + "\x17")
+        elif (event.key() == Qt.Key_R
+                and event.modifiers() & Qt.ControlModifier):
+            repeat = int(self.text()) if self.text().isdigit() else 1
+            self.clear()
+            self.parent().vim_keys("CTRL_R", repeat)
+        elif (event.key() in (Qt.Key_O, Qt.Key_I)
+                and event.modifiers() & Qt.ControlModifier):
+            repeat = int(self.text()) if self.text().isdigit() else 1
+            self.clear()
+            key = "CTRL_O" if event.key() == Qt.Key_O else "CTRL_I"
+            self.parent().vim_keys(key, repeat)
+        elif (event.key() in (Qt.Key_AsciiCircum, Qt.Key_6)
+                and event.modifiers() & Qt.ControlModifier):
+            # Ctrl-^, also Ctrl-6 on keyboards where ^ needs Shift
+            repeat = int(self.text()) if self.text().isdigit() else -1
+            self.clear()
+            self.parent().vim_keys("CTRL_CARET", repeat)
         elif event.key() == Qt.Key_Backspace:
             self.setText(self.text() + "\b")
         elif event.key() == Qt.Key_Return:
@@ -1494,19 +2910,58 @@ class VimLineEdit(QLineEdit):
             self.setText("k")
         elif event.key() == Qt.Key_Down and not self.text():
             self.setText("j")
+        elif (event.key() in (Qt.Key_Up, Qt.Key_Down)
+                and self.text()[0] in VIM_COMMAND_PREFIX):
+            self._history_step(-1 if event.key() == Qt.Key_Up else 1)
+        elif event.key() in (Qt.Key_Tab, Qt.Key_Backtab):
+            if self.text() and self.text()[0] in VIM_COMMAND_PREFIX:
+                self.parent().completion.complete(
+                    1 if event.key() == Qt.Key_Tab else -1)
+            elif event.key() == Qt.Key_Tab:
+                # Tab is Ctrl-I
+                repeat = int(self.text()) if self.text().isdigit() else 1
+                self.clear()
+                self.parent().vim_keys("CTRL_I", repeat)
         else:
             QLineEdit.keyPressEvent(self, event)
 
+    def _history_step(self, step):
+        """Show an older (step -1) or a newer (step 1) history entry.
+
+        Only the entries starting with the text typed before the first Up
+        are shown, the typed text comes back after the newest one.
+        """
+        if self._history is None:
+            text = self.text()
+            entries = self.parent().viminfo.get_history(text[0])
+            self._history = [text, entries, len(entries)]
+        typed, entries, index = self._history
+        prefix = typed[1:]
+        index += step
+        while 0 <= index < len(entries) and not entries[index].startswith(
+                prefix):
+            index += step
+        if index < 0:
+            return
+        if index >= len(entries):
+            self._history[2] = len(entries)
+            self.setText(typed)
+        else:
+            self._history[2] = index
+            self.setText(typed[0] + entries[index])
+
     def focusInEvent(self, event):
         """Enter command mode."""
         QLineEdit.focusInEvent(self, event)
         self.clear()
+        self.parent().completion.clear()
         self.parent().on_mode_changed("normal")
         self.parent().vim_keys.exit_insert_mode()
 
     def focusOutEvent(self, event):
         """Enter editor mode."""
         super().focusOutEvent(event)
+        self.parent().vim_keys.checkpoint()
         self.parent().editor().clear_extra_selections('vim_cursor')
         self.parent().editor().clear_extra_selections('search')
         self.parent().on_mode_changed("insert")
@@ -1514,6 +2969,780 @@ class VimLineEdit(QLineEdit):
             self.parent().vim_keys.exit_visual_mode()
 
 
+# %% Shell
+class VimShell(QObject):
+    """Shell commands run in the background (:!, :r !, :{range}!).
+
+    The input is written to the process by chunks, as it reads it, and the
+    output is read as it comes, so the GUI never waits for the process.
+    One command runs at a time, its progress is shown in the status label
+    and Esc cancels it.
+    """
+
+    def __init__(self, widget):
+        """Create the shell of the vim widget, with no command running."""
+        QObject.__init__(self, widget)
+        self._widget = widget
+        self._process = None
+        self._input = b""
+        self._written = 0
+        self._output = []
+        self._errors = []
+        self._callback = None
+        self._started = 0
+        self._timer = QTimer(self)
+        self._timer.setInterval(SHELL_STATUS_INTERVAL)
+        self._timer.timeout.connect(self._show_progress)
+
+    def running(self):
+        """Return True if a command is running."""
+        return self._process is not None
+
+    def run(self, command, callback, text=None):
+        """Run command with text as input, then callback(output).
+
+        callback is only called if the command succeeds.
+        """
+        if self._process is not None:
+            raise ValueError("a shell command is already running")
+        shell = self._widget.options["shell"]
+        flag = "/c" if osp.basename(shell).lower().startswith("cmd") \
+            else "-c"
+        process = QProcess(self)
+        process.readyReadStandardOutput.connect(self._read_output)
+        process.readyReadStandardError.connect(self._read_errors)
+        process.bytesWritten.connect(self._write_input)
+        process.finished.connect(self._on_finished)
+        process.errorOccurred.connect(self._on_error)
+        self._process = process
+        self._input = (text or "").encode("utf-8")
+        self._written = 0
+        self._output = []
+        self._errors = []
+        self._callback = callback
+        self._started = time()
+        process.start(shell, [flag, command])
+        self._write_input()
+        self._timer.start()
+
+    def cancel(self):
+        """Kill the running command, return False if there is none."""
+        process = self._process
+        if process is None:
+            return False
+        self._stop()
+        if process.state() == QProcess.NotRunning:
+            process.deleteLater()
+        else:
+            # Deleted once it exits, without waiting for it
+            process.finished.connect(process.deleteLater)
+            process.kill()
+        self._widget.show_message("shell command cancelled")
+        return True
+
+    def _stop(self):
+        """Forget the running command."""
+        process = self._process
+        self._process = None
+        self._timer.stop()
+        self._widget.show_progress()
+        for signal in (process.readyReadStandardOutput,
+                       process.readyReadStandardError, process.bytesWritten,
+                       process.finished, process.errorOccurred):
+            signal.disconnect()
+
+    def _write_input(self, __=0):
+        """Write the next chunk of the input once the previous one is sent."""
+        process = self._process
+        if process is None or process.bytesToWrite() >= SHELL_CHUNK_SIZE:
+            return
+        if self._written < len(self._input):
+            chunk = self._input[self._written:
+                                self._written + SHELL_CHUNK_SIZE]
+            self._written += len(chunk)
+            process.write(chunk)
+        if self._written == len(self._input):
+            process.closeWriteChannel()
+
+    def _read_output(self):
+        self._output.append(bytes(self._process.readAllStandardOutput()))
+
+    def _read_errors(self):
+        self._errors.append(bytes(self._process.readAllStandardError()))
+
+    def _show_progress(self):
+        if self._input:
+            self._widget.show_progress("!", self._written / len(self._input))
+        else:
+            self._widget.show_progress(
+                "! {}s".format(int(time() - self._started)), None)
+
+    def _on_error(self, error):
+        if error == QProcess.FailedToStart:
+            process = self._process
+            self._stop()
+            process.deleteLater()
+            self._widget.show_message("cannot run shell: {}".format(
+                self._widget.options["shell"]))
+
+    def _on_finished(self, exit_code, exit_status):
+        process = self._process
+        self._read_output()
+        self._read_errors()
+        self._stop()
+        process.deleteLater()
+        output = b"".join(self._output).decode("utf-8", "replace")
+        self._output = []
+        if exit_status != QProcess.NormalExit or exit_code:
+            errors = b"".join(self._errors).decode("utf-8", "replace")
+            message = errors.strip().rsplit("\n", 1)[-1]
+            self._widget.show_message("shell returned {}{}".format(
+                exit_code, ": " + message if message else ""))
+            return
+        self._callback(output)
+
+
+# %% Files
+class VimFiles(QObject):
+    """Files opened by name (:e, :sp, :tabe).
+
+    Names are looked up in an index of the files under the working
+    directory, built in a background thread on first use and kept up to
+    date by a file system watcher. A name not indexed yet is opened when
+    the index is complete. Large files are read in a thread before Spyder
+    loads them, so that the editor reads them from the system cache.
+    """
+
+    def __init__(self, widget):
+        """Create the file access of the vim widget, not indexed yet."""
+        QObject.__init__(self, widget)
+        self._widget = widget
+        self._index = None
+        self._watcher = None
+        # (name, split) waiting for the index
+        self._pending = None
+        # (thread, path) of the file read ahead
+        self._loading = None
+        self._timer = QTimer(self)
+        self._timer.setInterval(PATH_INDEX_INTERVAL)
+        self._timer.timeout.connect(self._on_timeout)
+
+    def index(self):
+        """Return the index of the working directory, start it if needed."""
+        root = os.getcwd()
+        if self._index is None or self._index.root != root:
+            if self._index is not None:
+                self._index.stop()
+                self._watcher.deleteLater()
+            self._index = PathIndex(root)
+            self._index.start()
+            self._watcher = QFileSystemWatcher(self)
+            self._watcher.directoryChanged.connect(self._on_directory_changed)
+            self._timer.start()
+        return self._index
+
+    def open(self, name, split=None):
+        """Open a file by path or by name.
+
+        A name is a file name or the end of a path (pkg/mod.py) of a file
+        under the working directory. A new file is created for a name which
+        is not found. split is None, or "split" or "vsplit" to open the file
+        in a new split.
+        """
+        path = osp.expanduser(name)
+        if osp.isabs(path) or osp.exists(path):
+            self._load(osp.abspath(path), split)
+            return
+        index = self.index()
+        matches = index.find(path)
+        if len(matches) > 1:
+            raise ValueError("{} files match {}: {}".format(
+                len(matches), name, ", ".join(matches)))
+        if matches:
+            self._load(osp.join(index.root, matches[0]), split)
+        elif index.done:
+            self._load(osp.abspath(path), split)
+        else:
+            self._pending = (name, split)
+            self._widget.show_progress("indexing files", None)
+
+    def _load(self, path, split):
+        """Load a file in Spyder, read it in a thread first if large."""
+        try:
+            status = os.stat(path)
+        except OSError:
+            status = None
+        if status is not None and stat.S_ISDIR(status.st_mode):
+            raise ValueError("{} is a directory".format(path))
+        if split:
+            self._widget.windows.split(vertical=split == "vsplit")
+        editor = self._widget.main.editor
+        if status is None:
+            # Created when saved
+            editor.new(fname=path)
+        elif status.st_size <= READ_AHEAD_SIZE:
+            editor.load(path)
+        else:
+            thread = threading.Thread(target=read_ahead, args=(path,),
+                                      daemon=True)
+            thread.start()
+            self._loading = (thread, path)
+            self._widget.show_progress(
+                "loading {}".format(osp.basename(path)), None)
+            self._timer.start()
+
+    def _on_timeout(self):
+        """Watch new directories, open the files waiting for the index."""
+        index = self._index
+        if index is not None:
+            self._watch(index.take_directories())
+            if index.done and self._pending is not None:
+                name, split = self._pending
+                self._pending = None
+                self._widget.show_progress()
+                try:
+                    self.open(name, split)
+                except ValueError as error:
+                    self._widget.show_message(str(error))
+        if self._loading is not None and not self._loading[0].is_alive():
+            path = self._loading[1]
+            self._loading = None
+            self._widget.show_progress()
+            self._widget.main.editor.load(path)
+            self._widget.commandline.setFocus()
+        if ((index is None or index.done) and self._pending is None
+                and self._loading is None):
+            self._timer.stop()
+
+    def _watch(self, directories):
+        """Watch directories for changes, up to PATH_WATCH_LIMIT."""
+        room = PATH_WATCH_LIMIT - len(self._watcher.directories())
+        if directories and room > 0:
+            root = self._index.root
+            self._watcher.addPaths([osp.join(root, directory)
+                                    for directory in directories[:room]])
+
+    def _on_directory_changed(self, path):
+        """Scan a changed directory again."""
+        directory = osp.relpath(path, self._index.root)
+        self._index.refresh("" if directory == "." else directory)
+        self._timer.start()
+
+
+# %% Windows
+class VimWindows(QObject):
+    """Splits of the editor (:sp, :vs, :only, :close, Ctrl-W).
+
+    The editorstack of the current split is kept from the focus changes of
+    the application, so that finding the current editor on every key does
+    not search the focused widget. Vim keys are typed in the command line,
+    the current split is the last one which had the focus.
+    """
+
+    def __init__(self, widget):
+        """Create the window commands of the vim widget."""
+        QObject.__init__(self, widget)
+        self._widget = widget
+        self._current = None
+        self._previous = None
+        # Editorstacks whose destruction is watched
+        self._watched = set()
+        QApplication.instance().focusChanged.connect(self._on_focus_changed)
+
+    def editorstack(self):
+        """Return the editorstack of the current split."""
+        if self._current is None:
+            editorstack = self._widget.editor_widget.get_current_editorstack()
+            if editorstack is not None:
+                self._set_current(editorstack)
+        return self._current
+
+    def editorstacks(self):
+        """Return the editorstacks of all the splits."""
+        splitter = self._widget.editor_widget.editorsplitter
+        editorstacks = splitter.findChildren(EditorStack)
+        if isinstance(splitter, EditorStack):
+            editorstacks.insert(0, splitter)
+        return editorstacks
+
+    def split(self, vertical=False):
+        """Split the current editor, side by side if vertical.
+
+        The new split becomes the current one.
+        """
+        before = set(self.editorstacks())
+        if vertical:
+            self.editorstack().sig_split_horizontally.emit()
+        else:
+            self.editorstack().sig_split_vertically.emit()
+        for editorstack in self.editorstacks():
+            if editorstack not in before:
+                self.focus(editorstack)
+                break
+
+    def close(self):
+        """Close the current split, the previous one becomes current."""
+        editorstacks = self.editorstacks()
+        editorstack = self.editorstack()
+        if len(editorstacks) < 2:
+            raise ValueError("cannot close last window")
+        if not editorstack.is_closable:
+            raise ValueError("cannot close this window")
+        others = [other for other in editorstacks if other is not editorstack]
+        self.focus(self._previous if self._previous in others else others[0])
+        editorstack.close_split()
+
+    def only(self):
+        """Close all the splits but the current one."""
+        editorstack = self.editorstack()
+        for other in self.editorstacks():
+            if other is not editorstack and other.is_closable:
+                other.close_split()
+
+    def focus(self, editorstack):
+        """Make editorstack the current split."""
+        self._set_current(editorstack)
+        editor_widget = self._widget.editor_widget
+        if hasattr(editor_widget, "set_last_focused_editorstack"):
+            # Spyder opens files in the last focused editorstack
+            editor_widget.set_last_focused_editorstack(editor_widget,
+                                                       editorstack)
+        if editorstack.get_current_editor() is not None:
+            self._widget.update_vim_cursor()
+
+    def move(self, direction, count=1):
+        """Go to the split in direction (h, j, k or l), count times."""
+        editorstacks = self.editorstacks()
+        rects = self._rects(editorstacks)
+        index = editorstacks.index(self.editorstack())
+        editor = self._widget.editor()
+        point = None
+        if editor is not None:
+            center = editor.viewport().mapTo(self._widget.editor_widget,
+                                             editor.cursorRect().center())
+            point = (center.x(), center.y())
+        for __ in range(count):
+            found = neighbor(rects, index, direction, point)
+            if found is None:
+                break
+            index = found
+            point = None
+        self.focus(editorstacks[index])
+
+    def cycle(self, step):
+        """Go to the next split (step > 0) or to a previous one."""
+        editorstacks = self.editorstacks()
+        order = window_order(self._rects(editorstacks))
+        position = order.index(editorstacks.index(self.editorstack()))
+        self.focus(editorstacks[order[(position + step) % len(order)]])
+
+    def go_previous(self):
+        """Go to the previously current split."""
+        if self._previous is None:
+            raise ValueError("no previous window")
+        self.focus(self._previous)
+
+    def resize(self, mode):
+        """Make the splits equal (=), the current one highest (_) or widest.
+
+        With =, splitters share their space between their children in
+        proportion of the number of splits in each.
+        """
+        editorstack = self.editorstack()
+        root = self._widget.editor_widget.editorsplitter
+        splitters = root.findChildren(QSplitter)
+        if isinstance(root, QSplitter):
+            splitters.insert(0, root)
+        orientation = Qt.Vertical if mode == "_" else Qt.Horizontal
+        for splitter in splitters:
+            children = [splitter.widget(index)
+                        for index in range(splitter.count())]
+            if len(children) < 2:
+                continue
+            total = sum(splitter.sizes())
+            if mode == "=":
+                splitter.setSizes(split_sizes(total, [
+                    len(child.findChildren(EditorStack))
+                    + isinstance(child, EditorStack) or 1
+                    for child in children]))
+            elif splitter.orientation() == orientation:
+                splitter.setSizes([
+                    total if child is editorstack
+                    or child.isAncestorOf(editorstack) else 0
+                    for child in children])
+
+    def _rects(self, editorstacks):
+        """Return the geometry of editorstacks in the editor coordinates."""
+        root = self._widget.editor_widget
+        rects = []
+        for editorstack in editorstacks:
+            position = editorstack.mapTo(root, QPoint(0, 0))
+            rects.append((position.x(), position.y(), editorstack.width(),
+                          editorstack.height()))
+        return rects
+
+    def _set_current(self, editorstack):
+        if editorstack is self._current:
+            return
+        self._previous, self._current = self._current, editorstack
+        if editorstack not in self._watched:
+            self._watched.add(editorstack)
+            editorstack.destroyed.connect(lambda: self._forget(editorstack))
+
+    def _forget(self, editorstack):
+        """Drop a closed editorstack."""
+        self._watched.discard(editorstack)
+        if self._current is editorstack:
+            self._current = None
+        if self._previous is editorstack:
+            self._previous = None
+
+    def _on_focus_changed(self, old, new):
+        """Make the split of a focused editor current."""
+        while new is not None and not isinstance(new, EditorStack):
+            new = new.parentWidget()
+        if new is not None and (
+                new is self._widget.editor_widget.editorsplitter
+                or self._widget.editor_widget.isAncestorOf(new)):
+            # Not an editor of another window
+            self._set_current(new)
+
+
+# %% Completion
+class VimCompletion(QObject):
+    """Tab completion of the command line.
+
+    Tab shows the next candidate, Shift-Tab the previous one, and the typed
+    word comes back after the last one. Candidates are cached by source and
+    prefix. Paths under the working directory are listed from the file
+    index, other directories and the names of large projects in a thread,
+    so the file system is never read on the GUI thread: the completion is
+    shown when the thread is done.
+    """
+
+    def __init__(self, widget):
+        """Create the completion of the vim widget, with an empty cache."""
+        QObject.__init__(self, widget)
+        self._widget = widget
+        self._cache = CompletionCache()
+        # Listings of the directories out of the file index
+        self._listings = {}
+        self._commands = None
+        # [head, typed word, candidates, index] while cycling
+        self._cycle = None
+        # (thread, command line text, step) of the running thread
+        self._job = None
+        self._timer = QTimer(self)
+        self._timer.setInterval(COMPLETION_INTERVAL)
+        self._timer.timeout.connect(self._on_timeout)
+
+    def reset(self):
+        """Stop cycling through the candidates."""
+        self._cycle = None
+
+    def clear(self):
+        """Forget the listings of the directories out of the file index."""
+        self._listings = {}
+        self._cycle = None
+
+    def complete(self, step):
+        """Complete the command line, step is 1 for Tab, -1 for Shift-Tab."""
+        commandline = self._widget.commandline
+        if self._cycle is None:
+            text = commandline.text()
+            result = self._candidates(text)
+            if result is None:
+                if self._job is not None:
+                    self._job = self._job[:1] + (text, step)
+                return
+            head, word, candidates = result
+            if not candidates:
+                return
+            self._cycle = [head, word, candidates, -1]
+        head, word, candidates, index = self._cycle
+        index = (index + 1 + step) % (len(candidates) + 1) - 1
+        self._cycle[3] = index
+        commandline.setText(head + (candidates[index] if index >= 0
+                                    else word))
+
+    def _candidates(self, text):
+        """Return (head, word, candidates), None if there are none yet."""
+        source, head, word = completion_context(text)
+        if source is None:
+            return None
+        if source == "path":
+            candidates = self._paths(word)
+        elif source == "buffer":
+            widget = self._widget
+            editorstack = widget.windows.editorstack()
+            widget.buffers.update(editorstack.get_filenames())
+            cwd = os.getcwd()
+            candidates = [display_name(path, cwd)
+                          for path in widget.buffers.match(word)]
+        elif source == "search":
+            candidates = [entry for entry in reversed(
+                self._widget.viminfo.get_history(head)) if entry.startswith(
+                    word)]
+        else:
+            key = (source, word)
+            candidates = self._cache.get(key)
+            if candidates is None:
+                words = (self._command_names() if source == "command"
+                         else self._option_names(word))
+                candidates = prefix_matches(words, word)
+                self._cache.put(key, candidates)
+        if candidates is None:
+            return None
+        return head, word, candidates
+
+    def _command_names(self):
+        """Return the names of the colon commands."""
+        if self._commands is None:
+            names = [name.rstrip("_") for name in dir(VimCommands)
+                     if name.islower() and not name.startswith("_")]
+            self._commands = names + list(EX_ALIASES)
+        return self._commands
+
+    def _option_names(self, word):
+        """Return the options, their values if word has a =."""
+        name, sep, __ = word.partition("=")
+        if sep:
+            return ["{}={}".format(name, value)
+                    for value in OPTION_VALUES.get(name, ())]
+        return list(self._widget.options)
+
+    def _paths(self, word):
+        """Return the paths starting with word, None if not listed yet."""
+        directory, prefix = split_path(word)
+        index = self._widget.files.index()
+        path = osp.normpath(osp.join(index.root, osp.expanduser(directory)))
+        relative = osp.relpath(path, index.root)
+        if relative == ".":
+            relative = ""
+        listing = None
+        if not relative.startswith(os.pardir):
+            listing = index.listing(relative)
+        if listing is not None:
+            key = ("path", path, prefix, index.version)
+        else:
+            listing = self._listings.get(path)
+            if listing is None:
+                self._start(self._list, path)
+                return None
+            key = ("path", path, prefix)
+        candidates = self._cache.get(key)
+        if candidates is None:
+            candidates = path_candidates(listing, directory, prefix)
+            if not candidates and not directory and index.done:
+                # File names from anywhere in the project, opened by :e
+                candidates = self._project_names(index, prefix)
+                if candidates is None:
+                    return None
+            self._cache.put(key, candidates)
+        return candidates
+
+    def _project_names(self, index, prefix):
+        """Return the project file names starting with prefix, or None."""
+        key = ("name", prefix, index.version)
+        candidates = self._cache.get(key)
+        if candidates is None and index.files <= COMPLETION_THREAD_FILES:
+            candidates = index.names_with_prefix(prefix)
+            self._cache.put(key, candidates)
+        elif candidates is None:
+            self._start(lambda: self._cache.put(
+                key, index.names_with_prefix(prefix)))
+        return candidates
+
+    def _list(self, path):
+        """List a directory, in a thread."""
+        self._listings[path] = scan_directory(path) or (set(), set())
+
+    def _start(self, function, *args):
+        """Run function in a thread, complete again when it is done."""
+        if self._job is not None:
+            return
+        thread = threading.Thread(target=function, args=args, daemon=True)
+        thread.start()
+        self._job = (thread, None, 1)
+        self._timer.start()
+
+    def _on_timeout(self):
+        """Complete the command line when the thread is done."""
+        thread, text, step = self._job
+        if thread.is_alive():
+            return
+        self._job = None
+        self._timer.stop()
+        if text is not None and self._widget.commandline.text() == text:
+            self.complete(step)
+
+
+# %% Pager
+class VimPager(QWidget):
+    """Read-only pager window of a memory mapped file (:view).
+
+    Only the visible lines are read. Supports j, k, gg, G, {count}G, /, ?,
+    n, N and q, searches use Python regular expressions.
+    """
+
+    def __init__(self, path, parent=None):
+        """Open a pager window of the file at path."""
+        # Open the file first, no window is left if it fails
+        pager = Pager(path)
+        QWidget.__init__(self, parent, Qt.Window)
+        self.setAttribute(Qt.WA_DeleteOnClose)
+        self.setWindowTitle(osp.basename(path))
+        self.pager = pager
+        self._keys = ""
+        # Line of a {count}G waiting for the index
+        self._pending_line = None
+        self._search_reverse = False
+
+        self.view = QPlainTextEdit(self)
+        self.view.setReadOnly(True)
+        self.view.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.view.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.view.setFocusPolicy(Qt.NoFocus)
+        self.status_label = QLabel(self)
+        self.search_edit = QLineEdit(self)
+        self.search_edit.hide()
+        self.search_edit.returnPressed.connect(self.on_search)
+        layout = QVBoxLayout()
+        layout.addWidget(self.view)
+        layout.addWidget(self.search_edit)
+        layout.addWidget(self.status_label)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(layout)
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(PAGER_STATUS_INTERVAL)
+        self._timer.timeout.connect(self.on_index_progress)
+        if not self.pager.index.done:
+            self._timer.start()
+        self.refresh()
+
+    def visible_lines(self):
+        """Return the number of lines the view can show."""
+        return max(1, self.view.viewport().height()
+                   // self.view.fontMetrics().lineSpacing())
+
+    def refresh(self):
+        """Show the lines from the current one and update the status."""
+        self.view.setPlainText("\n".join(
+            self.pager.lines(self.visible_lines())))
+        self.update_status()
+
+    def update_status(self):
+        """Show the current line, the line count and the index progress."""
+        index = self.pager.index
+        line = self.pager.line_number()
+        status = "{}  line {}/{}".format(
+            osp.basename(self.pager.path),
+            "?" if line is None else line + 1,
+            index.lines if index.done else "?")
+        if not index.done:
+            status += "  indexing {}%".format(int(100 * index.progress()))
+        self.status_label.setText(status)
+
+    def on_index_progress(self):
+        """Update the status and run a pending {count}G or {count}gg."""
+        if self._pending_line is not None and self.pager.goto_line(
+                self._pending_line, wait=False):
+            self._pending_line = None
+            self.refresh()
+        if self.pager.index.done:
+            self._timer.stop()
+        self.update_status()
+
+    def keyPressEvent(self, event):
+        """Run the pager commands."""
+        key = event.key()
+        text = event.text()
+        if key == Qt.Key_Escape:
+            self._keys = ""
+            if self.search_edit.isVisible():
+                self.search_edit.hide()
+                self.setFocus()
+            return
+        if key == Qt.Key_Down:
+            text = "j"
+        elif key == Qt.Key_Up:
+            text = "k"
+        elif key == Qt.Key_PageDown:
+            text = str(self.visible_lines()) + "j"
+        elif key == Qt.Key_PageUp:
+            text = str(self.visible_lines()) + "k"
+        if not text.isprintable():
+            # Return and Backspace also come from the search line
+            return
+        keys = self._keys + text
+        self._keys = ""
+        match = re.match(r"^([1-9]\d*)?(.*)$", keys)
+        count, command = match.groups()
+        if not command or command == "g":
+            # Wait for the rest of the command
+            self._keys = keys
+            return
+        pager = self.pager
+        self._pending_line = None
+        if command == "j":
+            pager.down(int(count or 1))
+        elif command == "k":
+            pager.up(int(count or 1))
+        elif command in ("gg", "G") and count:
+            # Jump once the line is indexed instead of blocking
+            if not pager.goto_line(int(count) - 1, wait=False):
+                self._pending_line = int(count) - 1
+        elif command == "gg":
+            pager.first()
+        elif command == "G":
+            pager.last()
+        elif command in ("/", "?"):
+            self._search_reverse = command == "?"
+            self.search_edit.clear()
+            self.search_edit.show()
+            self.search_edit.setFocus()
+            return
+        elif command in ("n", "N"):
+            if pager.pattern is None:
+                print("no previous search")
+            elif not pager.next(reverse=command == "N"):
+                print("pattern not found")
+        elif command == "q":
+            self.close()
+            return
+        self.refresh()
+
+    def on_search(self):
+        """Search the pattern typed after / or ?."""
+        pattern = self.search_edit.text()
+        self.search_edit.hide()
+        self.setFocus()
+        if not pattern:
+            if self.pager.pattern is not None:
+                self.pager.next(reverse=self._search_reverse
+                                != self.pager.reverse)
+        else:
+            try:
+                if not self.pager.search(pattern,
+                                         reverse=self._search_reverse):
+                    print("pattern not found", pattern)
+            except re.error as error:
+                print("invalid pattern:", error)
+        self.refresh()
+
+    def resizeEvent(self, event):
+        """Show the lines which fit in the view."""
+        QWidget.resizeEvent(self, event)
+        self.refresh()
+
+    def closeEvent(self, event):
+        """Stop the index and unmap the file."""
+        self._timer.stop()
+        self.pager.close()
+        QWidget.closeEvent(self, event)
+
+
 class VimWidget(QWidget):
     """Vim widget."""
 
@@ -1522,6 +3751,7 @@ class VimWidget(QWidget):
         self.editor_widget = editor_widget
         self.main = main
         QLineEdit.__init__(self, editor_widget)
+        self.windows = VimWindows(self)
 
         # Build widget
         self.commandline = VimLineEdit(self)
@@ -1533,17 +3763,33 @@ class VimWidget(QWidget):
         self.status_label = QLabel("INSERT")
         self.status_label.setFixedWidth(60)
         self.status_label.setAlignment(Qt.AlignCenter)
+        self._mode_label = None
+        self.options = dict(DEFAULT_OPTIONS)
         self.on_mode_changed("insert")
         hlayout.addWidget(self.status_label)
         hlayout.addWidget(self.commandline)
         hlayout.setContentsMargins(5, 0, 0, 5)
         self.setLayout(hlayout)
         self.selection_type = (int(time()), "char")
-        QApplication.clipboard().dataChanged.connect(self.on_copy)
+        self.clipboard = VimClipboard(self)
+
+        # State of previous sessions, read on first use
+        self._viminfo_timer = QTimer(self)
+        self._viminfo_timer.setSingleShot(True)
+        self._viminfo_timer.setInterval(VIMINFO_FLUSH_DELAY)
+        self.viminfo = VimInfo(get_conf_path("spyder_vim"),
+                               self._viminfo_timer.start)
+        self._viminfo_timer.timeout.connect(self.viminfo.flush)
+        self._state_loaded = False
 
         # Initialize available commands
+        self.perf = PerfStats()
         self.vim_keys = VimKeys(self)
         self.vim_commands = VimCommands(self)
+        self.shell = VimShell(self)
+        self.files = VimFiles(self)
+        self.buffers = BufferList()
+        self.completion = VimCompletion(self)
         self.vim_keys.mode_changed.connect(self.on_mode_changed)
 
     def on_mode_changed(self, mode):
@@ -1575,11 +3821,81 @@ class VimWidget(QWidget):
             elif mode == "insert":
                 self.status_label.setText("INSERT")
                 self.setStyleSheet("QLabel { background-color: #3366ff }")
+        if self.large_file():
+            self.status_label.setText(self.status_label.text() + " L")
+            self.status_label.setToolTip(_("Large file mode"))
+        else:
+            self.status_label.setToolTip("")
+
+    def large_file(self):
+        """Return True if the current document is over the thresholds.
+
+        In large file mode, commands only read the text around the cursor,
+        search highlights the visible lines and undo uses the editor.
+        """
+        editor = self.editor()
+        if editor is None:
+            return False
+        document = editor.document()
+        size = self.options["largefilesize"]
+        lines = self.options["largefilelines"]
+        return bool(size and document.characterCount() > size
+                    or lines and document.blockCount() > lines)
+
+    def load_state(self):
+        """Restore the state of previous sessions."""
+        if self._state_loaded:
+            return
+        self._state_loaded = True
+        self.viminfo.load()
+        registers = self.vim_keys.registers
+        registers.restore(self.viminfo.registers, self.viminfo.deleted)
+        registers.listener = self.viminfo
+
+    def show_progress(self, label=None, fraction=0):
+        """Show the progress of a long operation in the status label.
+
+        Without label, restore the label of the current mode. Without
+        fraction, only show the label.
+        """
+        if label is None:
+            if self._mode_label is not None:
+                self.status_label.setText(self._mode_label)
+                self._mode_label = None
+            return
+        if self._mode_label is None:
+            self._mode_label = self.status_label.text()
+        if fraction is None:
+            self.status_label.setText(label)
+        else:
+            self.status_label.setText("{} {}%".format(label,
+                                                      int(100 * fraction)))
+
+    def show_message(self, message):
+        """Show a message in the empty command line until the next key."""
+        print(message)
+        self.commandline.setPlaceholderText(message)
 
     def on_text_changed(self, text):
         """Parse input command."""
+        if text:
+            self.commandline.setPlaceholderText("")
+        if text == ":" and self.vim_keys.visual_mode:
+            self.commandline.setText(":'<,'>")
+            return
         if not text or text[0] in VIM_COMMAND_PREFIX:
             return
+        self.load_state()
+
+        match = RE_VIM_FILTER.match(text)
+        if match:
+            self.on_filter(*match.groups())
+            return
+
+        match = RE_VIM_OPERATOR.match(text)
+        if match and not self.vim_keys.visual_mode:
+            if self.on_operator(*match.groups()):
+                return
 
         if text.startswith("0"):
             # Special case to simplify regexp
@@ -1609,21 +3925,95 @@ class VimWidget(QWidget):
         self.vim_keys(key, repeat)
         self.commandline.setText(leftover)
 
+    def on_operator(self, count, operator, motion_count, keys):
+        """Run an operator followed by a motion or a text object.
+
+        Return False to let the pairs with their own command (dd, dw,
+        yy...) go through the usual key handling.
+        """
+        if not keys:
+            return True
+        pair = operator + keys
+        for symbol, name in SYMBOLS_REPLACEMENT.items():
+            pair = pair.replace(symbol, name)
+        if not motion_count and hasattr(self.vim_keys, pair):
+            return False
+        try:
+            motion = parse_motion(keys, operator)
+        except ValueError:
+            print("unknown motion", keys)
+            self.commandline.setText("")
+            return True
+        if motion is None:
+            # Wait for the rest of the motion
+            return True
+        if count or motion_count:
+            count = int(count or 1) * int(motion_count or 1)
+        name, arg = motion
+        self.perf.run(operator + name, self.editor(),
+                      self.vim_keys.operate, operator, name, count, arg)
+        self.commandline.setText("")
+        return True
+
+    def on_filter(self, count, motion_count, keys):
+        """Open the command line with the lines of a motion (!{motion}).
+
+        Like vim, !j gives :.,.+1! and the filter is typed after it.
+        """
+        if self.vim_keys.visual_mode:
+            self.commandline.setText(":'<,'>!")
+            return
+        if not keys:
+            return
+        try:
+            motion = parse_motion(keys, "!")
+        except ValueError:
+            print("unknown motion", keys)
+            self.commandline.setText("")
+            return
+        if motion is None:
+            return
+        if count or motion_count:
+            count = int(count or 1) * int(motion_count or 1)
+        name, arg = motion
+        adapter = self.adapter()
+        position = adapter.cursor()
+        offset, __, result = text_window(
+            adapter, position, lambda text, position: operator_range(
+                text, position, "!", name, count, arg))
+        if result is None:
+            self.commandline.setText("")
+            return
+        line = adapter.block_number(position)
+        first, last = [adapter.block_number(offset + end) - line
+                       for end in result[:2]]
+
+        def address(delta):
+            return "." if not delta else ".{:+d}".format(delta)
+
+        addresses = address(first)
+        if last != first:
+            addresses += "," + address(last)
+        self.commandline.setText(":" + addresses + "!")
+
     def on_return(self):
         """Execute command."""
         text = self.commandline.text()
         if not text:
             return
+        self.load_state()
         cmd_type = text[0]
         cmd = text[1::].rstrip()
+        if cmd and cmd_type in self.viminfo.history:
+            self.viminfo.add_history(cmd_type, cmd)
         if cmd_type == ":":  # Vim command
             self.vim_commands(cmd)
-        elif cmd_type == "!":  # Shell command
-            pass
-        elif cmd_type == "/":  # Forward search
-            self.vim_keys.search_dict = self.vim_keys.search(cmd)
-        elif cmd_type == "?":  # Reverse search
-            self.vim_keys.search_dict = self.vim_keys.search(cmd, reverse=True)
+        elif cmd_type in "/?":  # Forward and reverse search
+            reverse = cmd_type == "?"
+            self.vim_keys.record_jump()
+            self.vim_keys.search_dict = self.vim_keys.search(cmd,
+                                                             reverse=reverse)
+            self.viminfo.set_last_search(cmd, reverse)
         self.commandline.clear()
 
     def on_copy(self):
@@ -1634,9 +4024,15 @@ class VimWidget(QWidget):
 
     def editor(self):
         """Retrieve text of current opened file."""
-        editorstack = self.editor_widget.get_current_editorstack()
+        editorstack = self.windows.editorstack()
+        if editorstack is None:
+            return None
         return editorstack.get_current_editor()
 
+    def adapter(self):
+        """Return the editor adapter of the current editor."""
+        return CodeEditorAdapter(self.editor())
+
     def update_vim_cursor(self):
         """Update Vim cursor position."""
         selection = QTextEdit.ExtraSelection()
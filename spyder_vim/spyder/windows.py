@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim navigation between the editor splits (Ctrl-W).
+
+Splits are given as (x, y, width, height) rectangles in the coordinates of
+the editor, so that moving between them does not depend on how Spyder
+nests its splitters.
+"""
+EDGE_TOLERANCE = 8  # Pixels between the facing edges of adjacent splits
+
+
+def window_order(rects):
+    """Return the indexes of rects from top left to bottom right."""
+    return sorted(range(len(rects)), key=lambda index: (
+        rects[index][1], rects[index][0]))
+
+
+def neighbor(rects, current, direction, point=None):
+    """Return the index of the split next to rects[current], or None.
+
+    direction is h (left), j (down), k (up) or l (right). The nearest split
+    on that side wins, then the one closest to point, the cursor position,
+    by default the center of the current split.
+    """
+    x, y, width, height = rects[current]
+    if point is None:
+        point = (x + width / 2, y + height / 2)
+    best = None
+    for index, (other_x, other_y, other_width, other_height) in enumerate(
+            rects):
+        if index == current:
+            continue
+        if direction == "h":
+            gap = x - (other_x + other_width)
+        elif direction == "l":
+            gap = other_x - (x + width)
+        elif direction == "k":
+            gap = y - (other_y + other_height)
+        else:
+            gap = other_y - (y + height)
+        if gap < -EDGE_TOLERANCE:
+            continue
+        if direction in "hl":
+            start, end, position = other_y, other_y + other_height, point[1]
+        else:
+            start, end, position = other_x, other_x + other_width, point[0]
+        offset = max(start - position, position - end, 0)
+        key = (max(gap, 0), offset, other_y, other_x)
+        if best is None or key < best[0]:
+            best = (key, index)
+    return None if best is None else best[1]
+
+
+def split_sizes(total, weights):
+    """Return sizes summing to total, proportional to weights."""
+    sizes = [total * weight // sum(weights) for weight in weights]
+    sizes[-1] += total - sum(sizes)
+    return sizes
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim buffer list tests.
+"""
+# Third party imports
+import pytest
+
+# Local imports
+from spyder_vim.spyder.buffers import BufferList, fuzzy_score
+
+PATHS = ["/src/pkg/widgets.py", "/src/pkg/__init__.py", "/src/tests/__init__.py",
+         "/src/tests/test_widgets.py", "/src/README.md"]
+
+
+@pytest.mark.parametrize("query, text, score", [
+    ("", "abc", 0),
+    ("abc", "abc", 3 + 2 + 2),
+    ("ac", "abc", 3 - 1),
+    ("tw", "test_widgets.py", 3 + 3 - 3),
+    ("ca", "abc", None),
+    ("x", "abc", None),
+])
+def test_fuzzy_score(query, text, score):
+    """Test starts of words and consecutive matches score more."""
+    assert fuzzy_score(query, text) == score
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("widgets", ["/src/pkg/widgets.py", "/src/tests/test_widgets.py"]),
+    ("TW", ["/src/tests/test_widgets.py"]),
+    ("init", ["/src/pkg/__init__.py", "/src/tests/__init__.py"]),
+    ("tests/init", ["/src/tests/__init__.py"]),
+    ("pkg/", ["/src/pkg/widgets.py", "/src/pkg/__init__.py"]),
+    ("rdm", ["/src/README.md"]),
+    ("zz", []),
+])
+def test_match(query, expected):
+    """Test file names match before paths, best scores first."""
+    buffers = BufferList()
+    buffers.update(PATHS)
+    assert buffers.match(query) == expected
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("widgets.py", "/src/pkg/widgets.py"),
+    ("test_w", "/src/tests/test_widgets.py"),
+    ("tests/init", "/src/tests/__init__.py"),
+    ("readme", "/src/README.md"),
+])
+def test_find(query, expected):
+    """Test the best match is found."""
+    buffers = BufferList()
+    buffers.update(PATHS)
+    assert buffers.find(query) == expected
+
+
+@pytest.mark.parametrize("query, message", [
+    ("__init__.py", "more than one match for __init__.py"),
+    ("init", "more than one match for init"),
+    ("zz", "no matching buffer for zz"),
+])
+def test_find_errors(query, message):
+    """Test names matching no file or several files equally."""
+    buffers = BufferList()
+    buffers.update(PATHS)
+    with pytest.raises(ValueError, match=message):
+        buffers.find(query)
+
+
+def test_numbers():
+    """Test files keep their number when closed and opened again."""
+    buffers = BufferList()
+    buffers.update(["a", "b", "c"])
+    assert buffers.paths == {1: "a", 2: "b", 3: "c"}
+    buffers.update(["a", "c", "d"])
+    assert buffers.paths == {1: "a", 3: "c", 4: "d"}
+    assert buffers.match("b") == []
+    buffers.update(["d", "b"])
+    assert buffers.paths == {2: "b", 4: "d"}
+    assert buffers.sorted_numbers() == [2, 4]
+    assert buffers.match("b") == ["b"]
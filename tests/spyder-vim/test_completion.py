@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim command line completion tests.
+"""
+# Standard library imports
+import os
+
+# Third party imports
+import pytest
+
+# Local imports
+from spyder_vim.spyder.completion import (CompletionCache, completion_context,
+                                          path_candidates, prefix_matches,
+                                          split_path)
+
+
+@pytest.mark.parametrize("text, expected", [
+    (":", ("command", ":", "")),
+    (":ed", ("command", ":", "ed")),
+    (":%s", ("command", ":%", "s")),
+    (":e ", ("path", ":e ", "")),
+    (":e! pkg/m", ("path", ":e! ", "pkg/m")),
+    (":tabe s", ("path", ":tabe ", "s")),
+    (":r !ls", (None, ":r !ls", "")),
+    (":b fo", ("buffer", ":b ", "fo")),
+    (":set nu", ("option", ":set ", "nu")),
+    (":set nu clip", ("option", ":set nu ", "clip")),
+    (":sort ", (None, ":sort ", "")),
+    ("/sp", ("search", "/", "sp")),
+    ("?", ("search", "?", "")),
+    ("3j", (None, "3j", "")),
+])
+def test_completion_context(text, expected):
+    """Test the word to complete and its source are found."""
+    assert completion_context(text) == expected
+
+
+def test_prefix_matches():
+    """Test matching words are sorted."""
+    assert prefix_matches(["set", "sort", "split", "edit"], "s") == [
+        "set", "sort", "split"]
+    assert prefix_matches(["set"], "x") == []
+
+
+@pytest.mark.parametrize("word, expected", [
+    ("", ("", "")),
+    ("mod", ("", "mod")),
+    ("pkg/", ("pkg/", "")),
+    ("pkg/sub/m", ("pkg/sub/", "m")),
+    ("~/d", ("~/", "d")),
+])
+def test_split_path(word, expected):
+    """Test paths are split after the last separator."""
+    assert split_path(word) == expected
+
+
+def test_path_candidates():
+    """Test directories come first, with a separator."""
+    listing = ({"setup.py", "spam.py", "README"}, {"src", "docs"})
+    assert path_candidates(listing, "pkg/", "s") == [
+        "pkg/src" + os.sep, "pkg/setup.py", "pkg/spam.py"]
+    assert path_candidates(listing, "", "x") == []
+
+
+def test_cache():
+    """Test the least recently used candidates are dropped."""
+    cache = CompletionCache(2)
+    cache.put("a", ["a1"])
+    cache.put("b", ["b1"])
+    assert cache.get("a") == ["a1"]
+    cache.put("c", ["c1"])
+    assert cache.get("b") is None
+    assert cache.get("a") == ["a1"]
+    assert cache.get("c") == ["c1"]
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim headless engine and memory adapter tests.
+"""
+# Third party imports
+import pytest
+
+# Local imports
+from spyder_vim.spyder.adapter import MemoryAdapter
+from spyder_vim.spyder.engine import ESCAPE, CTRL_R, VimEngine
+
+
+@pytest.fixture
+def engine():
+    """Engine on a small document, cursor at the start."""
+    adapter = MemoryAdapter("   123\nline 1\nline 2\nline 3\nline 4",
+                            filename="foo.txt")
+    return VimEngine(adapter)
+
+
+def test_memory_adapter_blocks():
+    """Test text access by block and offset."""
+    adapter = MemoryAdapter("ab\ncd\n")
+    assert adapter.block_count() == 3
+    assert adapter.block_text(1) == "cd"
+    assert adapter.block_text(2) == ""
+    assert adapter.block_position(1) == 3
+    assert adapter.block_number(4) == 1
+    assert adapter.get_text(1, 4) == "b\nc"
+
+
+def test_memory_adapter_edit():
+    """Test edits move the cursor and notify listeners."""
+    adapter = MemoryAdapter("hello world")
+    changes = []
+    adapter.on_change(lambda *change: changes.append(change))
+    adapter.set_cursor(8)
+    adapter.edit([(0, 5, "bye"), (3, 0, "!")])
+    assert adapter.text() == "bye! world"
+    assert adapter.cursor() == 7
+    assert changes == [(0, 5, 3, 9), (3, 0, 1, 10)]
+    assert adapter.block_count() == 1
+    adapter.set_overlay("vim_visual", [(0, 3)])
+    assert adapter.overlay("vim_visual") == [(0, 3)]
+    adapter.clear_overlay("vim_visual")
+    assert adapter.overlay("vim_visual") == []
+
+
+def test_engine_motions(engine):
+    """Test cursor motions with counts."""
+    engine.feed("2j")
+    assert engine.adapter.cursor() == 14
+    engine.feed("$")
+    assert engine.adapter.cursor() == 19
+    engine.feed("k")
+    assert engine.adapter.cursor() == 12
+    engine.feed("gg")
+    assert engine.adapter.cursor() == 3
+    engine.feed("G")
+    assert engine.adapter.cursor() == 28
+    engine.feed("fi")
+    assert engine.adapter.cursor() == 29
+
+
+def test_engine_operators(engine):
+    """Test operators, registers and paste."""
+    engine.feed("jdd")
+    assert engine.adapter.text() == "   123\nline 2\nline 3\nline 4"
+    engine.feed("p")
+    assert engine.adapter.text() == "   123\nline 2\nline 1\nline 3\nline 4"
+    engine.feed('"ayiw')
+    assert engine.registers.get("a").text == "line"
+    engine.feed("wcwX" + ESCAPE)
+    assert engine.adapter.text() == "   123\nline 2\nline X\nline 3\nline 4"
+    engine.feed("0d2w")
+    assert engine.adapter.text() == "   123\nline 2\n\nline 3\nline 4"
+
+
+def test_engine_undo(engine):
+    """Test that commands and insertions are single undo steps."""
+    engine.feed("x")
+    engine.feed("A!!" + ESCAPE)
+    assert engine.adapter.text().startswith("  123!!\n")
+    engine.feed("u")
+    assert engine.adapter.text().startswith("  123\n")
+    engine.feed("u")
+    assert engine.adapter.text().startswith("   123\n")
+    engine.feed(CTRL_R + CTRL_R)
+    assert engine.adapter.text().startswith("  123!!\n")
+
+
+def test_engine_pending_and_invalid_keys(engine):
+    """Test incomplete commands wait and invalid ones are dropped."""
+    engine.feed("d")
+    assert engine.pending == "d"
+    engine.feed("q")
+    assert engine.pending == ""
+    engine.feed("2f")
+    assert engine.pending == "2f"
+    engine.feed(ESCAPE)
+    assert engine.pending == ""
+    assert engine.adapter.text().startswith("   123\n")
@@ -0,0 +1,524 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim Ex command tests.
+"""
+# Standard library imports
+import re
+
+# Third party imports
+import pytest
+
+# Local imports
+from spyder_vim.spyder.adapter import MemoryAdapter
+from spyder_vim.spyder.ex import (LineMarks, MarkedAdapter,
+                                  compile_replacement, copy_lines,
+                                  delete_lines, expand_name, filter_lines,
+                                  insert_lines, join_lines, mark_lines,
+                                  move_lines, parse_command,
+                                  parse_count, parse_global, parse_sort,
+                                  parse_substitute, resolve_range,
+                                  resolve_target, shift_lines, sort_lines,
+                                  substitute_lines, yank_lines)
+
+TEXT = "zero\n  one\ntwo\n\tthree\nfour\n"
+
+
+def make_adapter(text=TEXT, line=0):
+    adapter = MemoryAdapter(text)
+    adapter.set_cursor(adapter.block_position(line))
+    return adapter
+
+
+def apply(adapter, result):
+    edits, register, cursor = result
+    adapter.edit(edits)
+    return adapter.text(), register, cursor
+
+
+@pytest.mark.parametrize("text, name, bang, args", [
+    ("d", "d", False, ""),
+    ("10,200d x 3", "d", False, "x 3"),
+    ("%>>", ">", False, ">"),
+    ("'<,'>>", ">", False, ""),
+    (".,$s/a/b/g", "s", False, "/a/b/g"),
+    ("j!", "j", True, ""),
+    ("set clipboard=none", "set", False, "clipboard=none"),
+    ("norm Ax", "norm", False, "Ax"),
+    ("12", "", False, ""),
+])
+def test_parse_command(text, name, bang, args):
+    """Test commands are split into range, name, bang and arguments."""
+    command = parse_command(text)
+    assert (command.name, command.bang, command.args) == (name, bang, args)
+
+
+@pytest.mark.parametrize("name, full_name", [
+    ("d", "delete"), ("del", "delete"), ("t", "copy"), ("co", "copy"),
+    ("norm", "normal"), ("no", "no"), ("set", "set"), ("m", "move"),
+    ("e", "edit"), ("sp", "split"), ("s", "substitute"), ("tabe", "tabedit"),
+    ("tab", "tab"),
+])
+def test_expand_name(name, full_name):
+    """Test abbreviations of the commands."""
+    assert expand_name(name) == full_name
+
+
+@pytest.mark.parametrize("text, line, expected", [
+    ("", 2, (2, 2)),
+    ("%", 2, (0, 5)),
+    ("2,4", 0, (1, 3)),
+    ("4,2", 0, (1, 3)),
+    (".,$", 3, (3, 5)),
+    (".,+2", 1, (1, 3)),
+    ("-,+", 2, (1, 3)),
+    (",3", 0, (0, 2)),
+    ("2;+1", 4, (1, 2)),
+    ("2,+1", 4, (1, 5)),
+    ("/three/", 0, (3, 3)),
+    ("/o/,/four/-1", 2, (3, 4)),
+    ("?one?", 4, (1, 1)),
+    ("$-1", 0, (4, 4)),
+    ("'a,'b", 0, (1, 4)),
+    ("0", 3, (0, 0)),
+])
+def test_resolve_range(text, line, expected):
+    """Test addresses and offsets resolve to lines."""
+    adapter = make_adapter(line=line)
+    marks = {"a": 1, "b": 4}
+    command = parse_command(text + "d")
+    assert resolve_range(command, adapter, marks.get) == expected
+
+
+@pytest.mark.parametrize("text", ["7d", "'cd", "/missing/d", "1,+9d"])
+def test_resolve_range_errors(text):
+    """Test invalid ranges raise ValueError."""
+    with pytest.raises(ValueError):
+        resolve_range(parse_command(text), make_adapter(), {}.get)
+
+
+def test_resolve_whole():
+    """Test commands working on the whole document by default."""
+    command = parse_command("sort")
+    assert resolve_range(command, make_adapter(line=2), whole=True) == (0, 5)
+
+
+def test_resolve_target():
+    """Test the destination of :m and :t."""
+    adapter = make_adapter(line=2)
+    assert resolve_target("0", adapter) == -1
+    assert resolve_target("$", adapter) == 5
+    assert resolve_target("+1", adapter) == 3
+    with pytest.raises(ValueError):
+        resolve_target("9", adapter)
+    with pytest.raises(ValueError):
+        resolve_target("", adapter)
+
+
+def test_parse_count():
+    """Test the register and count arguments."""
+    assert parse_count("") == (None, None)
+    assert parse_count(" 3") == (None, 3)
+    assert parse_count("a") == ("a", None)
+    assert parse_count("a 3") == ("a", 3)
+    with pytest.raises(ValueError):
+        parse_count("3 a")
+
+
+def test_delete_lines():
+    """Test :d in the middle and at the end of the document."""
+    adapter = make_adapter()
+    text, register, cursor = apply(adapter, delete_lines(adapter, 1, 2))
+    assert text == "zero\n\tthree\nfour\n"
+    assert register == ("  one\ntwo\n", "line")
+    assert cursor == 6
+    adapter = make_adapter("a\n  b\nc")
+    text, register, cursor = apply(adapter, delete_lines(adapter, 2, 2))
+    assert text == "a\n  b"
+    assert cursor == 4
+    adapter = make_adapter("a\nb")
+    assert apply(adapter, delete_lines(adapter, 0, 1))[0] == ""
+
+
+def test_yank_lines():
+    """Test :y stores the lines without edit."""
+    adapter = make_adapter()
+    assert yank_lines(adapter, 0, 1) == ([], ("zero\n  one\n", "line"), None)
+
+
+def test_shift_lines():
+    """Test :> and :< change the range with one replacement."""
+    adapter = make_adapter()
+    result = shift_lines(adapter, 0, 2, 2)
+    assert len(result[0]) == 1
+    text, __, cursor = apply(adapter, result)
+    assert text == "        zero\n          one\n        two\n\tthree\nfour\n"
+    assert cursor == text.index("two")
+    text = apply(adapter, shift_lines(adapter, 0, 5, -1))[0]
+    assert text == "    zero\n      one\n    two\nthree\nfour\n"
+
+
+@pytest.mark.parametrize("first, last, spaces, expected", [
+    (0, 0, True, "zero one\ntwo\n"),
+    (0, 2, True, "zero one two\n"),
+    (0, 1, False, "zero  one\ntwo\n"),
+    (2, 3, True, "zero\n  one\ntwo"),
+])
+def test_join_lines(first, last, spaces, expected):
+    """Test :j and :j! on lines with and without blanks."""
+    adapter = make_adapter("zero\n  one\ntwo\n")
+    assert apply(adapter, join_lines(adapter, first, last, spaces))[0] == \
+        expected
+
+
+@pytest.mark.parametrize("first, last, target, expected, line", [
+    (0, 0, 2, "  one\ntwo\nzero\n\tthree\nfour\n", 2),
+    (3, 4, 0, "zero\n\tthree\nfour\n  one\ntwo\n", 2),
+    (3, 4, -1, "\tthree\nfour\nzero\n  one\ntwo\n", 1),
+    (0, 1, 5, "two\n\tthree\nfour\n\nzero\n  one", 5),
+    (1, 2, 2, TEXT, 2),
+])
+def test_move_lines(first, last, target, expected, line):
+    """Test :m above and below the range, with one replacement."""
+    adapter = make_adapter()
+    result = move_lines(adapter, first, last, target)
+    assert len(result[0]) <= 1
+    text, __, cursor = apply(adapter, result)
+    assert text == expected
+    assert adapter.block_number(cursor) == line
+
+
+def test_move_lines_into_itself():
+    """Test moving a range inside itself fails."""
+    with pytest.raises(ValueError):
+        move_lines(make_adapter(), 0, 3, 1)
+
+
+@pytest.mark.parametrize("target, expected, line", [
+    (-1, "  one\ntwo\nzero\n  one\ntwo\n\tthree\nfour\n", 1),
+    (0, "zero\n  one\ntwo\n  one\ntwo\n\tthree\nfour\n", 2),
+    (5, TEXT + "\n  one\ntwo", 7),
+])
+def test_copy_lines(target, expected, line):
+    """Test :t above, inside and after the document."""
+    adapter = make_adapter()
+    text, __, cursor = apply(adapter, copy_lines(adapter, 1, 2, target))
+    assert text == expected
+    assert adapter.block_number(cursor) == line
+
+
+@pytest.mark.parametrize("args, expected", [
+    ("", (None, None, "", None)),
+    ("/a/b/", ("a", "b", "", None)),
+    ("/a/b/gi 3", ("a", "b", "gi", 3)),
+    ("#a/b#c\\#d#g", ("a/b", "c#d", "g", None)),
+    ("/a\\/b/c\\/d", ("a/b", "c/d", "", None)),
+    ("/a", ("a", "", "", None)),
+    ("/a/", ("a", "", "", None)),
+    ("/a/b", ("a", "b", "", None)),
+    (r"/\d\+/\\&/", (r"\d\+", r"\\&", "", None)),
+])
+def test_parse_substitute(args, expected):
+    """Test delimiters, escapes, flags and count of :s."""
+    assert parse_substitute(args) == expected
+
+
+@pytest.mark.parametrize("args", ["xaxbx", "/a/b/z", "/a/b/g x"])
+def test_parse_substitute_errors(args):
+    """Test invalid delimiters and flags."""
+    with pytest.raises(ValueError):
+        parse_substitute(args)
+
+
+@pytest.mark.parametrize("replacement, expected", [
+    ("x", "x"),
+    ("<&>", "<foo_bar>"),
+    (r"\2-\1", "bar-foo"),
+    (r"\&\\", "&\\"),
+    (r"\u\1", "Foo"),
+    (r"\U&\E!", "FOO_BAR!"),
+    (r"\U\1\e\2", "FOObar"),
+    (r"\L\uABC", "Abc"),
+    (r"a\rb\tc", "a\nb\tc"),
+    ("~~", "[&][&]"),
+])
+def test_compile_replacement(replacement, expected):
+    """Test the vim replacement syntax."""
+    match = re.search("(foo)_(bar)", "x foo_bar")
+    expand = compile_replacement(replacement, previous="[\\&]")
+    if not callable(expand):
+        assert expand == expected
+    else:
+        assert expand(match) == expected
+
+
+def test_substitute_lines():
+    """Test first match per line, every match and counts."""
+    text = "a-a\nb\na-a-a\n"
+    regex = re.compile("a", re.MULTILINE)
+    adapter = make_adapter(text)
+    result, count, lines = substitute_lines(adapter, 0, 3, regex, "x")
+    assert (count, lines) == (2, 2)
+    edits, __, cursor = result
+    # One replacement from the first to the last match
+    assert edits == [(0, 7, "x-a\nb\nx")]
+    new_text = apply(adapter, result)[0]
+    assert new_text == "x-a\nb\nx-a-a\n"
+    assert cursor == 6
+    adapter = make_adapter(text)
+    result, count, lines = substitute_lines(adapter, 0, 3, regex,
+                                            "xy", every=True)
+    assert (count, lines) == (5, 2)
+    assert apply(adapter, result)[0] == "xy-xy\nb\nxy-xy-xy\n"
+    adapter = make_adapter(text)
+    result, count, lines = substitute_lines(adapter, 1, 3, regex, "x",
+                                            every=True, count_only=True)
+    assert result == ([], None, None)
+    assert (count, lines) == (3, 1)
+
+
+def test_substitute_newlines():
+    """Test replacements adding and removing lines."""
+    adapter = make_adapter("a,b\nc,d\n")
+    regex = re.compile(",", re.MULTILINE)
+    result = substitute_lines(adapter, 0, 1, regex, "\n", every=True)[0]
+    assert apply(adapter, result)[0] == "a\nb\nc\nd\n"
+    assert adapter.block_number(result[2]) == 3
+    adapter = make_adapter("a\nb\nc\n")
+    regex = re.compile("\n(?=.)", re.MULTILINE)
+    result, count, lines = substitute_lines(adapter, 0, 3, regex, " ",
+                                            every=True)
+    assert apply(adapter, result)[0] == "a b c\n"
+    assert count == 2
+
+
+def test_substitute_in_lines():
+    """Test patterns without newline do not match across lines."""
+    adapter = make_adapter("a b\nc d\ne\n")
+    regex = re.compile(r"\s+", re.MULTILINE)
+    result, count, lines = substitute_lines(adapter, 0, 3, regex, "_",
+                                            every=True)
+    assert apply(adapter, result)[0] == "a_b\nc_d\ne\n"
+    assert (count, lines) == (2, 2)
+    adapter = make_adapter("x\ny\n")
+    regex = re.compile(r"[^x]$", re.MULTILINE)
+    result = substitute_lines(adapter, 0, 2, regex, "z")[0]
+    assert apply(adapter, result)[0] == "x\nz\n"
+
+
+@pytest.mark.parametrize("pattern, every, expected", [
+    ("a*", True, "-b-c-"),
+    ("a*", False, "-bc"),
+    ("x*", True, "-a-a-a-b-c-"),
+    ("b*", True, "-a-a-a-c-"),
+])
+def test_substitute_empty_matches(pattern, every, expected):
+    """Test an empty match right after a match is skipped, as in vim."""
+    adapter = make_adapter("aaabc\n")
+    regex = re.compile(pattern, re.MULTILINE)
+    result = substitute_lines(adapter, 0, 0, regex, "-", every=every)[0]
+    assert apply(adapter, result)[0] == expected + "\n"
+
+
+@pytest.mark.parametrize("args, expected", [
+    ("/a/d", ("a", "d")),
+    ("#a/b#  s/x/y/", ("a/b", "s/x/y/")),
+    ("/a", ("a", "")),
+    ("//norm Ax", ("", "norm Ax")),
+])
+def test_parse_global(args, expected):
+    """Test the pattern and command of :g."""
+    assert parse_global(args) == expected
+
+
+@pytest.mark.parametrize("args", ["", "xaxd"])
+def test_parse_global_errors(args):
+    """Test a missing pattern and invalid delimiters."""
+    with pytest.raises(ValueError):
+        parse_global(args)
+
+
+@pytest.mark.parametrize("pattern, first, last, invert, expected", [
+    ("o", 0, 5, False, [0, 1, 2, 4]),
+    ("o", 0, 5, True, [3, 5]),
+    ("^$", 0, 5, False, [5]),
+    ("e$", 1, 3, False, [1, 3]),
+    ("o\n", 0, 5, False, [0, 2]),
+    ("x", 0, 5, False, []),
+])
+def test_mark_lines(pattern, first, last, invert, expected):
+    """Test the lines matching, or not, in one pass."""
+    regex = re.compile(pattern, re.MULTILINE)
+    lines = mark_lines(make_adapter(), first, last, regex, invert)
+    assert list(lines) == expected
+
+
+@pytest.mark.parametrize("pattern, invert, expected", [
+    (r"^\s*#", False, [2]),
+    (r"^\s*#", True, [0, 1, 3, 4]),
+    (r"[^=]*$", False, [0, 1, 2, 3, 4]),
+])
+def test_mark_lines_in_lines(pattern, invert, expected):
+    """Test patterns without newline do not match across lines."""
+    adapter = make_adapter("x = 1\n\n    # comment\ny = 2\n")
+    regex = re.compile(pattern, re.MULTILINE)
+    assert list(mark_lines(adapter, 0, 4, regex, invert)) == expected
+
+
+def run_marked(adapter, lines, command):
+    """Run command(adapter, line) on the marks of lines, like :g."""
+    marks = LineMarks(mark_lines(adapter, 0, adapter.block_count() - 1,
+                                 re.compile(lines, re.MULTILINE)))
+    marked = MarkedAdapter(adapter, marks)
+    visited = []
+    line = marks.next()
+    while line is not None:
+        visited.append(line)
+        marked.edit(command(marked, line)[0])
+        line = marks.next()
+    return visited
+
+
+@pytest.mark.parametrize("command, visited, expected", [
+    # :g/x/d
+    (lambda adapter, line: delete_lines(adapter, line, line),
+     [0, 0, 0], "a\nb\n"),
+    # :g/x/.,+1d, the marks of the deleted lines are skipped
+    (lambda adapter, line: delete_lines(adapter, line, line + 1),
+     [0, 0], "b\n"),
+    # :g/x/j
+    (lambda adapter, line: join_lines(adapter, line, line),
+     [0, 1], "x1 x2\nx3 a\nb\n"),
+    # :g/x/t0
+    (lambda adapter, line: copy_lines(adapter, line, line, -1),
+     [0, 2, 4], "x3\nx2\nx1\nx1\nx2\nx3\na\nb\n"),
+    # :g/x/t$
+    (lambda adapter, line: copy_lines(adapter, line, line,
+                                       adapter.block_count() - 1),
+     [0, 1, 2], "x1\nx2\nx3\na\nb\n\nx1\nx2\nx3"),
+    # :g/x/s/x/y\ry/
+    (lambda adapter, line: substitute_lines(
+        adapter, line, line, re.compile("x"), "y\ny")[0],
+     [0, 2, 4], "y\ny1\ny\ny2\ny\ny3\na\nb\n"),
+])
+def test_line_marks(command, visited, expected):
+    """Test the marks follow the lines added and removed by commands."""
+    adapter = make_adapter("x1\nx2\nx3\na\nb\n")
+    assert run_marked(adapter, "^x", command) == visited
+    assert adapter.text() == expected
+
+
+def test_line_marks_move():
+    """Test :g/x/m$ with the move split into a copy and a delete."""
+    adapter = make_adapter("x1\na\nx2\nb\nx3\nc")
+
+    def move_last(adapter, line):
+        last = adapter.block_count() - 1
+        return copy_lines(adapter, line, line, last)[0] + \
+            delete_lines(adapter, line, line)[0], None, None
+
+    assert run_marked(adapter, "^x", move_last) == [0, 1, 2]
+    assert adapter.text() == "a\nb\nc\nx1\nx2\nx3"
+
+
+@pytest.mark.parametrize("args, expected", [
+    ("", ("", None)),
+    ("n", ("n", None)),
+    (" u i /a\\/b/ r", ("uir", "a/b")),
+    ("//", ("", "")),
+    ("x/\\d+/", ("x", "\\d+")),
+])
+def test_parse_sort(args, expected):
+    """Test the options and pattern of :sort in any order."""
+    assert parse_sort(args) == expected
+
+
+@pytest.mark.parametrize("args", ["nx", "z", "/a/ /b/"])
+def test_parse_sort_errors(args):
+    """Test several number options and invalid arguments."""
+    with pytest.raises(ValueError):
+        parse_sort(args)
+
+
+@pytest.mark.parametrize("text, options, pattern, reverse, expected", [
+    ("b\nA\nc\na", "", None, False, "A\na\nb\nc"),
+    ("b\nA\nc\na", "", None, True, "c\nb\na\nA"),
+    ("b\nA\nc\na", "i", None, False, "A\na\nb\nc"),
+    ("b\nA\nc\na", "i", None, True, "c\nb\na\nA"),
+    ("a\nb\na\nb", "u", None, False, "a\nb"),
+    ("a\nA\nb\nB", "iu", None, False, "a\nb"),
+    ("x10\nx9\ny\nx-1\nz", "n", None, False, "y\nz\nx-1\nx9\nx10"),
+    ("x10\nx9\ny\nx-1", "n", None, True, "x10\nx9\nx-1\ny"),
+    ("y 0x1F\nz 0xa\nt 2", "x", None, False, "t 2\nz 0xa\ny 0x1F"),
+    ("a 1.5\nb 1e-3\nc -2", "f", None, False, "c -2\nb 1e-3\na 1.5"),
+    ("a 10\nb 11\nc 7", "o", None, False, "c 7\na 10\nb 11"),
+    ("a 10\nb 1\nc 11", "b", None, False, "b 1\na 10\nc 11"),
+    ("1 b\n2 a\nc\n3 c", "", "\\d ", False, "c\n2 a\n1 b\n3 c"),
+    ("b1 x\na2 y\nc0 z", "r", "\\d", False, "c0 z\nb1 x\na2 y"),
+    ("b1\na1\nc0", "nu", "\\w", False, "c0\nb1"),
+])
+def test_sort_lines(text, options, pattern, reverse, expected):
+    """Test the sort options, stable and reversed."""
+    adapter = make_adapter(text)
+    regex = re.compile(pattern) if pattern is not None else None
+    last = adapter.block_count() - 1
+    result = sort_lines(adapter, 0, last, options, regex, reverse)
+    assert apply(adapter, result)[0] == expected
+
+
+@pytest.mark.parametrize("text, options, edit", [
+    ("a\nb\nd\nc\ne", "", (3, 4, "\nc\nd")),
+    ("b\na\nc", "", (0, 4, "a\nb\n")),
+    ("a\nc\nb", "", (1, 4, "\nb\nc")),
+    ("a\na\nb", "u", (1, 2, "")),
+    ("a\nb\nb", "u", (3, 2, "")),
+    ("b\nb\nc", "u", (1, 2, "")),
+    ("a\na\na", "u", (1, 4, "")),
+])
+def test_sort_lines_minimal(text, options, edit):
+    """Test only the lines which moved are replaced."""
+    adapter = make_adapter(text)
+    last = adapter.block_count() - 1
+    edits, __, cursor = sort_lines(adapter, 0, last, options)
+    assert edits == [edit]
+    assert cursor == 0
+
+
+def test_sort_lines_sorted():
+    """Test sorted lines are not changed."""
+    adapter = make_adapter(line=3)
+    assert sort_lines(adapter, 1, 2) == ([], None, adapter.block_position(1))
+
+
+@pytest.mark.parametrize("first, last, output, expected, edits, cursor", [
+    (1, 2, "  two\none\n", "zero\n  two\none\n\tthree\nfour\n",
+     [(5, 9, "  two\none")], 7),
+    (1, 2, "  one\n", "zero\n  one\n\tthree\nfour\n", [(10, 4, "")], 7),
+    (0, 1, "zero\r\n  one\r\n", TEXT, [], 0),
+    (1, 2, "", "zero\n\tthree\nfour\n", [(5, 10, "")], 6),
+])
+def test_filter_lines(first, last, output, expected, edits, cursor):
+    """Test the output of a filter replaces the changed lines."""
+    adapter = make_adapter()
+    result = filter_lines(adapter, first, last, output)
+    assert result[0] == edits
+    assert result[2] == cursor
+    assert apply(adapter, result)[0] == expected
+
+
+@pytest.mark.parametrize("line, text, expected, cursor", [
+    (0, "a\n  b\n", "zero\na\n  b\n  one\ntwo\n", 5),
+    (-1, "  a", "  a\nzero\n  one\ntwo\n", 2),
+    (2, "a\n", "zero\n  one\ntwo\na\n", 15),
+    (1, "", "zero\n  one\ntwo\n", None),
+])
+def test_insert_lines(line, text, expected, cursor):
+    """Test :r inserts below a line or at the top."""
+    adapter = make_adapter("zero\n  one\ntwo\n")
+    result = insert_lines(adapter, line, text)
+    assert apply(adapter, result)[0] == expected
+    assert result[2] == cursor
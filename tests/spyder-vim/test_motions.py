@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim motions and text objects tests.
+"""
+# Third party imports
+import pytest
+
+# Local imports
+from spyder_vim.spyder.motions import (MOTIONS, matching_bracket,
+                                       parse_motion)
+
+
+def run(keys, text, position, count=None, arg=None):
+    """Return the text covered by a motion and its kind."""
+    start, end, kind = MOTIONS[keys](text, position, count, arg)
+    if kind == "inclusive":
+        end += 1
+    return text[start:end], kind
+
+
+def test_word_motions():
+    """Test w, e and b across punctuation and lines."""
+    text = "foo.bar baz\nqux"
+    assert run("w", text, 0) == ("foo", "exclusive")
+    assert run("w", text, 0, 3) == ("foo.bar ", "exclusive")
+    assert run("W", text, 0) == ("foo.bar ", "exclusive")
+    assert run("e", text, 0, 2) == ("foo.", "inclusive")
+    assert run("b", text, 8) == ("bar ", "exclusive")
+    assert run("w", text, 8) == ("baz\n", "exclusive")
+
+
+def test_word_stops_at_empty_line():
+    """Test that an empty line counts as a word."""
+    text = "foo\n\nbar"
+    assert run("w", text, 0) == ("foo\n", "exclusive")
+    assert run("w", text, 0, 2) == ("foo\n\n", "exclusive")
+    assert run("b", text, 5) == ("\n", "exclusive")
+
+
+def test_paragraph_motions():
+    """Test } and { with counts."""
+    text = "a\nb\n\nc\n\nd"
+    assert run("}", text, 0) == ("a\nb\n", "exclusive")
+    assert run("}", text, 0, 2) == ("a\nb\n\nc\n", "exclusive")
+    assert run("}", text, 8) == ("d", "exclusive")
+    assert run("{", text, 6) == ("\nc", "exclusive")
+    assert run("{", text, 8, 2) == ("\nc\n\n", "exclusive")
+    # From an empty last line
+    assert run("{", "a\n\nb\n", 5) == ("\nb\n", "exclusive")
+
+
+def test_line_motions():
+    """Test j, k, G and gg are linewise and fail past the document."""
+    text = "a\nb\nc"
+    assert MOTIONS["j"](text, 0, 2) == (0, 4, "line")
+    assert MOTIONS["j"](text, 0, 3) is None
+    assert MOTIONS["k"](text, 4, 1) == (2, 4, "line")
+    assert MOTIONS["G"](text, 2, None) == (2, 4, "line")
+    assert MOTIONS["G"](text, 2, 1) == (0, 2, "line")
+    assert MOTIONS["gg"](text, 4, None) == (0, 4, "line")
+
+
+def test_find_char_motions():
+    """Test f, t, F and T stay on the line."""
+    text = "a,b,c\n,"
+    assert run("f", text, 0, 2, ",") == ("a,b,", "inclusive")
+    assert run("t", text, 0, 1, ",") == ("a", "inclusive")
+    assert MOTIONS["f"](text, 0, 3, ",") is None
+    assert run("F", text, 4, 1, ",") == (",", "exclusive")
+    assert run("T", text, 4, 1, ",") == ("", "exclusive")
+
+
+def test_word_objects():
+    """Test iw, aw and counts."""
+    text = "foo bar  baz"
+    assert run("iw", text, 5) == ("bar", "char")
+    assert run("aw", text, 5) == ("bar  ", "char")
+    assert run("aw", text, 9) == ("  baz", "char")
+    assert run("aw", text, 0, 2) == ("foo bar  ", "char")
+    assert run("iw", text, 3) == (" ", "char")
+
+
+def test_bracket_objects():
+    """Test i(, a(, nesting and multi-line blocks."""
+    text = "f(a, (b), c)"
+    assert run("i(", text, 6) == ("b", "char")
+    assert run("a)", text, 6) == ("(b)", "char")
+    assert run("ib", text, 6, 2) == ("a, (b), c", "char")
+    assert run("i(", text, 1) == ("a, (b), c", "char")
+    assert MOTIONS["i["](text, 6, None) is None
+    text = "x = {\n    1,\n}"
+    assert run("i{", text, 8) == ("    1,\n", "char")
+
+
+def test_quote_objects():
+    """Test i" and a" with escaped quotes."""
+    text = 'x = "a\\"b" + "c"'
+    assert run('i"', text, 5) == ('a\\"b', "char")
+    assert run('a"', text, 5) == ('"a\\"b" ', "char")
+    assert run('i"', text, 0) == ('a\\"b', "char")
+
+
+def test_paragraph_object():
+    """Test ip and ap are linewise."""
+    text = "a\nb\n\n\nc"
+    assert MOTIONS["ip"](text, 2, None) == (0, 2, "line")
+    assert MOTIONS["ap"](text, 0, None) == (0, 5, "line")
+
+
+def test_matching_bracket():
+    """Test % finds the bracket after the cursor and its match."""
+    text = "a(b[c]d)"
+    assert matching_bracket(text, 0) == 7
+    assert matching_bracket(text, 7) == 1
+    assert matching_bracket(text, 3) == 5
+    assert matching_bracket("abc", 0) == -1
+
+
+def test_parse_motion():
+    """Test complete, pending and invalid motions."""
+    assert parse_motion("}", "d") == ("}", None)
+    assert parse_motion("d", "d") == ("lines", None)
+    assert parse_motion("U", "gU") == ("lines", None)
+    assert parse_motion("gU", "gU") == ("lines", None)
+    assert parse_motion("aw", "y") == ("aw", None)
+    assert parse_motion("tx", "c") == ("t", "x")
+    for keys in ("", "i", "a", "g", "f"):
+        assert parse_motion(keys, "d") is None
+    with pytest.raises(ValueError):
+        parse_motion("q", "d")
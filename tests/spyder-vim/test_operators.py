@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim operators tests.
+"""
+# Local imports
+from spyder_vim.spyder.operators import apply_operator, operator_range
+from spyder_vim.spyder.undo import apply_edits
+
+
+def run(text, position, operator, motion, count=None, arg=None):
+    """Return the new text, the register and the cursor."""
+    edits, register, cursor = apply_operator(text, position, operator,
+                                             motion, count, arg)
+    return apply_edits(text, edits), register, cursor
+
+
+def test_exclusive_motion_becomes_linewise():
+    """Test d} from the start of a paragraph deletes whole lines."""
+    text = "a\nb\n\nc"
+    assert operator_range(text, 0, "d", "}") == (0, 3, "line")
+    assert run(text, 0, "d", "}") == ("\nc", ("a\nb\n", "line"), 0)
+    assert operator_range(text, 1, "d", "}") == (1, 3, "char")
+
+
+def test_dw_stops_at_end_of_line():
+    """Test dw on the last word of a line keeps the newline."""
+    assert run("foo bar\nbaz", 4, "d", "w") == ("foo \nbaz", ("bar", "char"),
+                                               3)
+
+
+def test_cw_on_word_end():
+    """Test cw changes only to the end of the current word."""
+    assert operator_range("ab c", 1, "c", "w") == (1, 2, "char")
+    assert operator_range("ab cd ef", 0, "c", "w", 2) == (0, 5, "char")
+    assert operator_range("ab  cd", 2, "c", "w") == (2, 4, "char")
+
+
+def test_linewise_delete_at_end():
+    """Test deleting the last lines removes the newline before them."""
+    text = "a\n  b\nc"
+    assert run(text, 4, "d", "j") == ("a", ("  b\nc\n", "line"), 0)
+    assert run(text, 0, "d", "lines") == ("  b\nc", ("a\n", "line"), 2)
+
+
+def test_change_lines_keeps_indent():
+    """Test cc-like changes keep the indentation of the first line."""
+    assert run("  a\n  b\nc", 0, "c", "j") == ("  \nc", ("  a\n  b\n", "line"),
+                                             2)
+
+
+def test_transform_operators():
+    """Test case, shift and = operators."""
+    assert run("ab cd", 0, "gU", "w") == ("AB cd", None, 0)
+    assert run("aB cd", 0, "g~", "lines") == ("Ab CD", None, 0)
+    assert run("a\nb", 0, ">", "j") == ("    a\n    b", None, 4)
+    assert run("      a", 3, "<", "lines") == ("  a", None, 2)
+    assert run("\ta  \n", 0, "=", "lines") == ("    a\n", None, 4)
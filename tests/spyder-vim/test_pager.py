@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim pager tests.
+"""
+# Third party imports
+import pytest
+
+# Local imports
+from spyder_vim.spyder import pager as pager_module
+from spyder_vim.spyder.pager import LineIndex, Pager
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    """Index and search with tiny chunks to cross their boundaries."""
+    monkeypatch.setattr(pager_module, "LINE_STEP", 4)
+    monkeypatch.setattr(pager_module, "INDEX_CHUNK", 16)
+    monkeypatch.setattr(pager_module, "SEARCH_CHUNK", 16)
+
+
+def make_pager(tmpdir, text, index=True):
+    path = tmpdir.join("big.log")
+    path.write_binary(text.encode("utf-8"))
+    return Pager(str(path), index=index)
+
+
+@pytest.mark.parametrize("text", ["", "a", "a\n", "a\nbb\n\nccc",
+                                  "x" * 40 + "\nshort\n" + "y" * 50,
+                                  "".join("line %d\n" % i for i in range(50))])
+def test_line_index(small_chunks, text):
+    """Test the index finds every line, across chunks and long lines."""
+    buffer = text.encode("utf-8")
+    index = LineIndex(buffer)
+    assert index.wait()
+    lines = text.split("\n")
+    starts = [0]
+    for line in lines[:-1]:
+        starts.append(starts[-1] + len(line) + 1)
+    assert index.lines == len(lines)
+    assert [index.line_offset(line) for line in range(len(lines))] == starts
+    assert index.line_offset(len(lines)) is None
+    assert [index.line_number(start) for start in starts] == list(
+        range(len(lines)))
+    assert index.progress() == 1
+
+
+def test_line_index_partial(small_chunks):
+    """Test lines past the indexed part are unknown."""
+    index = LineIndex(b"".join(b"line %d\n" % i for i in range(20)))
+    index.build_chunk()
+    assert not index.done
+    assert index.line_offset(1) == 7
+    assert index.line_offset(19) is None
+    assert index.line_number(7) == 1
+    assert index.line_number(len(index.buffer) - 1) is None
+    assert 0 < index.progress() < 1
+
+
+def test_pager_moves(tmpdir, small_chunks):
+    """Test j, k, gg, G and {count}G."""
+    pager = make_pager(tmpdir, "".join("line %d\n" % i for i in range(30)))
+    assert pager.lines(2) == ["line 0", "line 1"]
+    pager.down(3)
+    assert pager.lines(1) == ["line 3"]
+    pager.up(5)
+    assert pager.lines(1) == ["line 0"]
+    pager.last()
+    assert pager.lines(3) == [""]
+    pager.up()
+    assert pager.lines(3) == ["line 29", ""]
+    assert pager.goto_line(11)
+    assert pager.lines(1) == ["line 11"]
+    assert pager.line_number() == 11
+    assert pager.goto_line(100)
+    assert pager.line_number() == 30
+    pager.first()
+    assert pager.line_number() == 0
+    pager.close()
+
+
+def test_pager_search(tmpdir, small_chunks):
+    """Test / and ? wrap around and n, N follow their direction."""
+    text = "".join("line %d%s\n" % (i, " match" if i % 10 == 5 else "")
+                   for i in range(30))
+    pager = make_pager(tmpdir, text, index=False)
+    assert pager.search("match$")
+    assert pager.lines(1) == ["line 5 match"]
+    assert pager.next()
+    assert pager.lines(1) == ["line 15 match"]
+    assert pager.next(reverse=True)
+    assert pager.lines(1) == ["line 5 match"]
+    assert pager.next(reverse=True)
+    assert pager.lines(1) == ["line 25 match"]
+    assert pager.next()
+    assert pager.lines(1) == ["line 5 match"]
+    assert pager.search(r"^line 1\d", reverse=True)
+    assert pager.lines(1) == ["line 19"]
+    assert pager.next()
+    assert pager.lines(1) == ["line 18"]
+    assert not pager.search("missing")
+    assert pager.lines(1) == ["line 18"]
+    pager.close()
+
+
+def test_pager_decoding(tmpdir):
+    """Test lines are decoded and invalid bytes replaced."""
+    path = tmpdir.join("binary.log")
+    path.write_binary("é\n".encode("utf-8") + b"\xff\n")
+    pager = Pager(str(path))
+    assert pager.lines(2) == ["é", "�"]
+    assert pager.search("é")
+    pager.close()
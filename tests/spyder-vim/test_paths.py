@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim file index tests.
+"""
+# Standard library imports
+import os.path as osp
+
+# Third party imports
+import pytest
+
+# Local imports
+from spyder_vim.spyder.paths import PathIndex, scan_directory
+
+
+@pytest.fixture
+def project(tmpdir):
+    """A small project tree."""
+    for path in ["setup.py", "pkg/__init__.py", "pkg/mod.py",
+                 "pkg/sub/__init__.py", "pkg/sub/mod.py", "docs/index.rst",
+                 ".git/config", "pkg/__pycache__/mod.pyc",
+                 "node_modules/lib/index.js"]:
+        tmpdir.join(path).write("", ensure=True)
+    return tmpdir
+
+
+def test_scan_directory(project):
+    """Test files and subdirectories are listed, without ignored ones."""
+    assert scan_directory(str(project)) == (
+        {"setup.py"}, {"pkg", "docs"})
+    assert scan_directory(str(project.join("missing"))) is None
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("setup.py", ["setup.py"]),
+    ("mod.py", ["pkg/mod.py", "pkg/sub/mod.py"]),
+    ("sub/mod.py", ["pkg/sub/mod.py"]),
+    ("pkg/mod.py", ["pkg/mod.py"]),
+    ("./pkg/mod.py", ["pkg/mod.py"]),
+    ("kg/mod.py", []),
+    ("config", []),
+    ("mod.pyc", []),
+    ("missing.py", []),
+])
+def test_find(project, name, expected):
+    """Test files are found by name or by the end of their path."""
+    index = PathIndex(str(project))
+    assert index.wait()
+    assert index.find(name) == [osp.normpath(path) for path in expected]
+    assert index.files == 6
+
+
+def test_refresh(project):
+    """Test changed directories are scanned again."""
+    index = PathIndex(str(project))
+    index.wait()
+    assert sorted(index.take_directories()) == [
+        "", "docs", "pkg", osp.join("pkg", "sub")]
+    project.join("pkg/new.py").write("")
+    project.join("pkg/mod.py").remove()
+    project.join("pkg/sub").remove()
+    project.join("pkg/other/mod.py").write("", ensure=True)
+    index.refresh("pkg")
+    assert index.wait()
+    assert index.find("new.py") == [osp.join("pkg", "new.py")]
+    assert index.find("mod.py") == [osp.join("pkg", "other", "mod.py")]
+    assert index.find("__init__.py") == [osp.join("pkg", "__init__.py")]
+    assert index.files == 5
+    assert index.take_directories() == [osp.join("pkg", "other")]
+    assert osp.join("pkg", "sub") not in index.directories
+
+
+def test_thread(tmpdir):
+    """Test the index is built in a background thread."""
+    for directory in range(20):
+        for name in range(50):
+            tmpdir.join("d{}/f{}.txt".format(directory, name)).write(
+                "", ensure=True)
+    index = PathIndex(str(tmpdir))
+    index.start()
+    assert index.wait(10)
+    assert index.files == 1000
+    assert index.find("d7/f3.txt") == [osp.join("d7", "f3.txt")]
+    index.stop()
+
+
+def test_listing(project):
+    """Test directory listings and file names by prefix."""
+    index = PathIndex(str(project))
+    index.wait()
+    assert index.listing("pkg") == ({"__init__.py", "mod.py"}, {"sub"})
+    assert index.listing("missing") is None
+    assert index.names_with_prefix("__") == ["__init__.py"]
+    assert index.names_with_prefix("") == [
+        "__init__.py", "index.rst", "mod.py", "setup.py"]
+    version = index.version
+    project.join("pkg/new.py").write("")
+    index.refresh("pkg")
+    index.wait()
+    assert index.version > version
+    assert index.names_with_prefix("n") == ["new.py"]
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim latency statistics tests.
+"""
+# Standard library imports
+import json
+import pstats
+
+# Local imports
+from spyder_vim.spyder.perf import (Histogram, PerfStats, bucket_index,
+                                    bucket_range)
+
+
+def test_buckets():
+    """Test buckets are contiguous and hold their values."""
+    previous = -1
+    for value in range(100000):
+        index = bucket_index(value)
+        low, high = bucket_range(index)
+        assert low <= value <= high
+        assert index in (previous, previous + 1)
+        # Relative error of 1/8 at most
+        assert high - low <= max(low // 8, 0)
+        previous = index
+
+
+def test_histogram_percentiles():
+    """Test percentiles are close to the values."""
+    histogram = Histogram()
+    for value in range(1, 1001):
+        histogram.add(value)
+    assert 500 <= histogram.percentile(0.5) <= 500 * 1.125
+    assert 990 <= histogram.percentile(0.99) <= 1000
+    assert histogram.maximum == 1000
+    assert Histogram().percentile(0.5) == 0
+
+
+def test_disabled_stats():
+    """Test nothing is recorded while the statistics are off."""
+    perf = PerfStats()
+    assert perf.run("x", None, lambda value: value + 1, 1) == 2
+    assert perf.handlers == {}
+    assert "off" in perf.report()
+
+
+def test_nested_handlers():
+    """Test handlers called by another handler are part of it."""
+    perf = PerfStats()
+    perf.start()
+    perf.run("outer", None, perf.run, "inner", None, lambda: None)
+    assert list(perf.handlers) == ["outer"]
+    assert perf.handlers["outer"].calls == 1
+    assert "outer" in perf.report()
+    perf.reset()
+    assert perf.handlers == {}
+
+
+def test_profile(tmpdir):
+    """Test a profile writes cProfile statistics and a trace."""
+    perf = PerfStats()
+    perf.start_profile(str(tmpdir.join("capture.prof")))
+    perf.profiler.span("x", "key", perf.run, "delete", None, sorted, [2, 1])
+    prof_path, trace_path = perf.stop_profile()
+    assert perf.profiler is None
+    assert trace_path == str(tmpdir.join("capture.json"))
+    stats = pstats.Stats(prof_path)
+    assert any(function == "<built-in method builtins.sorted>"
+               for __, __, function in stats.stats)
+    with open(trace_path) as f:
+        events = json.load(f)["traceEvents"]
+    # Inner spans end first
+    assert [(event["name"], event["cat"]) for event in events] == [
+        ("delete", "command"), ("x", "key")]
+    assert events[1]["dur"] >= events[0]["dur"]
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim register store tests.
+"""
+# Local imports
+from spyder_vim.spyder.registers import RegisterStore
+
+
+def test_numbered_registers_shift():
+    """Test that deletes shift the numbered registers up to 9."""
+    registers = RegisterStore()
+    for i in range(12):
+        registers.set("line {}\n".format(i), "line", cut=True)
+    assert registers.get("1").text == "line 11\n"
+    assert registers.get("9").text == "line 3\n"
+
+
+def test_small_delete_register():
+    """Test that a charwise delete goes to the small delete register."""
+    registers = RegisterStore()
+    registers.set("spam", "char", cut=True)
+    assert registers.get("-").text == "spam"
+    assert registers.get("1").text == ""
+
+
+def test_append_to_register():
+    """Test appending to a named register with its uppercase name."""
+    registers = RegisterStore()
+    registers.set("a", "char", register="a")
+    for __ in range(1000):
+        registers.set("b", "char", register="A")
+    assert registers.get("a").text == "a" + "b" * 1000
+    assert registers.get("unnamed").text == "a" + "b" * 1000
+
+
+def test_unnamed_register_follows_named():
+    """Test that the unnamed register holds the last written text."""
+    registers = RegisterStore()
+    registers.set("spam\n", "line", register="a")
+    register = registers.get("unnamed")
+    assert (register.text, register.mode) == ("spam\n", "line")
+
+
+def test_register_lines():
+    """Test the line list of a linewise register."""
+    registers = RegisterStore()
+    registers.set("spam\neggs\n", "line")
+    assert registers.get().lines() == ["spam", "eggs"]
+
+
+def test_unknown_register():
+    """Test reading a register that was never set."""
+    register = RegisterStore().get("z")
+    assert (register.text, register.mode) == ("", False)
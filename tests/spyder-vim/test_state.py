@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim document state tests.
+"""
+# Local imports
+from spyder_vim.spyder.state import (CHANGE_SIZE, CHANGELIST_SIZE, MATCH_SIZE,
+                                     STATE_SIZE, DocumentState, DocumentStates)
+
+
+def test_change_list():
+    """Test changes on one line are merged and browsed with g; and g,."""
+    state = DocumentState()
+    assert state.step_change(-1) is None
+    for line, column in [(1, 0), (1, 4), (5, 2), (3, 1)]:
+        state.add_change(line, column)
+    assert state.changes == [(1, 4), (5, 2), (3, 1)]
+    assert state.step_change(1) is None
+    assert state.step_change(-1) == (3, 1)
+    assert state.step_change(-5) == (1, 4)
+    assert state.step_change(-1) is None
+    assert state.step_change(1) == (5, 2)
+    assert state.step_change(1) == (3, 1)
+    assert state.step_change(1) is None
+    state.add_change(7, 0)
+    assert state.step_change(-1) == (7, 0)
+
+
+def test_change_list_size():
+    """Test only the last changes are kept."""
+    state = DocumentState()
+    for line in range(CHANGELIST_SIZE + 10):
+        state.add_change(line, 0)
+    assert len(state.changes) == CHANGELIST_SIZE
+    assert state.changes[0] == (10, 0)
+
+
+def test_states():
+    """Test states are created on first use and dropped when closed."""
+    states = DocumentStates()
+    state = states.get("a")
+    assert "a" in states
+    assert states.get("a") is state
+    states.get("b").visual_lines = (1, 2)
+    assert states.get("b").visual_lines == (1, 2)
+    states.pop("a")
+    states.pop("a")
+    assert "a" not in states
+    assert len(states) == 1
+
+
+def test_states_limit():
+    """Test the least recently used states are dropped past the limit."""
+    states = DocumentStates(limit=3 * STATE_SIZE)
+    for key in "abc":
+        states.get(key)
+    states.get("a")
+    states.get("d")
+    assert "b" not in states
+    assert len(states) == 3
+    assert states.size() == 3 * STATE_SIZE
+    states.get("a").search = {"stack": [None] * 10}
+    assert states.get("a").size() == STATE_SIZE + 10 * MATCH_SIZE
+    # The state used is kept, even alone over the limit
+    assert len(states) == 1
+    assert "a" in states
+
+
+def test_states_size():
+    """Test the size of the states follows searches, changes and drops."""
+    states = DocumentStates()
+    states.get("a").search = {"stack": [None] * 4}
+    for line in range(CHANGELIST_SIZE + 10):
+        states.get("b").add_change(line, 0)
+    assert states.size() == sum(
+        states.get(key).size() for key in "ab")
+    assert states.size() == (2 * STATE_SIZE + 4 * MATCH_SIZE
+                             + CHANGELIST_SIZE * CHANGE_SIZE)
+    states.get("a").search = {}
+    assert states.size() == 2 * STATE_SIZE + CHANGELIST_SIZE * CHANGE_SIZE
+    dropped = states.get("b")
+    states.pop("b")
+    dropped.add_change(0, 0)
+    assert states.size() == STATE_SIZE
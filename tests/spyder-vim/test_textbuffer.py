@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim text buffer tests.
+"""
+import random
+
+# Local imports
+from spyder_vim.spyder import textbuffer
+from spyder_vim.spyder.textbuffer import FenwickTree, TextBuffer
+
+
+def check_lines(buffer, text):
+    """Compare the line index of buffer with text."""
+    lines = text.split("\n")
+    assert buffer.line_count() == len(lines)
+    position = 0
+    for number, line in enumerate(lines):
+        assert buffer.line_start(number) == position
+        assert buffer.line_end(number) == position + len(line)
+        assert buffer.line_of(position) == number
+        assert buffer.line_of(position + len(line)) == number
+        position += len(line) + 1
+
+
+def test_fenwick_tree():
+    """Test prefix sums and search."""
+    tree = FenwickTree([3, 0, 2, 5])
+    assert [tree.prefix(index) for index in range(5)] == [0, 3, 3, 5, 10]
+    assert tree.find(0) == (0, 0)
+    assert tree.find(3) == (2, 0)
+    assert tree.find(9) == (3, 4)
+    assert tree.find(10) == (4, 0)
+    tree.add(1, 4)
+    assert tree.find(3) == (1, 0)
+    assert tree.prefix(4) == 14
+
+
+def test_buffer_lines():
+    """Test offset and line conversions."""
+    text = "ab\n\ncd\nef"
+    buffer = TextBuffer(text)
+    assert str(buffer) == text
+    assert len(buffer) == len(text)
+    check_lines(buffer, text)
+    assert buffer.get_text(1, 6) == "b\n\ncd"
+    check_lines(TextBuffer(""), "")
+
+
+def test_buffer_random_edits(monkeypatch):
+    """Test edits across chunks against a plain string."""
+    monkeypatch.setattr(textbuffer, "CHUNK_SIZE", 8)
+    rand = random.Random(0)
+    text = "".join(rand.choice("ab\n") for __ in range(200))
+    buffer = TextBuffer(text)
+    for __ in range(300):
+        position = rand.randint(0, len(text))
+        length = rand.randint(0, min(30, len(text) - position))
+        inserted = "".join(rand.choice("xy\n")
+                           for __ in range(rand.randint(0, 40)))
+        buffer.replace(position, length, inserted)
+        text = text[:position] + inserted + text[position + length:]
+        assert len(buffer) == len(text)
+        start = rand.randint(0, len(text))
+        assert buffer.get_text(start, start + 20) == text[start:start + 20]
+    assert str(buffer) == text
+    check_lines(buffer, text)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim undo tree tests.
+"""
+# Local imports
+from spyder_vim.spyder.adapter import MemoryAdapter
+from spyder_vim.spyder.undo import (ChangeRecorder, ChangeRecorders, UndoTree,
+                                    apply_edits)
+
+
+def recorder_of(text):
+    """Return a recorder of the changes of an editor holding text."""
+    adapter = MemoryAdapter(text)
+    recorder = ChangeRecorder(adapter)
+    adapter.on_change(recorder.note_change)
+    recorder.track()
+    return recorder
+
+
+def edit(recorder, position, removed, inserted):
+    """Run a command replacing text and commit it."""
+    recorder.adapter.edit([(position, removed, inserted)])
+    return recorder.commit()
+
+
+def goto(recorder, edits):
+    """Apply the edits of a move in the tree, like VimKeys._undo_goto."""
+    recorder.adapter.edit(edits)
+    recorder.discard()
+    return recorder.adapter.text()
+
+
+def test_commit_stores_minimal_diff():
+    """Test that only the changed region is stored."""
+    recorder = recorder_of("a" * 1000 + "b" + "c" * 1000)
+    node = edit(recorder, 1000, 1, "xyz")
+    assert (node.position, node.removed, node.inserted) == (1000, "b", "xyz")
+
+
+def test_commit_merges_changes():
+    """Test that the changes of one command make one node."""
+    recorder = recorder_of("line 1\nline 2\nline 3\n")
+    recorder.adapter.edit([(14, 4, "row"), (0, 4, "row"), (3, 5, "")])
+    node = recorder.commit()
+    assert recorder.adapter.text() == "rowne 2\nrow 3\n"
+    assert (node.position, node.removed, node.inserted, node.line) == (
+        0, "line 1\nline 2\nline", "rowne 2\nrow", 0)
+    assert len(recorder.tree.nodes) == 2
+
+
+def test_commit_ignores_format_changes():
+    """Test that contentsChange without text changes adds no node."""
+    recorder = recorder_of("spam")
+    recorder.note_change(0, 4, 4, 4)
+    # Qt reports changes of the first block past the end of the text
+    recorder.note_change(0, 5, 5, 4)
+    assert recorder.commit() is None
+    assert len(recorder.tree.nodes) == 1
+
+
+def test_add_change():
+    """Test changes given by the caller are trimmed to the changed part."""
+    tree = UndoTree()
+    node = tree.add_change(10, "one\ntwo", "one\nTwo", line=3)
+    assert (node.position, node.removed, node.inserted, node.line) == (
+        14, "t", "T", 4)
+    assert tree.add_change(0, "same", "same") is None
+
+
+def test_undo_many_steps_returns_batched_edits():
+    """Test undoing several commands in one call."""
+    text = original = "line\n" * 10
+    recorder = recorder_of(text)
+    for i in range(5):
+        edit(recorder, i * 6, 0, str(i))
+    text = recorder.adapter.text()
+    edits = recorder.tree.undo(5)
+    assert apply_edits(text, edits) == original
+    assert recorder.tree.cur is recorder.tree.root
+
+
+def test_branches_and_chronological_steps():
+    """Test that g- / g+ walk every state including other branches."""
+    recorder = recorder_of("abc")
+    tree = recorder.tree
+    states = ["abc"]
+    edit(recorder, 0, 1, "")
+    states.append(recorder.adapter.text())
+    edit(recorder, 0, 1, "")
+    states.append(recorder.adapter.text())
+    goto(recorder, tree.undo())
+    edit(recorder, 1, 1, "X")
+    states.append(recorder.adapter.text())
+    visited = []
+    for __ in range(3):
+        visited.append(goto(recorder, tree.step(-1)))
+    assert visited == states[2::-1]
+    assert goto(recorder, tree.step(3)) == states[3]
+
+
+def test_redo_follows_latest_branch():
+    """Test that redo goes down the most recently used branch."""
+    recorder = recorder_of("abc")
+    tree = recorder.tree
+    edit(recorder, 0, 1, "1")
+    goto(recorder, tree.undo())
+    edit(recorder, 0, 1, "2")
+    goto(recorder, tree.undo())
+    assert goto(recorder, tree.redo()) == "2bc"
+    assert len(tree.nodes) == 3
+
+
+def test_release_drops_history_on_change():
+    """Test the history is kept without copy only if the text is unchanged."""
+    recorder = recorder_of("abc")
+    edit(recorder, 0, 1, "1")
+    recorder.release()
+    assert recorder.size() == 0
+    recorder.track()
+    assert len(recorder.tree.nodes) == 2
+    recorder.release()
+    recorder.adapter.edit([(0, 1, "2")])
+    assert len(recorder.tree.nodes) == 1
+    recorder.track()
+    assert edit(recorder, 1, 1, "x").removed == "b"
+
+
+def test_recorders_limit():
+    """Test the copies of the least recently used documents are released."""
+    recorders = ChangeRecorders(limit=10)
+    adapters = [MemoryAdapter(text) for text in ("aaaa", "bbbb", "cccc")]
+    for adapter in adapters:
+        recorder = recorders.get(adapter, adapter)
+        adapter.on_change(recorder.note_change)
+    assert recorders.size() == 8
+    assert recorders.peek(adapters[0]).size() == 0
+    adapters[2].edit([(0, 0, "cc")])
+    assert recorders.size() == 10
+    recorders.get(adapters[0], adapters[0])
+    assert [recorders.peek(adapter).size() for adapter in adapters] == [
+        4, 0, 6]
+    recorders.pop(adapters[2])
+    assert recorders.size() == 4
+    assert len(recorders) == 2
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim viminfo tests.
+"""
+# Standard library imports
+import os
+import os.path as osp
+
+# Local imports
+from spyder_vim.spyder import viminfo as viminfo_module
+from spyder_vim.spyder.viminfo import VimInfo, BLOB_DIRNAME, INLINE_SIZE
+
+
+def test_state_round_trip(tmpdir):
+    """Test that a new session reads back the saved state."""
+    viminfo = VimInfo(str(tmpdir))
+    viminfo.set_register("a", "spam\n", "line")
+    viminfo.push_deleted("eggs\n", "line")
+    viminfo.set_mark("A", "/tmp/foo.py", 3, 2)
+    viminfo.set_mark("b", "/tmp/foo.py", 1, 0)
+    viminfo.add_history(":", "w")
+    viminfo.set_last_search("spam", True)
+    viminfo.add_jump("/tmp/foo.py", 10, 4)
+    viminfo.flush()
+
+    loaded = VimInfo(str(tmpdir))
+    loaded.load()
+    assert loaded.registers == {"a": ("spam\n", "line")}
+    assert loaded.deleted == [("eggs\n", "line")]
+    assert loaded.get_mark("A", "/tmp/bar.py") == ("/tmp/foo.py", 3, 2)
+    assert loaded.get_mark("b", "/tmp/foo.py") == ("/tmp/foo.py", 1, 0)
+    assert loaded.get_mark("b", "/tmp/bar.py") is None
+    assert loaded.get_history(":") == ["w"]
+    assert loaded.last_search == ("spam", True)
+    assert loaded.jumps == [("/tmp/foo.py", 10, 4)]
+
+
+def test_large_register_stored_out_of_line(tmpdir):
+    """Test that large registers are read only when used."""
+    text = "x" * (INLINE_SIZE + 1)
+    viminfo = VimInfo(str(tmpdir))
+    viminfo.set_register("a", lambda: text, "char")
+    viminfo.flush()
+    assert osp.getsize(viminfo.path) < INLINE_SIZE
+    assert len(os.listdir(osp.join(str(tmpdir), BLOB_DIRNAME))) == 1
+
+    loaded = VimInfo(str(tmpdir))
+    loaded.load()
+    source, mode = loaded.registers["a"]
+    assert callable(source)
+    assert source() == text
+
+
+def test_compaction(tmpdir, monkeypatch):
+    """Test that the file is rewritten once it holds too many records."""
+    monkeypatch.setattr(viminfo_module, "COMPACT_MIN_RECORDS", 10)
+    viminfo = VimInfo(str(tmpdir))
+    for i in range(30):
+        viminfo.set_register("a", "x" * (INLINE_SIZE + i), "char")
+        viminfo.flush()
+    with open(viminfo.path) as fh:
+        assert len(fh.readlines()) <= 10
+    viminfo.compact()
+    with open(viminfo.path) as fh:
+        assert len(fh.readlines()) == 1
+    assert len(os.listdir(osp.join(str(tmpdir), BLOB_DIRNAME))) == 1
+
+    loaded = VimInfo(str(tmpdir))
+    loaded.load()
+    assert loaded.registers["a"][0]() == "x" * (INLINE_SIZE + 29)
+
+
+def test_truncated_record_ignored(tmpdir):
+    """Test that a line cut by a crash does not prevent loading."""
+    viminfo = VimInfo(str(tmpdir))
+    viminfo.add_history("/", "spam")
+    viminfo.flush()
+    with open(viminfo.path, "a") as fh:
+        fh.write('["h",":","eg')
+    loaded = VimInfo(str(tmpdir))
+    loaded.load()
+    assert loaded.get_history("/") == ["spam"]
+
+
+def test_corrupt_file_ignored(tmpdir):
+    """Test that invalid records and bytes do not prevent loading."""
+    viminfo = VimInfo(str(tmpdir))
+    viminfo.add_history("/", "spam")
+    viminfo.flush()
+    with open(viminfo.path, "ab") as fh:
+        fh.write(b'{}\n"h"\n[]\n["h",":"]\n[["h"],1,2]\n["m",1,"f",2,3]\n'
+                 b'["h",":","\xff\xfe"]\n\xff\xfe\x00\n')
+    loaded = VimInfo(str(tmpdir))
+    loaded.load()
+    assert loaded.get_history("/") == ["spam"]
+    assert loaded.get_history(":") == ["\ufffd\ufffd"]
+    assert loaded.get_mark("a", "f") is None
+
+
+def test_history_deduplicated(tmpdir):
+    """Test that a repeated entry moves to the end of the history."""
+    viminfo = VimInfo(str(tmpdir))
+    for entry in ["a", "b", "a"]:
+        viminfo.add_history(":", entry)
+    assert viminfo.get_history(":") == ["b", "a"]
+
+
+def test_history_size(tmpdir, monkeypatch):
+    """Test that histories keep their last entries, each one separately."""
+    monkeypatch.setattr(viminfo_module, "HISTORY_SIZE", 3)
+    viminfo = VimInfo(str(tmpdir))
+    for entry in ["a", "b", "c", "a", "d"]:
+        viminfo.add_history(":", entry)
+    viminfo.add_history("/", "e")
+    assert viminfo.get_history(":") == ["c", "a", "d"]
+    assert viminfo.get_history("/") == ["e"]
+    assert viminfo.get_history("?") == []
+    viminfo.flush()
+    loaded = VimInfo(str(tmpdir))
+    assert not loaded.loaded
+    assert loaded.get_history(":") == ["c", "a", "d"]
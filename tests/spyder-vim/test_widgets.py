@@ -8,8 +8,12 @@
 spyder-vim widget tests.
 """
 # Standard library imports
+import json
+import logging
 import os
 import os.path as osp
+import subprocess
+import sys
 
 # Test library imports
 import pytest
@@ -18,14 +22,15 @@ from unittest.mock import Mock
 # Qt imports
 from qtpy.QtCore import Qt, QPoint
 from qtpy.QtGui import QTextCursor
-from qtpy.QtWidgets import QWidget, QVBoxLayout, QApplication
+from qtpy.QtWidgets import QWidget, QVBoxLayout, QApplication, QSplitter
 
 # Spyder imports
 from spyder.plugins.editor.widgets.editorstack import EditorStack
 
 # Local imports
 from spyder_vim.spyder.plugin import SpyderVim
-from spyder_vim.spyder.widgets import RE_VIM_PREFIX
+from spyder_vim.spyder.widgets import RE_VIM_PREFIX, VimPager
+from spyder_vim.spyder import widgets as vim_widgets
 
 
 LOCATION = osp.realpath(osp.join(
@@ -34,9 +39,11 @@ LOCATION = osp.realpath(osp.join(
 
 class VimTesting(SpyderVim):
 
-    def __init__(self, parent):
+    def __init__(self, parent, lazy=False):
         super().__init__(parent)
         self.on_editor_available()
+        if not lazy:
+            self.setup_vim()
 
     def get_focus_widget(self):
         return self.vim_cmd.commandline
@@ -54,6 +61,8 @@ class EditorMock(QWidget):
         self.new_action = Mock()
         self.save_action = Mock()
         self.close_action = Mock()
+        # Parent of the editorstack, as the editor splitter
+        self.main_widget = Mock()
 
         layout = QVBoxLayout()
         layout.addWidget(self.editor_stack)
@@ -85,6 +94,12 @@ class MainMock(QWidget):
     add_dockwidget = Mock()
 
 
+def clipboard_text():
+    """Return the clipboard text once deferred writes are done."""
+    QApplication.processEvents()
+    return QApplication.clipboard().text()
+
+
 @pytest.fixture
 def editor_bot(qtbot):
     """Editorstack pytest fixture."""
@@ -105,14 +120,44 @@ def editor_bot(qtbot):
 
 
 @pytest.fixture
-def vim_bot(editor_bot):
+def vim_bot(editor_bot, tmpdir):
     """Create an spyder-vim plugin instance."""
     main, editor_stack, editor, qtbot = editor_bot
     vim = VimTesting(main)
     vim.on_initialize()
+    vim.vim_cmd.viminfo.dirname = str(tmpdir)
     return main, editor_stack, editor, vim, qtbot
 
 
+def test_plugin_import():
+    """Importing the plugin does not import the vim widget."""
+    code = ("import sys, spyder_vim.spyder.plugin; "
+            "print('spyder_vim.spyder.widgets' in sys.modules)")
+    output = subprocess.check_output([sys.executable, "-c", code])
+    assert output.strip() == b"False"
+
+
+@pytest.mark.parametrize("activate", ["escape", "focus"])
+def test_plugin_lazy_startup(editor_bot, caplog, activate):
+    """The vim widget replaces the stub on first Esc or focus."""
+    main, editor_stack, editor, qtbot = editor_bot
+    with caplog.at_level(logging.DEBUG, logger="spyder_vim.spyder.plugin"):
+        vim = VimTesting(main, lazy=True)
+    assert vim.vim_cmd is None
+    assert "Startup took" in caplog.text
+    stub = vim._stub
+    assert main.editor.layout().indexOf(stub) >= 0
+    if activate == "escape":
+        vim.focus_vim()
+    else:
+        stub.sig_activated.emit()
+    vim_cmd = vim.vim_cmd
+    assert vim_cmd is not None
+    assert main.editor.layout().indexOf(vim_cmd) >= 0
+    assert main.editor.layout().indexOf(stub) == -1
+    assert vim.setup_vim() is vim_cmd
+    assert vim._stub is None
+
 def test_prefix_no_match():
     """Test that prefix regex does not match invalid prefix."""
     match = RE_VIM_PREFIX.match("d")
@@ -237,6 +282,119 @@ def test_backward_search_regex_command(vim_bot):
     assert index_test == [4, 3, 2, 1, 4, 1, 2, 3, 4, 1]
 
 
+@pytest.mark.parametrize("search, expected", [
+    ('/line\r', [1, 2, 3, 4, 1, 4, 3, 2, 1, 4]),
+    ('?l.*e\r', [4, 3, 2, 1, 4, 1, 2, 3, 4, 1])])
+def test_search_large_file(vim_bot, search, expected):
+    """Test search in large file mode finds matches from the cursor."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    vim.vim_cmd.options["largefilelines"] = 2
+    editor.stdkey_backspace()
+    editor.go_to_line(1)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, search)
+    assert "stack" not in vim.vim_cmd.vim_keys.search_dict
+    index_test = []
+    for i in range(5):
+        qtbot.keyClicks(cmd_line, 'n')
+        line, _ = editor.get_cursor_line_column()
+        index_test.append(line)
+    for i in range(5):
+        qtbot.keyClicks(cmd_line, 'N')
+        line, _ = editor.get_cursor_line_column()
+        index_test.append(line)
+    assert index_test == expected
+    assert editor.get_extra_selections('search')
+
+
+def test_search_per_document(vim_bot):
+    """Test search results are kept per document."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    vim_keys = vim.vim_cmd.vim_keys
+    editor.go_to_line(1)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, '/line 3\rn')
+    assert editor.get_cursor_line_column()[0] == 3
+    stack = vim_keys.search_dict["stack"]
+    editor_stack.set_stack_index(1)
+    other = editor_stack.get_current_editor()
+    other.go_to_line(1)
+    qtbot.keyClicks(cmd_line, 'n')
+    assert other.get_cursor_line_column()[0] == 3
+    assert vim_keys.search_dict["stack"][0].cursor.document() is (
+        other.document())
+    qtbot.keyClicks(cmd_line, '/line 1\r')
+    editor_stack.set_stack_index(0)
+    editor.go_to_line(1)
+    qtbot.keyClicks(cmd_line, 'n')
+    assert editor.get_cursor_line_column()[0] == 1
+    assert vim_keys.search_dict["stack"] is not stack
+    assert len(vim_keys.states) == 2
+
+
+def test_document_state_limit(vim_bot):
+    """Test the state of the least recently used document is dropped."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    vim_keys = vim.vim_cmd.vim_keys
+    vim_keys.states.limit = 0
+    editor.go_to_line(1)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, '/line\r')
+    assert editor.document() in vim_keys.states
+    editor_stack.set_stack_index(1)
+    qtbot.keyClicks(cmd_line, 'n')
+    assert editor.document() not in vim_keys.states
+    assert len(vim_keys.states) == 1
+
+
+def test_change_list(vim_bot):
+    """Go to the older and newer changes with g; and g,."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.go_to_line(1)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, 'x2jxjxxG')
+    qtbot.keyClicks(cmd_line, 'g;')
+    assert editor.get_cursor_line_column() == (3, 0)
+    qtbot.keyClicks(cmd_line, '2g;')
+    assert editor.get_cursor_line_column() == (0, 0)
+    qtbot.keyClicks(cmd_line, 'g;')
+    assert editor.get_cursor_line_column() == (0, 0)
+    qtbot.keyClicks(cmd_line, 'g,')
+    assert editor.get_cursor_line_column() == (2, 0)
+    editor_stack.set_stack_index(1)
+    other = editor_stack.get_current_editor()
+    other.go_to_line(1)
+    qtbot.keyClicks(cmd_line, 'g;')
+    assert other.get_cursor_line_column() == (0, 0)
+
+
+def test_large_file_mode(vim_bot, monkeypatch):
+    """Test large file mode reads the text around the cursor only."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    monkeypatch.setattr(vim_widgets, "LARGE_FILE_SCAN_LINES", 1)
+    vim.vim_cmd.options["largefilesize"] = 10
+    vim.vim_cmd.on_mode_changed("normal")
+    assert vim.vim_cmd.status_label.text() == "NORMAL L"
+    cmd_line = vim.get_focus_widget()
+    editor.set_text('(a\nb\nc)\nline 3 (x y)\n')
+    editor.go_to_line(1)
+    qtbot.keyClicks(cmd_line, '%')
+    assert editor.textCursor().position() == 0
+    editor.go_to_line(4)
+    qtbot.keyClicks(cmd_line, '%')
+    assert editor.textCursor().position() == 19
+    qtbot.keyClicks(cmd_line, 'gg2dw')
+    assert editor.toPlainText() == '\nb\nc)\nline 3 (x y)\n'
+    qtbot.keyClicks(cmd_line, 'u')
+    assert editor.toPlainText() == '(a\nb\nc)\nline 3 (x y)\n'
+    # The editor undo stack is used instead of an undo tree
+    assert not vim.vim_cmd.vim_keys._recorders
+    qtbot.keyClicks(cmd_line, 'U')
+    assert cmd_line.placeholderText() == "not available in large file mode"
+    qtbot.keyClicks(cmd_line, 'ggdG')
+    assert editor.toPlainText() == ''
+
+
 def test_cursor_position(vim_bot):
     """Test cursor position"""
     main, editor_stack, editor, vim, qtbot = vim_bot
@@ -295,27 +453,27 @@ def test_percent_command_char_mode(vim_bot):
     qtbot.keyClicks(editor, '(aa{bbb[test]bbb}aa)')
     qtbot.keyClicks(cmd_line, '^')
     qtbot.keyClicks(cmd_line, 'v%y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == '(aa{bbb[test]bbb}aa)'
     qtbot.keyClicks(cmd_line, '$')
     qtbot.keyClicks(cmd_line, 'v%y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == '(aa{bbb[test]bbb}aa)'
     qtbot.keyClicks(cmd_line, '^7l')
     qtbot.keyClicks(cmd_line, 'v%y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == '[test]'
     qtbot.keyClicks(cmd_line, '^12l')
     qtbot.keyClicks(cmd_line, 'v%y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == '[test]'
     qtbot.keyClicks(cmd_line, '^3l')
     qtbot.keyClicks(cmd_line, 'v%y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == '{bbb[test]bbb}'
     qtbot.keyClicks(cmd_line, '$3h')
     qtbot.keyClicks(cmd_line, 'v%y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == '{bbb[test]bbb}'
     
 
@@ -329,7 +487,7 @@ def test_select_command_brackets(vim_bot):
     qtbot.keyClicks(editor, '(aa(bbb[test]bbb)aa)')
     qtbot.keyClicks(cmd_line, '$h')
     qtbot.keyClicks(cmd_line, 'va(y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == '(aa(bbb[test]bbb)aa)'
 
 
@@ -343,7 +501,7 @@ def test_select_command_brackets(vim_bot):
     qtbot.keyClicks(editor, '(aa(bbb[test]bbb)aa)')
     qtbot.keyClicks(cmd_line, '$h')
     qtbot.keyClicks(cmd_line, 'vi(y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == 'aa(bbb[test]bbb)aa'
 
 
@@ -357,7 +515,7 @@ def test_a_command_open_bracket(vim_bot):
     qtbot.keyClicks(editor, '(test)')
     qtbot.keyClicks(cmd_line, '2h')
     qtbot.keyClicks(cmd_line, 'va(y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == '(test)'
 
 
@@ -371,7 +529,7 @@ def test_a_command_close_bracket(vim_bot):
     qtbot.keyClicks(editor, '(test)')
     qtbot.keyClicks(cmd_line, '2h')
     qtbot.keyClicks(cmd_line, 'va)y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == '(test)'
 
 
@@ -385,7 +543,7 @@ def test_a_command_open_square_bracket(vim_bot):
     qtbot.keyClicks(editor, '[test]')
     qtbot.keyClicks(cmd_line, '2h')
     qtbot.keyClicks(cmd_line, 'va[y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == '[test]'
 
 
@@ -399,7 +557,7 @@ def test_a_command_close_square_bracket(vim_bot):
     qtbot.keyClicks(editor, '[test]')
     qtbot.keyClicks(cmd_line, '2h')
     qtbot.keyClicks(cmd_line, 'va]y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == '[test]'
 
 
@@ -413,7 +571,7 @@ def test_a_command_open_angle_bracket(vim_bot):
     qtbot.keyClicks(editor, '<test>')
     qtbot.keyClicks(cmd_line, '2h')
     qtbot.keyClicks(cmd_line, 'va<y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == '<test>'
 
 
@@ -427,7 +585,7 @@ def test_a_command_close_angle_bracket(vim_bot):
     qtbot.keyClicks(editor, '<test>')
     qtbot.keyClicks(cmd_line, '2h')
     qtbot.keyClicks(cmd_line, 'va>y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == '<test>'
 
 
@@ -441,7 +599,7 @@ def test_a_command_open_curly_bracket(vim_bot):
     qtbot.keyClicks(editor, '{test}')
     qtbot.keyClicks(cmd_line, '2h')
     qtbot.keyClicks(cmd_line, 'va{y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == '{test}'
 
 
@@ -455,7 +613,7 @@ def test_a_command_close_curly_bracket(vim_bot):
     qtbot.keyClicks(editor, '{test}')
     qtbot.keyClicks(cmd_line, '2h')
     qtbot.keyClicks(cmd_line, 'va}y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == '{test}'
 
 
@@ -469,7 +627,7 @@ def test_a_command_double_quote(vim_bot):
     qtbot.keyClicks(editor, '"test"')
     qtbot.keyClicks(cmd_line, '2h')
     qtbot.keyClicks(cmd_line, 'va"y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == '"test"'
 
 
@@ -483,7 +641,7 @@ def test_a_command_single_quote(vim_bot):
     qtbot.keyClicks(editor, '\'test\'')
     qtbot.keyClicks(cmd_line, '2h')
     qtbot.keyClicks(cmd_line, 'va\'y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == '\'test\''
 
 
@@ -497,7 +655,7 @@ def test_i_command_open_bracket(vim_bot):
     qtbot.keyClicks(editor, '(test)')
     qtbot.keyClicks(cmd_line, '2h')
     qtbot.keyClicks(cmd_line, 'vi(y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == 'test'
 
 
@@ -511,7 +669,7 @@ def test_i_command_close_bracket(vim_bot):
     qtbot.keyClicks(editor, '(test)')
     qtbot.keyClicks(cmd_line, '2h')
     qtbot.keyClicks(cmd_line, 'vi)y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == 'test'
 
 
@@ -525,7 +683,7 @@ def test_i_command_open_square_bracket(vim_bot):
     qtbot.keyClicks(editor, '[test]')
     qtbot.keyClicks(cmd_line, '2h')
     qtbot.keyClicks(cmd_line, 'vi[y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == 'test'
 
 
@@ -539,7 +697,7 @@ def test_i_command_close_square_bracket(vim_bot):
     qtbot.keyClicks(editor, '[test]')
     qtbot.keyClicks(cmd_line, '2h')
     qtbot.keyClicks(cmd_line, 'vi]y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == 'test'
 
 
@@ -553,7 +711,7 @@ def test_i_command_open_angle_bracket(vim_bot):
     qtbot.keyClicks(editor, '<test>')
     qtbot.keyClicks(cmd_line, '2h')
     qtbot.keyClicks(cmd_line, 'vi<y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == 'test'
 
 
@@ -567,7 +725,7 @@ def test_i_command_close_angle_bracket(vim_bot):
     qtbot.keyClicks(editor, '<test>')
     qtbot.keyClicks(cmd_line, '2h')
     qtbot.keyClicks(cmd_line, 'vi>y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == 'test'
 
 
@@ -581,7 +739,7 @@ def test_i_command_open_curly_bracket(vim_bot):
     qtbot.keyClicks(editor, '{test}')
     qtbot.keyClicks(cmd_line, '2h')
     qtbot.keyClicks(cmd_line, 'vi{y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == 'test'
 
 
@@ -595,7 +753,7 @@ def test_i_command_close_curly_bracket(vim_bot):
     qtbot.keyClicks(editor, '{test}')
     qtbot.keyClicks(cmd_line, '2h')
     qtbot.keyClicks(cmd_line, 'vi}y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == 'test'
 
 
@@ -609,7 +767,7 @@ def test_i_command_double_quote(vim_bot):
     qtbot.keyClicks(editor, '"test"')
     qtbot.keyClicks(cmd_line, '2h')
     qtbot.keyClicks(cmd_line, 'vi"y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == 'test'
 
 
@@ -623,7 +781,7 @@ def test_i_command_single_quote(vim_bot):
     qtbot.keyClicks(editor, '\'test\'')
     qtbot.keyClicks(cmd_line, '2h')
     qtbot.keyClicks(cmd_line, 'vi\'y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == 'test'
 
 
@@ -637,7 +795,7 @@ def test_i_command_bracket_negative(vim_bot):
     qtbot.keyClicks(editor, '(test(fgfg)')
     qtbot.keyClicks(cmd_line, '8h')
     qtbot.keyClicks(cmd_line, 'vi\'y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == 's'
 
 
@@ -828,7 +986,7 @@ def test_w_shortchut_char_mode(vim_bot):
     editor.stdkey_backspace()
     cmd_line = vim.get_focus_widget()
     qtbot.keyClicks(cmd_line, 'v2wy')
-    clipboard = QApplication.clipboard().text().replace('\u2029', '\n')
+    clipboard = clipboard_text().replace('\u2029', '\n')
     assert clipboard == 'line 1\nl'  
 
 
@@ -853,7 +1011,7 @@ def test_b_shortchut_char_mode(vim_bot):
     editor.moveCursor(QTextCursor.StartOfLine, QTextCursor.KeepAnchor)
     cmd_line = vim.get_focus_widget()
     qtbot.keyClicks(cmd_line, 'v2byp')
-    clipboard = QApplication.clipboard().text().replace('\u2029', '\n')
+    clipboard = clipboard_text().replace('\u2029', '\n')
     assert clipboard == 'line 1\nl'  
 
 
@@ -878,7 +1036,7 @@ def test_e_shortchut_char_mode(vim_bot):
     editor.moveCursor(QTextCursor.StartOfLine, QTextCursor.KeepAnchor)
     cmd_line = vim.get_focus_widget()
     qtbot.keyClicks(cmd_line, 'v3ey')
-    clipboard = QApplication.clipboard().text().replace('\u2029', '\n')
+    clipboard = clipboard_text().replace('\u2029', '\n')
     assert clipboard == 'line 2\nline'  
 
 
@@ -1287,6 +1445,517 @@ def test_u_command(vim_bot):
     assert new_col == col - len('spam')
 
 
+def test_u_command_repeat(vim_bot):
+    """Undo several vim commands at once."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.go_to_line(2)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, 'x')
+    qtbot.keyClicks(cmd_line, 'x')
+    qtbot.keyClicks(cmd_line, 'x')
+    assert editor.toPlainText().splitlines()[1] == 'e 1'
+    qtbot.keyClicks(cmd_line, '2u')
+    assert editor.toPlainText().splitlines()[1] == 'ine 1'
+    qtbot.keyClick(cmd_line, Qt.Key_R, Qt.ControlModifier)
+    assert editor.toPlainText().splitlines()[1] == 'ne 1'
+
+
+def test_undo_tree_branches(vim_bot):
+    """Walk undo branches chronologically with g- and g+."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.go_to_line(2)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, 'x')
+    qtbot.keyClicks(cmd_line, 'x')
+    qtbot.keyClicks(cmd_line, 'u')
+    qtbot.keyClicks(cmd_line, '$')
+    qtbot.keyClicks(cmd_line, 'x')
+    lines = []
+    for command in ['g-', 'g-', 'g+', 'g+']:
+        qtbot.keyClicks(cmd_line, command)
+        lines.append(editor.toPlainText().splitlines()[1])
+    assert lines == ['ne 1', 'ine 1', 'ne 1', 'ine ']
+
+
+def test_undo_tree_without_snapshot(vim_bot, monkeypatch):
+    """Record the changes of each command without copying the document."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    text = editor.toPlainText()
+    editor.go_to_line(2)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, 'x')
+    copies = []
+    text_method = vim_widgets.CodeEditorAdapter.text
+    monkeypatch.setattr(vim_widgets.CodeEditorAdapter, "text",
+                        lambda adapter: copies.append(adapter) or text_method(
+                            adapter))
+    qtbot.keyClicks(cmd_line, 'dd')
+    qtbot.keyClicks(cmd_line, 'i')
+    qtbot.keyClicks(editor, 'spam')
+    assert editor.toPlainText().splitlines()[1] == 'spamline 2'
+    qtbot.keyClicks(cmd_line, '3u')
+    assert editor.toPlainText() == text
+    qtbot.keyClicks(cmd_line, '2')
+    qtbot.keyClick(cmd_line, Qt.Key_R, Qt.ControlModifier)
+    assert editor.toPlainText().splitlines()[1] == 'line 2'
+    assert not copies
+
+
+def test_earlier_later_commands(vim_bot):
+    """Travel in the undo tree with :earlier and :later."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    text = editor.toPlainText()
+    editor.go_to_line(2)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, 'dd')
+    qtbot.keyClicks(cmd_line, 'x')
+    changed_text = editor.toPlainText()
+    qtbot.keyClicks(cmd_line, ':earlier 1m')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert editor.toPlainText() == text
+    qtbot.keyClicks(cmd_line, ':later 1')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert editor.toPlainText() != text
+    qtbot.keyClicks(cmd_line, ':later 1h')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert editor.toPlainText() == changed_text
+
+
+def test_perf_command(vim_bot, capsys):
+    """Record the latency of the commands with :perf."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.go_to_line(2)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':perf on')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    qtbot.keyClicks(cmd_line, 'jjdwd}')
+    qtbot.keyClicks(cmd_line, ':perf')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    report = capsys.readouterr().out.splitlines()
+    rows = {line.split()[0]: line.split() for line in report[1:]}
+    assert rows["j"][1] == "2"
+    assert rows["dw"][1] == "1"
+    assert rows["d}"][1] == "1"
+    assert ":perf" not in rows
+    # Calls of editor.set_extra_selections made by j
+    assert float(rows["j"][7]) >= 1
+    qtbot.keyClicks(cmd_line, ':perf reset')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert vim.vim_cmd.perf.handlers == {}
+    qtbot.keyClicks(cmd_line, ':perf off')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    qtbot.keyClicks(cmd_line, 'j')
+    assert vim.vim_cmd.perf.handlers == {}
+    assert "set_extra_selections" not in vars(editor)
+
+
+def test_profile_command(vim_bot, tmpdir):
+    """Capture a profile and a trace of the key handling with :profile."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    path = str(tmpdir.join("keys.prof"))
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':profile start ' + path)
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    qtbot.keyClicks(cmd_line, 'jdw')
+    qtbot.keyClicks(cmd_line, ':profile stop')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert vim.vim_cmd.perf.profiler is None
+    assert osp.isfile(path)
+    with open(str(tmpdir.join("keys.json"))) as f:
+        events = json.load(f)["traceEvents"]
+    spans = {(event["cat"], event["name"]) for event in events}
+    assert {("key", "j"), ("key", "d"), ("command", "j"),
+            ("command", "dw"), ("overlay", "set_extra_selections")} <= spans
+    assert "set_extra_selections" not in vars(editor)
+
+
+@pytest.mark.parametrize("command, text, line", [
+    (":2,3d", "   123\nline 3\nline 4\n", 1),
+    (":%>", "       123\n    line 1\n    line 2\n    line 3\n    line 4\n",
+     5),
+    (":2;+1m0", "line 1\nline 2\n   123\nline 3\nline 4\n", 1),
+    (":1t$", "   123\nline 1\nline 2\nline 3\nline 4\n\n   123", 6),
+    (":/3/,$-1j", "   123\nline 1\nline 2\nline 3 line 4\n", 3),
+    (":.,.+1<", "123\nline 1\nline 2\nline 3\nline 4\n", 1),
+    (":2,3norm Ax", "   123\nline 1x\nline 2x\nline 3\nline 4\n", 2),
+    (":%norm dd", "", 0),
+    (":3", "   123\nline 1\nline 2\nline 3\nline 4\n", 2),
+])
+def test_range_commands(vim_bot, command, text, line):
+    """Run the range commands as one document change."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.go_to_line(1)
+    changes = []
+    editor.document().contentsChange.connect(
+        lambda *args: changes.append(args))
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, command)
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert editor.toPlainText() == text
+    assert editor.textCursor().blockNumber() == line
+    if "norm" not in command:
+        assert len(changes) <= 1
+    if command != ":3":
+        qtbot.keyClicks(cmd_line, 'u')
+        assert editor.toPlainText() == ("   123\nline 1\nline 2\nline 3\n"
+                                        "line 4\n")
+
+
+def test_range_registers(vim_bot):
+    """Yank and delete ranges into registers."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':2,3y a')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    qtbot.keyClicks(cmd_line, ':$-1d')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    registers = vim.vim_cmd.vim_keys.registers
+    assert registers.get("a").text == "line 1\nline 2\n"
+    assert registers.get("unnamed").text == "line 4\n"
+    assert editor.toPlainText() == "   123\nline 1\nline 2\nline 3\n"
+
+
+def test_visual_range(vim_bot):
+    """Type : in visual mode to run a command on the selected lines."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.go_to_line(2)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, 'Vj:')
+    assert cmd_line.text() == ":'<,'>"
+    qtbot.keyClicks(cmd_line, '>')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert not vim.vim_cmd.vim_keys.visual_mode
+    assert editor.toPlainText().splitlines()[1:4] == [
+        "    line 1", "    line 2", "line 3"]
+    qtbot.keyClicks(cmd_line, ":'<,'>d")
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert editor.toPlainText() == "   123\nline 3\nline 4\n"
+
+
+@pytest.mark.parametrize("command, message", [
+    (":9d", "invalid range"),
+    (":'zd", "mark not set"),
+    (":1,2m1", "into itself"),
+    (":2w", "no range allowed"),
+    (":d 3 x", "trailing characters"),
+])
+def test_range_errors(vim_bot, capsys, command, message):
+    """Report invalid ranges and arguments without changing the text."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, command)
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert message in capsys.readouterr().out
+    assert message in cmd_line.placeholderText()
+    assert editor.toPlainText() == ("   123\nline 1\nline 2\nline 3\n"
+                                    "line 4\n")
+
+
+def test_shift_large_range(vim_bot):
+    """Shift 50k lines with one document change."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.set_text("".join("line %d\n" % i for i in range(50000)))
+    changes = []
+    editor.document().contentsChange.connect(
+        lambda *args: changes.append(args))
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':%>')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert len(changes) == 1
+    lines = editor.toPlainText().split("\n")
+    assert lines[0] == "    line 0" and lines[49999] == "    line 49999"
+
+
+@pytest.mark.parametrize("command, text, message", [
+    (":%s/line/row/", "   123\nrow 1\nrow 2\nrow 3\nrow 4\n",
+     "4 substitutions on 4 lines"),
+    (":2,3s/\\w/<&>/g", "   123\n<l><i><n><e> <1>\n<l><i><n><e> <2>\nline 3\n"
+     "line 4\n", "10 substitutions on 2 lines"),
+    (":%s/(\\w+) (\\d)/\\u\\2 \\U\\1/", "   123\n1 LINE\n2 LINE\n3 LINE\n"
+     "4 LINE\n", "4 substitutions on 4 lines"),
+    (":2s/LINE/x/gi 2", "   123\nx 1\nx 2\nline 3\nline 4\n",
+     "2 substitutions on 2 lines"),
+    (":%s/e/x/gn", "   123\nline 1\nline 2\nline 3\nline 4\n",
+     "4 matches on 4 lines"),
+    (":%s/missing/x/", "   123\nline 1\nline 2\nline 3\nline 4\n",
+     "pattern not found: missing"),
+    (":%s/\\s+/_/g", "_123\nline_1\nline_2\nline_3\nline_4\n",
+     "5 substitutions on 5 lines"),
+])
+def test_substitute_command(vim_bot, capsys, command, text, message):
+    """Replace patterns with :s as one document change."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    changes = []
+    editor.document().contentsChange.connect(
+        lambda *args: changes.append(args))
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, command)
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert editor.toPlainText() == text
+    assert len(changes) <= 1
+    assert message in capsys.readouterr().out
+    assert cmd_line.placeholderText() == message
+    qtbot.keyClicks(cmd_line, 'j')
+    assert cmd_line.placeholderText() == ""
+
+
+def test_substitute_repeat(vim_bot):
+    """Repeat the last substitute with :s, ~ and an empty pattern."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.go_to_line(2)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':s/line/[&]/')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert editor.toPlainText().splitlines()[1] == "[line] 1"
+    assert editor.textCursor().blockNumber() == 1
+    qtbot.keyClicks(cmd_line, ':+1s')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert editor.toPlainText().splitlines()[2] == "[line] 2"
+    qtbot.keyClicks(cmd_line, ':+1s/ne/~~/')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert editor.toPlainText().splitlines()[3] == "li[ne][ne] 3"
+    qtbot.keyClicks(cmd_line, '/4')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    qtbot.keyClicks(cmd_line, ':%s//four/')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert editor.toPlainText().splitlines()[4] == "line four"
+
+
+@pytest.mark.parametrize("command, text, line", [
+    (":g/line [13]/d", "   123\nline 2\nline 4\n", 2),
+    (":v/line/d", "line 1\nline 2\nline 3\nline 4", 3),
+    (":g!/line/d", "line 1\nline 2\nline 3\nline 4", 3),
+    (":2,4g/line/m0", "line 3\nline 2\nline 1\n   123\nline 4\n", 0),
+    (":g/line/m$", "   123\n\nline 1\nline 2\nline 3\nline 4", 5),
+    (":g/[12]$/t.", "   123\nline 1\nline 1\nline 2\nline 2\nline 3\n"
+     "line 4\n", 4),
+    (":g/line/j", "   123\nline 1 line 2\nline 3 line 4\n", 2),
+    (":g/line/s/ /\\r/", "   123\nline\n1\nline\n2\nline\n3\nline\n4\n",
+     8),
+    (":g/2$/norm Ax", "   123\nline 1\nline 2x\nline 3\nline 4\n", 2),
+    (":g/line/>", "   123\n    line 1\n    line 2\n    line 3\n"
+     "    line 4\n", 4),
+    (":g/3/", "   123\nline 1\nline 2\nline 3\nline 4\n", 3),
+])
+def test_global_commands(vim_bot, command, text, line):
+    """Run commands on the marked lines with :g and :v, in one undo step."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, command)
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert editor.toPlainText() == text
+    assert editor.textCursor().blockNumber() == line
+    if not command.endswith("/"):
+        qtbot.keyClicks(cmd_line, 'u')
+        assert editor.toPlainText() == ("   123\nline 1\nline 2\nline 3\n"
+                                        "line 4\n")
+
+
+def test_global_blank_lines(vim_bot):
+    """Do not mark a blank line before a matching line."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.set_text("x = 1\n\n    # comment\ny = 2\n")
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':g/^\\s*#/d')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert editor.toPlainText() == "x = 1\n\ny = 2\n"
+
+
+def test_global_errors(vim_bot):
+    """Report missing patterns and nested :g."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':g/missing/d')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert cmd_line.placeholderText() == "pattern not found: missing"
+    with pytest.raises(ValueError):
+        vim.vim_cmd.vim_commands.global_("/line/g/1/d", (0, 5))
+    assert editor.toPlainText() == "   123\nline 1\nline 2\nline 3\nline 4\n"
+
+
+def test_global_large_file(vim_bot):
+    """Delete the comments of 100k lines in one undo step."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    text = "".join("# comment %d\nx = %d\n" % (i, i) for i in range(50000))
+    editor.set_text(text)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':g/^\\s*#/d')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    lines = editor.toPlainText().split("\n")
+    assert len(lines) == 50001
+    assert lines[0] == "x = 0" and lines[49999] == "x = 49999"
+    qtbot.keyClicks(cmd_line, 'u')
+    assert editor.toPlainText() == text
+
+
+@pytest.mark.parametrize("command, text", [
+    (":sort!", "line 4\nline 3\nline 2\nline 1\n   123\n"),
+    (":2,5sort! n", "   123\nline 4\nline 3\nline 2\nline 1\n"),
+    (":%sor! /\\d/", "   123\nline 4\nline 3\nline 2\nline 1\n"),
+    (":sort nu", "\nline 1\nline 2\nline 3\nline 4\n   123"),
+])
+def test_sort_command(vim_bot, command, text):
+    """Sort lines with one document change and one undo step."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    changes = []
+    editor.document().contentsChange.connect(
+        lambda *args: changes.append(args))
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, command)
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert editor.toPlainText() == text
+    assert len(changes) == 1
+    qtbot.keyClicks(cmd_line, 'u')
+    assert editor.toPlainText() == "   123\nline 1\nline 2\nline 3\nline 4\n"
+
+
+def run_shell(qtbot, vim, command):
+    """Type a command line and wait for its shell command."""
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, command)
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    qtbot.waitUntil(lambda: not vim.vim_cmd.shell.running(), timeout=10000)
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Uses POSIX commands")
+@pytest.mark.parametrize("command, text, line", [
+    (":%!sort -r", "line 4\nline 3\nline 2\nline 1\n   123\n", 0),
+    (":2,3!tr a-z A-Z", "   123\nLINE 1\nLINE 2\nline 3\nline 4\n", 1),
+    (":2!cat", "   123\nline 1\nline 2\nline 3\nline 4\n", 1),
+    (":r !echo '  x'", "   123\n  x\nline 1\nline 2\nline 3\nline 4\n", 1),
+    (":$-1r!printf 'a\\nb'", "   123\nline 1\nline 2\nline 3\nline 4\na\nb\n",
+     5),
+])
+def test_shell_filter(vim_bot, command, text, line):
+    """Filter lines and read the output of commands, in one undo step."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.go_to_line(1)
+    run_shell(qtbot, vim, command)
+    assert editor.toPlainText() == text
+    assert editor.textCursor().blockNumber() == line
+    original = "   123\nline 1\nline 2\nline 3\nline 4\n"
+    if text != original:
+        cmd_line = vim.get_focus_widget()
+        qtbot.keyClicks(cmd_line, 'u')
+        assert editor.toPlainText() == original
+
+
+@pytest.mark.parametrize("keys, command", [
+    ("!!", ":.!"), ("2!!", ":.,.+1!"), ("!j", ":.,.+1!"), ("!k", ":.-1,.!"),
+    ("!G", ":.,.+4!"), ("!ip", ":.-1,.+3!"),
+])
+def test_filter_operator(vim_bot, keys, command):
+    """Open the command line with the lines of !{motion}."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.go_to_line(2)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, keys)
+    assert cmd_line.text() == command
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Uses POSIX commands")
+def test_shell_command(vim_bot):
+    """Show the output and errors of shell commands."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    cmd_line = vim.get_focus_widget()
+    run_shell(qtbot, vim, ":!echo one; echo two")
+    assert cmd_line.placeholderText() == "two"
+    run_shell(qtbot, vim, ":%!echo error >&2; exit 3")
+    assert cmd_line.placeholderText() == "shell returned 3: error"
+    assert editor.toPlainText() == "   123\nline 1\nline 2\nline 3\nline 4\n"
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Uses POSIX commands")
+def test_shell_cancel(vim_bot):
+    """Cancel a running filter with Esc, keep changed lines."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.go_to_line(1)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':%!sleep 10; cat')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert vim.vim_cmd.shell.running()
+    process = vim.vim_cmd.shell._process
+    # The killed process is deleted once it exits, without waiting for it
+    with qtbot.waitSignal(process.destroyed, timeout=5000):
+        qtbot.keyPress(cmd_line, Qt.Key_Escape)
+        assert not vim.vim_cmd.shell.running()
+        assert cmd_line.placeholderText() == "shell command cancelled"
+    qtbot.keyClicks(cmd_line, ':2,3!sleep 0.5; tac')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    qtbot.keyClicks(cmd_line, 'jx')
+    qtbot.waitUntil(lambda: not vim.vim_cmd.shell.running(), timeout=10000)
+    assert cmd_line.placeholderText() == \
+        "lines changed, filter output discarded"
+    assert editor.toPlainText() == "   123\nine 1\nline 2\nline 3\nline 4\n"
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Uses POSIX commands")
+def test_shell_filter_large(vim_bot):
+    """Filter 200k lines without blocking the GUI."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.set_text("".join("line %d\n" % (i % 1000) for i in range(200000)))
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':%!sort -u')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert vim.vim_cmd.shell.running()
+    qtbot.waitUntil(lambda: not vim.vim_cmd.shell.running(), timeout=30000)
+    lines = editor.toPlainText().split("\n")
+    assert len(lines) == 1001
+    assert lines[:2] == ["", "line 0"]
+
+
+def test_view_command(vim_bot, tmpdir):
+    """Page through a file with :view."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    path = tmpdir.join("big.log")
+    path.write("".join("line %d\n" % i for i in range(1000)))
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':view ' + str(path))
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    pager = vim.vim_cmd.findChild(VimPager)
+    pager.pager.index.wait()
+    qtbot.keyClicks(pager, '3j')
+    assert pager.view.toPlainText().startswith('line 3\n')
+    qtbot.keyClicks(pager, '500G')
+    assert pager.pager.line_number() == 499
+    assert 'line 500/1001' in pager.status_label.text()
+    qtbot.keyClicks(pager, '/')
+    qtbot.keyClicks(pager.search_edit, r'^line 7\d\d')
+    qtbot.keyPress(pager.search_edit, Qt.Key_Return)
+    assert pager.view.toPlainText().startswith('line 700\n')
+    qtbot.keyClicks(pager, 'N')
+    assert pager.view.toPlainText().startswith('line 799\n')
+    qtbot.keyClicks(pager, '10gg')
+    assert pager.pager.line_number() == 9
+    qtbot.keyClicks(pager, 'ggk')
+    assert pager.pager.line_number() == 0
+    qtbot.keyClicks(pager, 'q')
+    assert pager.pager.buffer.closed
+
+
+def test_view_missing_file(vim_bot, tmpdir, capsys):
+    """Report files :view cannot open."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':view ' + str(tmpdir.join("missing.log")))
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert "cannot open file" in capsys.readouterr().out
+    assert vim.vim_cmd.findChild(VimPager) is None
+
+
+def test_uppercase_u_command(vim_bot):
+    """Undo all latest changes on one line."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.go_to_line(2)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, 'x')
+    qtbot.keyClicks(cmd_line, 'x')
+    qtbot.keyClicks(cmd_line, 'U')
+    assert editor.toPlainText().splitlines()[1] == 'line 1'
+    qtbot.keyClicks(cmd_line, 'u')
+    assert editor.toPlainText().splitlines()[1] == 'ne 1'
+
+
 def test_d_command(vim_bot):
     """Delete selection."""
     main, editor_stack, editor, vim, qtbot = vim_bot
@@ -1387,6 +2056,84 @@ def test_dw_command(vim_bot):
     assert editor.toPlainText() == "abc5 abc6"
 
 
+def test_operator_paragraph_motion(vim_bot):
+    """Delete paragraphs with d} and a count."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.set_text("a\nb\n\nc\n\nd\n\ne")
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, 'gg')
+    qtbot.keyClicks(cmd_line, 'd}')
+    assert editor.toPlainText() == "\nc\n\nd\n\ne"
+    qtbot.keyClicks(cmd_line, 'j')
+    qtbot.keyClicks(cmd_line, 'd2}')
+    assert editor.toPlainText() == "\n\ne"
+    assert clipboard_text() == "c\n\nd\n"
+
+
+def test_operator_does_not_move_cursor(vim_bot):
+    """Yank a text object without moving the visible cursor."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.set_text("abc1 abc2 abc3 abc4")
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, '0w')
+    moves = []
+    editor.cursorPositionChanged.connect(lambda: moves.append(1))
+    qtbot.keyClicks(cmd_line, 'y2aw')
+    assert vim.vim_cmd.vim_keys.registers.get().text == "abc2 abc3 "
+    assert editor.textCursor().position() == 5
+    assert len(moves) <= 1
+    qtbot.keyClicks(cmd_line, 'd3w')
+    assert editor.toPlainText() == "abc1 "
+    assert len(moves) <= 2
+
+
+def test_operator_text_objects(vim_bot):
+    """Change the case and delete inside brackets and quotes."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.set_text('f(a, "bc d", e)')
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, '0fb')
+    qtbot.keyClicks(cmd_line, 'gUi"')
+    assert editor.toPlainText() == 'f(a, "BC D", e)'
+    qtbot.keyClicks(cmd_line, 'g~iw')
+    assert editor.toPlainText() == 'f(a, "bc D", e)'
+    qtbot.keyClicks(cmd_line, 'di(')
+    assert editor.toPlainText() == 'f()'
+    assert vim.vim_cmd.vim_keys.registers.get().text == 'a, "bc D", e'
+
+
+def test_operator_linewise(vim_bot):
+    """Test linewise operators with counts and motions."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.set_text("a\nb\nc\nd")
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, 'gg')
+    qtbot.keyClicks(cmd_line, '>j')
+    assert editor.toPlainText() == "    a\n    b\nc\nd"
+    qtbot.keyClicks(cmd_line, 'gUG')
+    assert editor.toPlainText() == "    A\n    B\nC\nD"
+    qtbot.keyClicks(cmd_line, 'G')
+    qtbot.keyClicks(cmd_line, 'dk')
+    assert editor.toPlainText() == "    A\n    B"
+    assert vim.vim_cmd.vim_keys.registers.get().text == "C\nD\n"
+    qtbot.keyClicks(cmd_line, 'ck')
+    assert editor.toPlainText() == "    "
+    qtbot.keyClicks(editor, 'x')
+    assert editor.toPlainText() == "    x"
+
+
+def test_operator_undo(vim_bot):
+    """Test that an operator is a single undo step."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.set_text("one two three")
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, '0')
+    qtbot.keyClicks(cmd_line, 'd2e')
+    assert editor.toPlainText() == " three"
+    qtbot.keyClicks(cmd_line, 'u')
+    assert editor.toPlainText() == "one two three"
+
+
 def test_cw_command(vim_bot):
     """Cut words and edit."""
     main, editor_stack, editor, vim, qtbot = vim_bot
@@ -1427,7 +2174,7 @@ def test_y_command(vim_bot):
     qtbot.keyClicks(cmd_line, 'v')
     qtbot.keyClicks(cmd_line, '3l')
     qtbot.keyClicks(cmd_line, 'y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == 'line'
 
 
@@ -1440,7 +2187,7 @@ def test_yy_command(vim_bot):
     cmd_line = vim.get_focus_widget()
     qtbot.keyClicks(cmd_line, 'V')
     qtbot.keyClicks(cmd_line, 'yy')
-    clipboard = QApplication.clipboard().text().replace('\u2029', '\n')
+    clipboard = clipboard_text().replace('\u2029', '\n')
     assert clipboard[:-1] == 'line 2'
 
 
@@ -1452,7 +2199,7 @@ def test_yy_no_visual_command(vim_bot):
     editor.moveCursor(QTextCursor.StartOfLine, QTextCursor.KeepAnchor)
     cmd_line = vim.get_focus_widget()
     qtbot.keyClicks(cmd_line, 'yy')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard[:-1] == 'line 2'
 
 
@@ -1464,7 +2211,7 @@ def test_yw_command(vim_bot):
     editor.moveCursor(QTextCursor.StartOfLine, QTextCursor.KeepAnchor)
     cmd_line = vim.get_focus_widget()
     qtbot.keyClicks(cmd_line, 'yw')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == 'line'
 
 
@@ -1478,7 +2225,7 @@ def test_ydollar_command(vim_bot):
     qtbot.keyPress(editor, Qt.Key_Right)
     cmd_line = vim.get_focus_widget()
     qtbot.keyClicks(cmd_line, 'y$')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == 'ne 2'
 
 
@@ -1605,6 +2352,34 @@ def test_p_command_line_mode_line_selection(vim_bot):
     assert text == expected_text
 
 
+def test_p_command_streamed(vim_bot, monkeypatch):
+    """Paste a large count in chunks as a single undo step."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    monkeypatch.setattr(vim_widgets, "PASTE_STREAM_SIZE", 10)
+    monkeypatch.setattr(vim_widgets, "PASTE_CHUNK_SIZE", 4)
+    editor.stdkey_backspace()
+    editor.go_to_line(3)
+    editor.moveCursor(QTextCursor.StartOfLine, QTextCursor.KeepAnchor)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, 'Vy')
+    qtbot.keyClicks(cmd_line, '10p')
+    text = editor.toPlainText()
+    expected_text = ('   123\n'
+                     'line 1\n'
+                     'line 2\n'
+                     + 'line 2\n' * 10 +
+                     'line 3\n'
+                     'line 4')
+    assert text == expected_text
+    assert vim.vim_cmd.status_label.text() == "NORMAL"
+    qtbot.keyClicks(cmd_line, 'u')
+    assert editor.toPlainText() == ('   123\n'
+                                    'line 1\n'
+                                    'line 2\n'
+                                    'line 3\n'
+                                    'line 4')
+
+
 def test_numbered_register(vim_bot):
     """Test numbered register."""
     main, editor_stack, editor, vim, qtbot = vim_bot
@@ -1759,6 +2534,122 @@ def test_normal_registers_line_mode(vim_bot):
     assert text == expected_text
 
 
+def test_unnamed_register_after_named_yank(vim_bot):
+    """Test that p pastes the last yank even when it used a named register."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.stdkey_backspace()
+    editor.go_to_line(1)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, 'yy')
+    qtbot.keyClicks(cmd_line, 'j')
+    qtbot.keyClicks(cmd_line, '\"ayy')
+    qtbot.keyClicks(cmd_line, 'p')
+    text = editor.toPlainText()
+    expected_text = ('   123\n'
+                     'line 1\n'
+                     'line 1\n'
+                     'line 2\n'
+                     'line 3\n'
+                     'line 4')
+    assert text == expected_text
+
+
+def test_marks(vim_bot):
+    """Test setting marks and jumping to them."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.go_to_line(3)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, '3lma')
+    qtbot.keyClicks(cmd_line, 'gg')
+    qtbot.keyClicks(cmd_line, '`a')
+    assert editor.get_cursor_line_column() == (2, 3)
+    qtbot.keyClicks(cmd_line, 'gg')
+    qtbot.keyClicks(cmd_line, "'a")
+    assert editor.get_cursor_line_column() == (2, 0)
+
+
+def test_jump_list(vim_bot):
+    """Test going back and forth in the jump list."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.go_to_line(2)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, 'G')
+    last_line = editor.get_cursor_line_column()[0]
+    qtbot.keyClicks(cmd_line, 'gg')
+    qtbot.keyClick(cmd_line, Qt.Key_O, Qt.ControlModifier)
+    assert editor.get_cursor_line_column()[0] == last_line
+    qtbot.keyClick(cmd_line, Qt.Key_O, Qt.ControlModifier)
+    assert editor.get_cursor_line_column()[0] == 1
+    qtbot.keyClick(cmd_line, Qt.Key_I, Qt.ControlModifier)
+    assert editor.get_cursor_line_column()[0] == last_line
+
+
+def test_state_saved_across_sessions(vim_bot):
+    """Test that registers and search are restored by a new session."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.go_to_line(2)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, '\"ayy')
+    qtbot.keyClicks(cmd_line, '/line 3\r')
+    vim.on_close()
+
+    vim_new = VimTesting(main)
+    vim_new.vim_cmd.viminfo.dirname = vim.vim_cmd.viminfo.dirname
+    cmd_line = vim_new.get_focus_widget()
+    editor.go_to_line(1)
+    qtbot.keyClicks(cmd_line, 'n')
+    assert editor.get_cursor_line_column()[0] == 3
+    qtbot.keyClicks(cmd_line, '\"aP')
+    assert editor.toPlainText().splitlines()[3] == 'line 1'
+
+
+def test_clipboard_register(vim_bot):
+    """Test yanking to and pasting from the "+ register."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    QApplication.clipboard().setText('spam')
+    editor.go_to_line(2)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, '\"+P')
+    assert editor.toPlainText().splitlines()[1] == 'spamline 1'
+    qtbot.keyClicks(cmd_line, 'j\"+yy')
+    assert clipboard_text() == 'line 2\n'
+    qtbot.keyClicks(cmd_line, '\"+p')
+    assert editor.toPlainText().splitlines()[3] == 'line 2'
+
+
+def test_clipboard_option(vim_bot):
+    """Test that clipboard=none stops mirroring yanks to the clipboard."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    QApplication.clipboard().setText('spam')
+    editor.go_to_line(2)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':set clipboard=none')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    qtbot.keyClicks(cmd_line, 'yy')
+    assert clipboard_text() == 'spam'
+    qtbot.keyClicks(cmd_line, ':set clipboard=unnamedplus')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    qtbot.keyClicks(cmd_line, 'yy')
+    assert clipboard_text() == 'line 1\n'
+
+
+def test_clipboard_write_deduplicated(vim_bot):
+    """Test that yanking the same text twice writes the clipboard once."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.go_to_line(2)
+    cmd_line = vim.get_focus_widget()
+    changes = []
+    on_change = lambda: changes.append(1)
+    QApplication.clipboard().dataChanged.connect(on_change)
+    qtbot.keyClicks(cmd_line, 'yy')
+    clipboard_text()
+    qtbot.keyClicks(cmd_line, 'yy')
+    qtbot.keyClicks(cmd_line, 'yy')
+    clipboard_text()
+    QApplication.clipboard().dataChanged.disconnect(on_change)
+    assert len(changes) == 1
+
+
 def test_uppercase_zz_command(vim_bot):
     """Save and close file."""
     main, editor_stack, editor, vim, qtbot = vim_bot
@@ -1805,27 +2696,482 @@ def test_wq_command(vim_bot):
 
 
 def test_e_command_no_args(vim_bot):
-    """Reload file."""
+    """Reload file, discarding changes only with !."""
     main, editor_stack, editor, vim, qtbot = vim_bot
     original_state = editor.toPlainText()
     editor.stdkey_backspace()
+    changed_state = editor.toPlainText()
     editor.go_to_line(3)
     cmd_line = vim.get_focus_widget()
     qtbot.keyClicks(cmd_line, ':e')
     qtbot.keyPress(cmd_line, Qt.Key_Return)
-    state = editor.toPlainText()
-    assert original_state == state
+    assert editor.toPlainText() == changed_state
+    assert cmd_line.placeholderText() == \
+        "no write since last change (add ! to override)"
+    qtbot.keyClicks(cmd_line, ':e!')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert editor.toPlainText() == original_state
+    assert not editor.document().isModified()
 
 
 def test_e_command_args(vim_bot):
-    """Reload and open file."""
+    """Open a file, leaving a modified file only with !."""
     main, editor_stack, editor, vim, qtbot = vim_bot
+    original_state = editor.toPlainText()
     editor.stdkey_backspace()
     editor.go_to_line(3)
     cmd_line = vim.get_focus_widget()
     qtbot.keyClicks(cmd_line, ':e .')
     qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert not main.editor.open_action.trigger.called
+    assert cmd_line.placeholderText() == \
+        "no write since last change (add ! to override)"
+    qtbot.keyClicks(cmd_line, ':e! .')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
     main.editor.open_action.trigger.assert_called_once_with()
+    assert editor.toPlainText() == original_state
+
+
+@pytest.fixture
+def project_bot(vim_bot, tmpdir, monkeypatch):
+    """Run in a project directory, with the loads of the editor mocked."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    for path in ["setup.py", "pkg/mod.py", "pkg/sub/mod.py", "docs/conf.py"]:
+        tmpdir.join("project", path).write("", ensure=True)
+    monkeypatch.chdir(tmpdir.join("project"))
+    main.editor.load = Mock()
+    main.editor.new = Mock()
+    # New files are modified, :e would not leave them
+    editor.document().setModified(False)
+    return vim_bot
+
+
+@pytest.mark.parametrize("command, path", [
+    (':e setup.py', "setup.py"),
+    (':e! pkg/mod.py', "pkg/mod.py"),
+    (':edit sub/mod.py', "pkg/sub/mod.py"),
+    (':e conf.py', "docs/conf.py"),
+    (':tabe conf.py', "docs/conf.py"),
+])
+def test_edit_file(project_bot, command, path):
+    """Open files by path or by name, once the project is indexed."""
+    main, editor_stack, editor, vim, qtbot = project_bot
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, command)
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    qtbot.waitUntil(lambda: main.editor.load.called)
+    main.editor.load.assert_called_once_with(
+        osp.join(os.getcwd(), osp.normpath(path)))
+
+
+def test_edit_file_errors(project_bot, capsys):
+    """Report names matching several files, create missing files."""
+    main, editor_stack, editor, vim, qtbot = project_bot
+    vim.vim_cmd.files.index().wait()
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':e mod.py')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert "2 files match mod.py" in capsys.readouterr().out
+    qtbot.keyClicks(cmd_line, ':e pkg')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert "is a directory" in capsys.readouterr().out
+    qtbot.keyClicks(cmd_line, ':e new.py')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    main.editor.new.assert_called_once_with(
+        fname=osp.join(os.getcwd(), "new.py"))
+    assert not main.editor.load.called
+
+
+def test_edit_file_modified(project_bot):
+    """Leave a modified file for another one only with :e!."""
+    main, editor_stack, editor, vim, qtbot = project_bot
+    vim.vim_cmd.files.index().wait()
+    editor.stdkey_backspace()
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':e setup.py')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert cmd_line.placeholderText() == \
+        "no write since last change (add ! to override)"
+    assert not main.editor.load.called
+    qtbot.keyClicks(cmd_line, ':e! setup.py')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    main.editor.load.assert_called_once_with(
+        osp.join(os.getcwd(), "setup.py"))
+
+
+def test_edit_file_changes(project_bot, tmpdir):
+    """Find the files added after the project was indexed."""
+    main, editor_stack, editor, vim, qtbot = project_bot
+    files = vim.vim_cmd.files
+    files.index().wait()
+    qtbot.waitUntil(lambda: len(files._watcher.directories()) == 4)
+    tmpdir.join("project", "pkg", "sub", "late.py").write("")
+    qtbot.waitUntil(lambda: bool(files.index().find("late.py")),
+                    timeout=5000)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':e late.py')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    main.editor.load.assert_called_once_with(
+        osp.join(os.getcwd(), "pkg", "sub", "late.py"))
+
+
+def test_edit_large_file(project_bot, tmpdir, monkeypatch):
+    """Read large files in a thread before loading them."""
+    main, editor_stack, editor, vim, qtbot = project_bot
+    monkeypatch.setattr(vim_widgets, "READ_AHEAD_SIZE", 10)
+    tmpdir.join("project", "big.txt").write("x" * 100)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':e big.txt')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert not main.editor.load.called
+    assert vim.vim_cmd.status_label.text() == "loading big.txt"
+    qtbot.waitUntil(lambda: main.editor.load.called)
+    main.editor.load.assert_called_once_with(osp.join(os.getcwd(),
+                                                      "big.txt"))
+
+
+def test_split_file(project_bot):
+    """Split the editor, and open a file in the new split."""
+    main, editor_stack, editor, vim, qtbot = project_bot
+    split = Mock()
+    editor_stack.sig_split_vertically.connect(split)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':sp')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert split.call_count == 1
+    qtbot.keyClicks(cmd_line, ':sp setup.py')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert split.call_count == 2
+    main.editor.load.assert_called_once_with(osp.join(os.getcwd(),
+                                                      "setup.py"))
+    qtbot.keyClicks(cmd_line, ':tabe')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    main.editor.new_action.trigger.assert_called_once_with()
+
+
+@pytest.fixture
+def split_bot(vim_bot):
+    """Split the editor: foo.txt on the left, two splits on the right."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    root = QSplitter(Qt.Horizontal)
+    right = QSplitter(Qt.Vertical)
+    root.addWidget(editor_stack)
+    root.addWidget(right)
+    stacks = [editor_stack]
+    for name in ['bar.txt', 'baz.txt']:
+        stack = EditorStack(None, [])
+        stack.set_find_widget(Mock())
+        stack.set_io_actions(Mock(), Mock(), Mock(), Mock())
+        stack.new(osp.join(LOCATION, name), 'utf-8', 'line\n')
+        stack.set_closable(True)
+        # Disconnected when the split is closed
+        stack.analysis_timer.timeout.connect(stack.analyze_script)
+        right.addWidget(stack)
+        stacks.append(stack)
+    main.editor.layout().addWidget(root)
+    main.editor.editorsplitter = root
+    main.resize(800, 600)
+    main.show()
+    qtbot.waitExposed(main)
+    return main, stacks, vim, qtbot
+
+
+def ctrl_w(qtbot, cmd_line, key):
+    """Type Ctrl-W followed by key."""
+    qtbot.keyPress(cmd_line, Qt.Key_W, Qt.ControlModifier)
+    qtbot.keyClicks(cmd_line, key)
+
+
+def test_split_move(split_bot):
+    """Move between the splits with Ctrl-W h, j, k, l, w, W and p."""
+    main, stacks, vim, qtbot = split_bot
+    cmd_line = vim.get_focus_widget()
+    windows = vim.vim_cmd.windows
+    assert windows.editorstack() is stacks[0]
+    for count, key, index in [('', 'l', 1), ('', 'j', 2), ('', 'k', 1),
+                              ('', 'h', 0), ('', 'p', 1), ('', 'w', 2),
+                              ('', 'w', 0), ('', 'W', 2), ('2', 'k', 1),
+                              ('', 'h', 0)]:
+        qtbot.keyClicks(cmd_line, count)
+        ctrl_w(qtbot, cmd_line, key)
+        assert windows.editorstack() is stacks[index]
+        assert cmd_line.text() == ''
+    assert vim.vim_cmd.editor() is stacks[0].get_current_editor()
+    qtbot.keyPress(cmd_line, Qt.Key_W, Qt.ControlModifier)
+    qtbot.keyPress(cmd_line, Qt.Key_W, Qt.ControlModifier)
+    assert windows.editorstack() is stacks[1]
+    qtbot.keyClicks(cmd_line, 'ggx')
+    assert stacks[1].get_current_editor().toPlainText().startswith('ine\n')
+
+
+def test_split_focus(split_bot):
+    """The split of the focused editor becomes the current one."""
+    main, stacks, vim, qtbot = split_bot
+    windows = vim.vim_cmd.windows
+    QApplication.instance().focusChanged.emit(
+        None, stacks[2].get_current_editor())
+    assert windows.editorstack() is stacks[2]
+    QApplication.instance().focusChanged.emit(None, vim.get_focus_widget())
+    assert windows.editorstack() is stacks[2]
+
+
+def test_split_close(split_bot, capsys):
+    """Close splits with :close and :only."""
+    main, stacks, vim, qtbot = split_bot
+    cmd_line = vim.get_focus_widget()
+    windows = vim.vim_cmd.windows
+    qtbot.keyClicks(cmd_line, ':clo')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert capsys.readouterr().out == "cannot close this window\n"
+    ctrl_w(qtbot, cmd_line, 'l')
+    ctrl_w(qtbot, cmd_line, 'j')
+    qtbot.keyClicks(cmd_line, ':close')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert not stacks[2].isVisible()
+    assert windows.editorstack() is stacks[1]
+    ctrl_w(qtbot, cmd_line, 'h')
+    qtbot.keyClicks(cmd_line, ':on')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert not stacks[1].isVisible()
+    assert windows.editorstack() is stacks[0]
+
+
+def test_split_resize(split_bot):
+    """Resize the splits with Ctrl-W _, | and =."""
+    main, stacks, vim, qtbot = split_bot
+    cmd_line = vim.get_focus_widget()
+    root = main.editor.editorsplitter
+    right = root.widget(1)
+    ctrl_w(qtbot, cmd_line, 'l')
+    ctrl_w(qtbot, cmd_line, '_')
+    assert right.sizes()[1] < right.sizes()[0] / 4
+    ctrl_w(qtbot, cmd_line, '|')
+    assert root.sizes()[0] < root.sizes()[1] / 4
+    ctrl_w(qtbot, cmd_line, '=')
+    assert abs(right.sizes()[0] - right.sizes()[1]) <= 1
+    assert abs(root.sizes()[0] * 2 - root.sizes()[1]) <= 2
+
+
+def test_vsplit(project_bot):
+    """Split the editor side by side, and open a file in the new split."""
+    main, editor_stack, editor, vim, qtbot = project_bot
+    split = Mock()
+    editor_stack.sig_split_horizontally.connect(split)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':vs')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert split.call_count == 1
+    qtbot.keyClicks(cmd_line, ':vs setup.py')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert split.call_count == 2
+    main.editor.load.assert_called_once_with(osp.join(os.getcwd(),
+                                                      "setup.py"))
+    ctrl_w(qtbot, cmd_line, 'v')
+    assert split.call_count == 3
+
+
+def test_history_browsing(vim_bot):
+    """Browse the history of the typed prefix with Up and Down."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    for history_type, entry in [(":", "s/a/b/"), (":", "set clipboard?"),
+                                (":", "s/c/d/"), ("/", "spam"),
+                                (":", "sort")]:
+        vim.vim_cmd.viminfo.add_history(history_type, entry)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':s/')
+    qtbot.keyPress(cmd_line, Qt.Key_Up)
+    assert cmd_line.text() == ':s/c/d/'
+    qtbot.keyPress(cmd_line, Qt.Key_Up)
+    assert cmd_line.text() == ':s/a/b/'
+    qtbot.keyPress(cmd_line, Qt.Key_Up)
+    assert cmd_line.text() == ':s/a/b/'
+    qtbot.keyPress(cmd_line, Qt.Key_Down)
+    assert cmd_line.text() == ':s/c/d/'
+    qtbot.keyPress(cmd_line, Qt.Key_Down)
+    assert cmd_line.text() == ':s/'
+    cmd_line.clear()
+    qtbot.keyClicks(cmd_line, ':')
+    qtbot.keyPress(cmd_line, Qt.Key_Up)
+    qtbot.keyPress(cmd_line, Qt.Key_Up)
+    assert cmd_line.text() == ':s/c/d/'
+    qtbot.keyClicks(cmd_line, 'x')
+    qtbot.keyPress(cmd_line, Qt.Key_Up)
+    assert cmd_line.text() == ':s/c/d/x'
+    cmd_line.clear()
+    qtbot.keyClicks(cmd_line, '/')
+    qtbot.keyPress(cmd_line, Qt.Key_Up)
+    assert cmd_line.text() == '/spam'
+
+
+def test_history_listing(vim_bot, capsys):
+    """List the histories with q:, q/ and :history."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    cmd_line = vim.get_focus_widget()
+    for command in [':set clipboard?', ':1', '/line', ':1']:
+        qtbot.keyClicks(cmd_line, command)
+        qtbot.keyPress(cmd_line, Qt.Key_Return)
+    capsys.readouterr()
+    qtbot.keyClicks(cmd_line, 'q:')
+    assert capsys.readouterr().out == (
+        "      #  cmd history\n"
+        "      1  set clipboard?\n"
+        "      2  1\n")
+    qtbot.keyClicks(cmd_line, 'q/')
+    assert capsys.readouterr().out == (
+        "      #  search history\n"
+        "      1  line\n")
+    qtbot.keyClicks(cmd_line, ':his ?')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert capsys.readouterr().out == "      #  backward search history\n"
+
+
+@pytest.mark.parametrize("typed, completions", [
+    (':ed', [':edit']),
+    (':s', [':set', ':sort', ':split', ':substitute']),
+    (':set cl', [':set clipboard']),
+    (':set clipboard=unnamed', [':set clipboard=unnamed',
+                                ':set clipboard=unnamedplus']),
+    (':b fo', [':b foo.txt', ':b foo1.txt']),
+    (':zz', []),
+    (':sort ', []),
+])
+def test_completion(vim_bot, monkeypatch, typed, completions):
+    """Cycle through completions with Tab, back to the typed text."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    monkeypatch.chdir(LOCATION)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, typed)
+    for text in completions + [typed]:
+        qtbot.keyPress(cmd_line, Qt.Key_Tab)
+        assert cmd_line.text() == text
+    qtbot.keyPress(cmd_line, Qt.Key_Backtab)
+    assert cmd_line.text() == (completions or [typed])[-1]
+
+
+def test_completion_typing(vim_bot):
+    """Complete the search history, start again after typing."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    for entry in ["spam", "line", "spanish"]:
+        vim.vim_cmd.viminfo.add_history("/", entry)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, '/sp')
+    qtbot.keyPress(cmd_line, Qt.Key_Tab)
+    assert cmd_line.text() == '/spanish'
+    qtbot.keyPress(cmd_line, Qt.Key_Tab)
+    assert cmd_line.text() == '/spam'
+    qtbot.keyClicks(cmd_line, 'x')
+    qtbot.keyPress(cmd_line, Qt.Key_Tab)
+    assert cmd_line.text() == '/spamx'
+    cmd_line.clear()
+    qtbot.keyClicks(cmd_line, '/')
+    qtbot.keyPress(cmd_line, Qt.Key_Backtab)
+    assert cmd_line.text() == '/spam'
+
+
+def test_completion_paths(project_bot, tmpdir):
+    """Complete paths of the project and of other directories."""
+    main, editor_stack, editor, vim, qtbot = project_bot
+    vim.vim_cmd.files.index().wait(10)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':e pkg/')
+    qtbot.keyPress(cmd_line, Qt.Key_Tab)
+    assert cmd_line.text() == ':e pkg/sub' + os.sep
+    qtbot.keyPress(cmd_line, Qt.Key_Tab)
+    assert cmd_line.text() == ':e pkg/mod.py'
+    cmd_line.clear()
+    qtbot.keyClicks(cmd_line, ':e con')
+    qtbot.keyPress(cmd_line, Qt.Key_Tab)
+    assert cmd_line.text() == ':e conf.py'
+    cmd_line.clear()
+    tmpdir.join("other", "notes.txt").write("", ensure=True)
+    qtbot.keyClicks(cmd_line, ':e ../other/n')
+    qtbot.keyPress(cmd_line, Qt.Key_Tab)
+    qtbot.waitUntil(lambda: cmd_line.text() == ':e ../other/notes.txt')
+
+
+def test_completion_tab(vim_bot):
+    """Tab out of the command line is Ctrl-I."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.go_to_line(1)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, 'G')
+    qtbot.keyPress(cmd_line, Qt.Key_O, Qt.ControlModifier)
+    qtbot.keyPress(cmd_line, Qt.Key_Tab)
+    assert editor.textCursor().blockNumber() == (
+        editor.document().blockCount() - 1)
+
+
+def test_buffer_list(vim_bot, capsys, monkeypatch):
+    """List the open files, with the current, alternate and modified ones."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    monkeypatch.chdir(LOCATION)
+    editor.document().setModified(False)
+    editor.go_to_line(3)
+    editor_stack.set_stack_index(1)
+    editor_stack.get_current_editor().document().setModified(True)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':ls')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert capsys.readouterr().out.splitlines() == [
+        '  1 #    "foo.txt" line 3',
+        '  2 %a + "foo1.txt" line 6',
+    ]
+
+
+@pytest.mark.parametrize("keys, filename", [
+    (':b 2\r', 'foo1.txt'),
+    (':b2\r:b1\r', 'foo.txt'),
+    (':b oo1\r', 'foo1.txt'),
+    (':buffer foo.txt\r', 'foo.txt'),
+    (':bn\r', 'foo1.txt'),
+    (':bn\r:bn\r', 'foo.txt'),
+    (':bp\r', 'foo1.txt'),
+    (':bn 4\r', 'foo.txt'),
+    (':b2\r:b#\r', 'foo.txt'),
+    (':b2\r:b#\r:b#\r', 'foo1.txt'),
+])
+def test_buffer_commands(vim_bot, keys, filename):
+    """Show open files by number, name, alternate, next and previous."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    cmd_line = vim.get_focus_widget()
+    for command in keys.split('\r')[:-1]:
+        qtbot.keyClicks(cmd_line, command)
+        qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert editor_stack.get_current_filename() == osp.join(LOCATION,
+                                                           filename)
+
+
+def test_alternate_file(vim_bot):
+    """Switch to the alternate file with Ctrl-^, to a buffer with N Ctrl-^."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyPress(cmd_line, Qt.Key_AsciiCircum, Qt.ControlModifier)
+    assert cmd_line.placeholderText() == "no alternate file"
+    qtbot.keyClicks(cmd_line, '2')
+    qtbot.keyPress(cmd_line, Qt.Key_6, Qt.ControlModifier)
+    assert editor_stack.get_current_filename().endswith('foo1.txt')
+    qtbot.keyPress(cmd_line, Qt.Key_AsciiCircum, Qt.ControlModifier)
+    assert editor_stack.get_current_filename().endswith('foo.txt')
+    qtbot.keyPress(cmd_line, Qt.Key_AsciiCircum, Qt.ControlModifier)
+    assert editor_stack.get_current_filename().endswith('foo1.txt')
+
+
+def test_buffer_delete(vim_bot, capsys):
+    """Close open files, modified ones only with !."""
+    main, editor_stack, editor, vim, qtbot = vim_bot
+    editor.document().setModified(True)
+    cmd_line = vim.get_focus_widget()
+    qtbot.keyClicks(cmd_line, ':bd')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert capsys.readouterr().out == (
+        "no write since last change for buffer 1 (add ! to override)\n")
+    assert editor_stack.get_stack_count() == 2
+    qtbot.keyClicks(cmd_line, ':bd! 1')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert editor_stack.get_filenames() == [osp.join(LOCATION, 'foo1.txt')]
+    qtbot.keyClicks(cmd_line, ':b 1')
+    qtbot.keyPress(cmd_line, Qt.Key_Return)
+    assert capsys.readouterr().out == "buffer 1 does not exist\n"
 
 
 def test_colon_number_command(vim_bot):
@@ -1852,7 +3198,7 @@ def test_h_command_char_mode(vim_bot):
     qtbot.keyClicks(cmd_line, 'v')
     qtbot.keyClicks(cmd_line, '2h')
     qtbot.keyClicks(cmd_line, 'y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == 'lin'
 
 
@@ -1868,7 +3214,7 @@ def test_j_command_char_mode(vim_bot):
     qtbot.keyClicks(cmd_line, 'v')
     qtbot.keyClicks(cmd_line, '2j')
     qtbot.keyClicks(cmd_line, 'y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == 'ne 2\nline 3\nlin'
 
 
@@ -1884,7 +3230,7 @@ def test_j_command_line_mode(vim_bot):
     qtbot.keyClicks(cmd_line, 'V')
     qtbot.keyClicks(cmd_line, '2j')
     qtbot.keyClicks(cmd_line, 'y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == '   123\nline 1\n'
 
 
@@ -1900,7 +3246,7 @@ def test_k_command_line_mode(vim_bot):
     qtbot.keyClicks(cmd_line, 'V')
     qtbot.keyClicks(cmd_line, '2k')
     qtbot.keyClicks(cmd_line, 'y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == '   123\nline 1\nline 2\n'
 
 
@@ -1916,7 +3262,7 @@ def test_gg_command_line_mode(vim_bot):
     qtbot.keyClicks(cmd_line, 'V')
     qtbot.keyClicks(cmd_line, 'gg')
     qtbot.keyClicks(cmd_line, 'y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == '   123\nline 1\nline 2\n'
 
 
@@ -1932,7 +3278,7 @@ def test_gg_command_char_mode(vim_bot):
     qtbot.keyClicks(cmd_line, 'v')
     qtbot.keyClicks(cmd_line, 'gg')
     qtbot.keyClicks(cmd_line, 'y')
-    clipboard = QApplication.clipboard().text()
+    clipboard = clipboard_text()
     assert clipboard == '   123\nline 1\nlin'
 
 
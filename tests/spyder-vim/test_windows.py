@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Copyright © 2022, spyder-vim
+#
+# Licensed under the terms of the MIT license
+# ----------------------------------------------------------------------------
+"""
+spyder-vim split navigation tests.
+"""
+# Third party imports
+import pytest
+
+# Local imports
+from spyder_vim.spyder.windows import neighbor, split_sizes, window_order
+
+# A split on the left, two on the right and one below them all
+RECTS = [(0, 0, 400, 300), (404, 0, 400, 150), (404, 154, 400, 146),
+         (0, 304, 804, 100)]
+
+
+@pytest.mark.parametrize("current, direction, expected", [
+    (0, "l", 1),
+    (0, "j", 3),
+    (0, "h", None),
+    (0, "k", None),
+    (1, "j", 2),
+    (1, "h", 0),
+    (2, "k", 1),
+    (2, "h", 0),
+    (2, "j", 3),
+    (3, "k", 0),
+    (3, "l", None),
+])
+def test_neighbor(current, direction, expected):
+    """Test the nearest split on a side is found."""
+    assert neighbor(RECTS, current, direction) == expected
+
+
+@pytest.mark.parametrize("point, expected", [
+    ((200, 10), 1),
+    ((200, 160), 2),
+    ((200, 152), 1),
+])
+def test_neighbor_point(point, expected):
+    """Test the split closest to the cursor is found."""
+    assert neighbor(RECTS, 0, "l", point) == expected
+
+
+def test_window_order():
+    """Test splits are ordered from top left to bottom right."""
+    assert window_order(RECTS) == [0, 1, 2, 3]
+    assert window_order([RECTS[3], RECTS[2], RECTS[0]]) == [2, 1, 0]
+
+
+@pytest.mark.parametrize("total, weights, expected", [
+    (100, [1, 1], [50, 50]),
+    (100, [1, 2], [33, 67]),
+    (10, [1, 1, 1], [3, 3, 4]),
+])
+def test_split_sizes(total, weights, expected):
+    """Test sizes are proportional to weights and sum to total."""
+    assert split_sizes(total, weights) == expected